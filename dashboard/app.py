@@ -11,7 +11,7 @@ import logging
 
 import config
 from utils.data_loader import DataLoader
-from utils.metrics import MetricsCalculator
+from utils.metrics import MetricsCalculator, RollupMetricsCalculator
 from utils.visualizations import *
 
 # Configure logging
@@ -167,7 +167,7 @@ class ActivityTrackerDashboard:
             st.stop()
         
         # Initialize
-        self.loader = DataLoader(self.db_path)
+        self.loader = DataLoader(self.db_path, config.ARCHIVE_DIR)
         self.setup_gemini()
         
         # Session state
@@ -191,13 +191,29 @@ class ActivityTrackerDashboard:
     def load_data(self, days):
         """Load and prepare all data"""
         with st.spinner("Loading your activity data..."):
-            df_sessions = self.loader.load_sessions(days)
             df_idle = self.loader.load_idle_periods(days)
             
-            if df_sessions is None or df_sessions.empty:
-                return None, None, None
+            if config.USE_ROLLUPS and self.loader.has_rollups():
+                # Totals come from the watcher's rollups; only the timeline reads sessions
+                df_hourly = self.loader.load_rollups(days)
+                if df_hourly is None or df_hourly.empty:
+                    return None, None, None
+                
+                metrics_calc = RollupMetricsCalculator(
+                    df_hourly,
+                    self.loader.load_rollups(days, grain='day'),
+                    self.loader.load_focus_sessions(days),
+                    df_idle,
+                )
+                df_sessions = self.loader.load_sessions(days, limit=config.MAX_TIMELINE_SESSIONS)
+            else:
+                df_sessions = self.loader.load_sessions(days)
+                
+                if df_sessions is None or df_sessions.empty:
+                    return None, None, None
+                
+                metrics_calc = MetricsCalculator(df_sessions, df_idle)
             
-            metrics_calc = MetricsCalculator(df_sessions, df_idle)
             metrics = metrics_calc.calculate_all_metrics()
             
             return df_sessions, df_idle, metrics_calc, metrics
@@ -218,7 +234,7 @@ class ActivityTrackerDashboard:
             # Date range selector
             date_range = st.selectbox(
                 "Time Period",
-                options=[1, 3, 7, 14, 30, 60, 90],
+                options=[1, 3, 7, 14, 30, 60, 90, 180, 365],
                 index=2,
                 format_func=lambda x: f"Last {x} day{'s' if x > 1 else ''}"
             )
@@ -368,11 +384,11 @@ class ActivityTrackerDashboard:
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = create_hourly_heatmap(df)
+            fig = create_hourly_heatmap(metrics_calc.df)
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            fig = create_focus_sessions_chart(df)
+            fig = create_focus_sessions_chart(metrics_calc.get_focus_sessions())
             if fig.data:
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -388,7 +404,7 @@ class ActivityTrackerDashboard:
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            fig = create_weekly_comparison(df)
+            fig = create_weekly_comparison(metrics_calc.df)
             if fig.data:
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -396,7 +412,7 @@ class ActivityTrackerDashboard:
         
         # Full width: Timeline
         st.markdown("### 🕐 Session Timeline")
-        fig = create_timeline_view(df, max_sessions=config.MAX_TIMELINE_SESSIONS)
+        fig = create_timeline_view(df, max_sessions=config.MAX_TIMELINE_SESSIONS) if df is not None else go.Figure()
         if fig.data:
             st.plotly_chart(fig, use_container_width=True)
         else:
@@ -407,7 +423,7 @@ class ActivityTrackerDashboard:
         st.markdown("---")
         st.markdown("## 📋 Detailed Breakdown")
         
-        tab1, tab2, tab3 = st.tabs(["📅 Daily", "🕐 Hourly", "💻 Applications"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📅 Daily", "🕐 Hourly", "💻 Applications", "🌐 Websites"])
         
         with tab1:
             daily = metrics_calc.get_daily_breakdown()
@@ -445,6 +461,19 @@ class ActivityTrackerDashboard:
                 )
             else:
                 st.info("No application data available")
+        
+        with tab4:
+            sites = self.loader.load_site_summary(st.session_state.date_range)
+            if sites is not None:
+                st.dataframe(
+                    sites[['domain', 'category', 'sessions', 'duration_min', 'foreground_min']].style.format({
+                        'duration_min': '{:.1f}',
+                        'foreground_min': '{:.1f}'
+                    }),
+                    use_container_width=True
+                )
+            else:
+                st.info("No website data available")
     
     def render_ai_insights(self, metrics, metrics_calc):
         """Render AI-powered insights"""
@@ -9,6 +9,7 @@ load_dotenv()
 
 # Database
 DB_PATH = os.getenv("DB_PATH", str(Path.home() / "ActivityTracker" / "data" / "activity.db"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", str(Path(DB_PATH).parent / "archive"))  # monthly Parquet files written by the watcher
 
 # Gemini AI
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -21,6 +22,7 @@ LAYOUT = "wide"
 # Data Settings
 DEFAULT_DATE_RANGE = 7  # days
 MAX_TIMELINE_SESSIONS = 50
+USE_ROLLUPS = os.getenv("USE_ROLLUPS", "true").lower() == "true"  # read the watcher's hourly/daily rollups instead of every session
 
 # Productivity Thresholds
 FOCUS_SESSION_MIN_DURATION = 600  # 10 minutes
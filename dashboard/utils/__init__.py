@@ -3,10 +3,11 @@ Activity Tracker Pro - Dashboard Utilities
 """
 
 from .data_loader import DataLoader
-from .metrics import MetricsCalculator
+from .metrics import MetricsCalculator, RollupMetricsCalculator
 from .visualizations import *
 
 __all__ = [
     'DataLoader',
     'MetricsCalculator',
+    'RollupMetricsCalculator',
 ]
\ No newline at end of file
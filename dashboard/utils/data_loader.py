@@ -1,26 +1,101 @@
 """
 Data Loading and Preparation Utilities
 """
+import os
 import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    ds = None
+
 logger = logging.getLogger(__name__)
 
+# Schema versions (watcher/migrations.py): rollup tables hold all sessions / idle rollups exist
+ROLLUPS_SCHEMA_VERSION = 4
+RETENTION_SCHEMA_VERSION = 5
+
+# Partitions written by watcher/archive.py: <archive_dir>/<table>/year=YYYY/month=MM/part-0.parquet
+ARCHIVE_PART = 'part-0.parquet'
+
 
 class DataLoader:
-    def __init__(self, db_path):
+    def __init__(self, db_path, archive_dir=None):
         self.db_path = db_path
+        self.archive_dir = archive_dir
         
     def get_connection(self):
         """Get database connection with timeout"""
         return sqlite3.connect(self.db_path, timeout=30)
     
-    def load_sessions(self, days=30):
-        """Load sessions from database"""
+    def archive_months(self):
+        """Months the watcher has exported to Parquet (empty without pyarrow or an archive)"""
+        root = os.path.join(self.archive_dir, 'sessions') if self.archive_dir else None
+        if ds is None or not root or not os.path.isdir(root):
+            return []
+        months = []
+        for year in os.listdir(root):
+            for month in os.listdir(os.path.join(root, year)):
+                if year.startswith('year=') and month.startswith('month=') \
+                        and os.path.exists(os.path.join(root, year, month, ARCHIVE_PART)):
+                    months.append(datetime(int(year[5:]), int(month[6:]), 1))
+        return sorted(months)
+
+    def not_archived(self, months, column='start_time'):
+        """SQL condition and params that skip rows of archived months (they are read from Parquet)"""
+        if not months:
+            return '', ()
+        placeholders = ', '.join('?' * len(months))
+        return f"AND substr({column}, 1, 7) NOT IN ({placeholders})", tuple(m.strftime('%Y-%m') for m in months)
+
+    def load_archive(self, table, columns, since, months, focus_only=False):
+        """Archived rows from `since` in `months`, reading only `columns` and the partitions/row groups in range"""
+        partitioning = ds.partitioning(pa.schema([('year', pa.int16()), ('month', pa.int8())]), flavor='hive')
+        dataset = ds.dataset(os.path.join(self.archive_dir, table), format='parquet', partitioning=partitioning)
+        
+        # year/month prune whole files; start_time statistics prune row groups inside them
+        expr = None
+        for month in months:
+            part = (ds.field('year') == month.year) & (ds.field('month') == month.month)
+            expr = part if expr is None else expr | part
+        expr = expr & (ds.field('start_time') >= since)
+        if focus_only:
+            expr = expr & (ds.field('is_focus_session') == 1)
+        df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+        
+        # Dictionary columns arrive as categoricals; the metrics expect plain values
+        for col in df.select_dtypes('category').columns:
+            df[col] = df[col].astype(object)
+        return df.sort_values('start_time', ascending=False)
+
+    def with_archive(self, df, table, days, archived, limit=None, focus_only=False):
+        """Merge the archived rows of the last `days` into a SQLite result (newest first)"""
+        since = datetime.now() - timedelta(days=days)
+        # Only archived months in range; any other month is still in SQLite
+        months = [m for m in archived if (m + timedelta(days=32)).replace(day=1) > since]
+        if not months:
+            return df
+        if limit and len(df) >= limit and df['start_time'].min() >= (months[-1] + timedelta(days=32)).replace(day=1).isoformat():
+            return df
+        old = self.load_archive(table, list(df.columns), since, months, focus_only)
+        if old.empty:
+            return df
+        df['start_time'] = pd.to_datetime(df['start_time'], format='ISO8601')
+        df['end_time'] = pd.to_datetime(df['end_time'], format='ISO8601')
+        # A month missing from the archive leaves SQLite rows older than archived ones
+        df = pd.concat([df, old], ignore_index=True).sort_values('start_time', ascending=False, ignore_index=True)
+        return df.head(limit) if limit else df
+
+    def load_sessions(self, days=30, limit=None):
+        """Load sessions from database (the most recent `limit` if given), archived months from Parquet"""
         try:
-            query = """
+            archived = self.archive_months()
+            skip, skip_params = self.not_archived(archived)
+            query = f"""
                 SELECT 
                     id,
                     start_time,
@@ -38,12 +113,18 @@ class DataLoader:
                     productivity_score
                 FROM sessions
                 WHERE start_time >= datetime('now', ?)
+                  {skip}
                 ORDER BY start_time DESC
             """
+            params = (f'-{days} days',) + skip_params
+            if limit:
+                query += " LIMIT ?"
+                params += (limit,)
             
             conn = self.get_connection()
-            df = pd.read_sql_query(query, conn, params=(f'-{days} days',))
+            df = pd.read_sql_query(query, conn, params=params)
             conn.close()
+            df = self.with_archive(df, 'sessions', days, archived, limit)
             
             if df.empty:
                 return None
@@ -75,10 +156,117 @@ class DataLoader:
             logger.error(f"Failed to load sessions: {e}")
             return None
     
+    def has_rollups(self, version=ROLLUPS_SCHEMA_VERSION):
+        """True when the watcher maintains complete hourly/daily rollup tables"""
+        try:
+            conn = self.get_connection()
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.close()
+            return current >= version
+        except Exception as e:
+            logger.error(f"Failed to read schema version: {e}")
+            return False
+
+    def load_rollups(self, days=30, grain='hour'):
+        """Load pre-aggregated totals per hour (or day) x category x app"""
+        try:
+            table, bucket = ('hourly_rollups', 'hour') if grain == 'hour' else ('daily_rollups', 'day')
+            query = f"""
+                SELECT
+                    r.{bucket} AS bucket,
+                    c.category,
+                    c.subcategory,
+                    a.process_name,
+                    a.display_name AS process_display_name,
+                    r.duration_seconds,
+                    r.foreground_seconds,
+                    r.productivity_weighted,
+                    r.session_count,
+                    r.category_switches
+                FROM {table} r
+                JOIN categories c ON c.id = r.category_id
+                JOIN apps a ON a.id = r.app_id
+                WHERE r.{bucket} >= ?
+                ORDER BY r.{bucket}
+            """
+            # Buckets are local-time ISO strings, like the sessions' start_time
+            cutoff = datetime.now() - timedelta(days=days)
+            cutoff = cutoff.replace(minute=0, second=0, microsecond=0).isoformat() if grain == 'hour' else cutoff.date().isoformat()
+
+            conn = self.get_connection()
+            df = pd.read_sql_query(query, conn, params=(cutoff,))
+            conn.close()
+
+            if df.empty:
+                return None
+
+            df['start_dt'] = pd.to_datetime(df['bucket'])
+            df['duration_min'] = df['duration_seconds'] / 60.0
+            df['foreground_min'] = df['foreground_seconds'] / 60.0
+            df['foreground_ratio'] = df['foreground_seconds'] / df['duration_seconds'].replace(0, 1)
+
+            df['date'] = df['start_dt'].dt.date
+            df['hour'] = df['start_dt'].dt.hour
+            df['day_of_week'] = df['start_dt'].dt.day_name()
+            df['week'] = df['start_dt'].dt.isocalendar().week
+
+            df['display_name'] = df['process_display_name'].fillna(df['process_name'])
+
+            return df
+
+        except Exception as e:
+            logger.error(f"Failed to load rollups: {e}")
+            return None
+
+    def load_focus_sessions(self, days=30):
+        """Load only the deep work sessions (is_focus_session = 1)"""
+        try:
+            archived = self.archive_months()
+            skip, skip_params = self.not_archived(archived)
+            query = f"""
+                SELECT
+                    id,
+                    start_time,
+                    end_time,
+                    process_name,
+                    process_display_name,
+                    category,
+                    duration_seconds,
+                    foreground_seconds,
+                    is_focus_session
+                FROM sessions
+                WHERE is_focus_session = 1
+                  AND start_time >= ?
+                  {skip}
+                ORDER BY start_time DESC
+            """
+            params = ((datetime.now() - timedelta(days=days)).isoformat(),) + skip_params
+
+            conn = self.get_connection()
+            df = pd.read_sql_query(query, conn, params=params)
+            conn.close()
+            df = self.with_archive(df, 'sessions', days, archived, focus_only=True)
+
+            if df.empty:
+                return None
+
+            df['start_dt'] = pd.to_datetime(df['start_time'])
+            df['duration_min'] = df['duration_seconds'] / 60.0
+            df['date'] = df['start_dt'].dt.date
+            df['display_name'] = df['process_display_name'].fillna(df['process_name'])
+
+            return df
+
+        except Exception as e:
+            logger.error(f"Failed to load focus sessions: {e}")
+            return None
+
     def load_idle_periods(self, days=30):
-        """Load idle periods"""
+        """Load idle periods (days past retention come as one row per day and reason)"""
         try:
-            query = """
+            archived = self.archive_months()
+            skip, skip_params = self.not_archived(archived)
+            query = f"""
                 SELECT 
                     start_time,
                     end_time,
@@ -86,18 +274,38 @@ class DataLoader:
                     reason
                 FROM idle_periods
                 WHERE start_time >= datetime('now', ?)
+                  {skip}
                 ORDER BY start_time DESC
             """
+            params = (f'-{days} days',) + skip_params
+            if self.has_rollups(RETENTION_SCHEMA_VERSION):
+                # Folded days inside archived months are read in full from the archive
+                skip_days, _ = self.not_archived(archived, column='day')
+                query = f"""
+                    SELECT start_time, end_time, duration_seconds, reason
+                    FROM idle_periods
+                    WHERE start_time >= datetime('now', ?)
+                      {skip}
+                    UNION ALL
+                    SELECT day, NULL, duration_seconds, reason
+                    FROM idle_rollups
+                    WHERE day >= date('now', ?)
+                      {skip_days}
+                    ORDER BY start_time DESC
+                """
+                params = (f'-{days} days',) + skip_params + (f'-{days} days',) + skip_params
             
             conn = self.get_connection()
-            df = pd.read_sql_query(query, conn, params=(f'-{days} days',))
+            df = pd.read_sql_query(query, conn, params=params)
             conn.close()
+            df = self.with_archive(df, 'idle_periods', days, archived)
             
             if df.empty:
                 return None
                 
-            df['start_dt'] = pd.to_datetime(df['start_time'])
-            df['end_dt'] = pd.to_datetime(df['end_time'])
+            # Folded days are bare dates
+            df['start_dt'] = pd.to_datetime(df['start_time'], format='ISO8601')
+            df['end_dt'] = pd.to_datetime(df['end_time'], format='ISO8601')
             df['duration_min'] = df['duration_seconds'] / 60.0
             df['date'] = df['start_dt'].dt.date
             
@@ -135,7 +343,40 @@ class DataLoader:
         except Exception as e:
             logger.error(f"Failed to load system events: {e}")
             return None
-    
+
+    def load_site_summary(self, days=30):
+        """Time per website, from the domain the watcher extracted from browser titles"""
+        try:
+            query = """
+                SELECT
+                    domain,
+                    category,
+                    COUNT(*) AS sessions,
+                    SUM(duration_seconds) AS duration_seconds,
+                    SUM(foreground_seconds) AS foreground_seconds
+                FROM sessions
+                WHERE domain IS NOT NULL
+                  AND start_time >= datetime('now', ?)
+                GROUP BY domain, category
+                ORDER BY duration_seconds DESC
+            """
+
+            conn = self.get_connection()
+            df = pd.read_sql_query(query, conn, params=(f'-{days} days',))
+            conn.close()
+
+            if df.empty:
+                return None
+
+            df['duration_min'] = df['duration_seconds'] / 60.0
+            df['foreground_min'] = df['foreground_seconds'] / 60.0
+
+            return df
+
+        except Exception as e:
+            logger.error(f"Failed to load site summary: {e}")
+            return None
+
     def get_database_stats(self):
         """Get database statistics"""
         try:
@@ -144,6 +385,40 @@ class DataLoader:
             
             stats = {}
             
+            if self.has_rollups():
+                # Daily rollups outlive raw sessions and are a few rows per day
+                c.execute("""
+                    SELECT SUM(session_count), MIN(day), MAX(day), SUM(duration_seconds)
+                    FROM daily_rollups
+                """)
+                total_sessions, first_day, last_day, total_seconds = c.fetchone()
+                stats['total_sessions'] = total_sessions or 0
+                if first_day:
+                    stats['first_session'] = first_day
+                    stats['last_session'] = last_day
+                stats['total_hours_tracked'] = (total_seconds or 0) / 3600.0
+                
+                # Partial index: only focus sessions are read
+                c.execute("SELECT COUNT(*) FROM session_facts WHERE is_focus_session = 1")
+                stats['focus_sessions'] = c.fetchone()[0]
+                
+                idle_query = "SELECT COUNT(*), SUM(duration_seconds) FROM idle_periods"
+                if self.has_rollups(RETENTION_SCHEMA_VERSION):
+                    idle_query = """
+                    SELECT SUM(n), SUM(seconds) FROM (
+                        SELECT COUNT(*) AS n, SUM(duration_seconds) AS seconds FROM idle_periods
+                        UNION ALL
+                        SELECT SUM(period_count), SUM(duration_seconds) FROM idle_rollups
+                    )
+                """
+                c.execute(idle_query)
+                result = c.fetchone()
+                stats['idle_periods'] = result[0] or 0
+                stats['total_idle_hours'] = (result[1] or 0) / 3600.0
+                
+                conn.close()
+                return stats
+            
             # Total sessions
             c.execute("SELECT COUNT(*) FROM sessions")
             stats['total_sessions'] = c.fetchone()[0]
@@ -175,4 +450,4 @@ class DataLoader:
             
         except Exception as e:
             logger.error(f"Failed to get database stats: {e}")
-            return {}
\ No newline at end of file
+            return {}
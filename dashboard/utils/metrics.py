@@ -110,7 +110,7 @@ class MetricsCalculator:
             }
         
         # Productivity Score (weighted average of all productivity_score values)
-        avg_productivity = df['productivity_score'].mean()
+        avg_productivity = self.average_productivity()
         
         # Efficiency Score (work time / total time)
         efficiency = (work_min / total_min) * 100
@@ -141,6 +141,10 @@ class MetricsCalculator:
             'time_roi': round(time_roi, 1),
         }
     
+    def average_productivity(self):
+        """Mean productivity score of the sessions"""
+        return self.df['productivity_score'].mean()
+    
     def calculate_distribution_metrics(self):
         """Calculate distribution metrics"""
         df = self.df
@@ -206,6 +210,10 @@ class MetricsCalculator:
         
         return app_stats
     
+    def get_focus_sessions(self):
+        """Deep focus sessions"""
+        return self.df[self.df['is_focus_session'] == 1]
+    
     def get_streaks(self):
         """Calculate productivity streaks"""
         df = self.df.copy()
@@ -244,4 +252,122 @@ class MetricsCalculator:
         return {
             'current_streak': current_streak,
             'longest_streak': longest_streak,
-        }
\ No newline at end of file
+        }
+
+
+class RollupMetricsCalculator(MetricsCalculator):
+    """
+    Metrics from the watcher's rollup tables instead of raw sessions.
+
+    df_hourly has one row per hour x category x app (DataLoader.load_rollups),
+    df_daily one per day; deep work is read from the focus sessions only.
+    Unlike the per-session path, the productivity score is weighted by time,
+    the focus ratio is judged per hour and app, and there is no median
+    session length.
+    """
+
+    def __init__(self, df_hourly, df_daily=None, df_focus=None, df_idle=None):
+        super().__init__(df_hourly, df_idle)
+        self.df_daily = df_daily if df_daily is not None else df_hourly
+        self.df_focus = df_focus if df_focus is not None else pd.DataFrame(
+            columns=['id', 'start_dt', 'date', 'category', 'display_name', 'duration_min', 'is_focus_session']
+        )
+
+    def calculate_focus_metrics(self):
+        """Calculate focus and deep work metrics"""
+        deep_work = self.df_focus[self.df_focus['category'] == 'PRIMARY_WORK']
+        
+        deep_work_min = deep_work['duration_min'].sum()
+        avg_deep_session = deep_work['duration_min'].mean() if not deep_work.empty else 0
+        
+        today = datetime.now().date()
+        today_deep = deep_work[deep_work['date'] == today]
+        longest_today = today_deep['duration_min'].max() if not today_deep.empty else 0
+        
+        primary_work = self.df[self.df['category'] == 'PRIMARY_WORK']
+        if not primary_work.empty:
+            focused_work = primary_work[primary_work['foreground_ratio'] >= 0.7]
+            focus_ratio = (focused_work['duration_min'].sum() / primary_work['duration_min'].sum()) * 100
+        else:
+            focus_ratio = 0
+        
+        return {
+            'deep_work_min': round(deep_work_min),
+            'deep_work_hours': round(deep_work_min / 60, 1),
+            'deep_work_sessions': len(deep_work),
+            'avg_deep_session_min': round(avg_deep_session),
+            'longest_focus_today_min': round(longest_today),
+            'focus_ratio': round(focus_ratio, 1),
+        }
+    
+    def average_productivity(self):
+        """Time-weighted productivity score"""
+        return self.df['productivity_weighted'].sum() / max(self.df['duration_seconds'].sum(), 1)
+    
+    def calculate_distribution_metrics(self):
+        """Calculate distribution metrics"""
+        df = self.df
+        
+        total_sessions = int(df['session_count'].sum())
+        avg_session_min = df['duration_min'].sum() / total_sessions if total_sessions > 0 else 0
+        
+        total_hours = self.calculate_time_metrics()['total_hours']
+        fragmentation = total_sessions / max(total_hours, 1)
+        
+        return {
+            'total_sessions': total_sessions,
+            'avg_session_min': round(avg_session_min, 1),
+            'median_session_min': None,
+            'fragmentation': round(fragmentation, 1),
+            'context_switches': int(df['category_switches'].sum()),
+        }
+    
+    def get_daily_breakdown(self):
+        """Get daily breakdown of activities"""
+        daily = self.df_daily.groupby('date').agg({
+            'duration_min': 'sum',
+            'session_count': 'sum'
+        }).rename(columns={'session_count': 'sessions'})
+        
+        category_daily = self.df_daily.groupby(['date', 'category'])['duration_min'].sum().unstack(fill_value=0)
+        
+        result = pd.concat([daily, category_daily], axis=1)
+        result = result.sort_index(ascending=False)
+        
+        return result
+    
+    def get_hourly_breakdown(self):
+        """Get hourly activity pattern"""
+        hourly = self.df.groupby('hour').agg({
+            'duration_min': 'sum',
+            'session_count': 'sum',
+            'productivity_weighted': 'sum',
+            'duration_seconds': 'sum'
+        }).rename(columns={'session_count': 'sessions'})
+        hourly['productivity_score'] = hourly['productivity_weighted'] / hourly['duration_seconds'].replace(0, 1)
+        
+        return hourly[['duration_min', 'sessions', 'productivity_score']]
+    
+    def get_app_breakdown(self):
+        """Get breakdown by application"""
+        app_stats = self.df.groupby('display_name').agg({
+            'duration_min': 'sum',
+            'session_count': 'sum',
+            'foreground_seconds': 'sum',
+            'productivity_weighted': 'sum',
+            'duration_seconds': 'sum'
+        }).rename(columns={'session_count': 'sessions'})
+        
+        seconds = app_stats['duration_seconds'].replace(0, 1)
+        app_stats['foreground_ratio'] = app_stats['foreground_seconds'] / seconds
+        app_stats['productivity_score'] = app_stats['productivity_weighted'] / seconds
+        app_stats['focus_sessions'] = self.df_focus.groupby('display_name').size().reindex(app_stats.index, fill_value=0)
+        
+        app_stats = app_stats[['duration_min', 'sessions', 'foreground_ratio', 'productivity_score', 'focus_sessions']]
+        app_stats = app_stats.sort_values('duration_min', ascending=False)
+        
+        return app_stats
+    
+    def get_focus_sessions(self):
+        """Deep focus sessions"""
+        return self.df_focus
@@ -0,0 +1,83 @@
+"""
+Streaming per-interval aggregation for the Activity Watcher
+Each sample updates its activity slot in O(1); flush only walks distinct activities
+"""
+import sys
+
+
+class ActivitySlot:
+    """Running totals for one (process, category, subcategory) activity"""
+
+    __slots__ = ("key", "count", "title", "score")
+
+    def __init__(self, key, title, score):
+        self.key = key
+        self.count = 0
+        self.title = title
+        self.score = score
+
+
+class ActivityAggregator:
+    """
+    Replaces the raw per-second sample buffer.
+
+    Samples are folded into one slot per distinct activity as they arrive,
+    together with the interval's total/foreground sample counts and the
+    current dominant activity. Memory is bounded by the number of distinct
+    activities, not by FLUSH_INTERVAL / SAMPLE_INTERVAL.
+    """
+
+    __slots__ = ("slots", "total", "foreground", "dominant", "_keys")
+
+    def __init__(self):
+        self._keys = {}
+        self.reset()
+
+    def reset(self):
+        """Start a new interval"""
+        self.slots = {}
+        self.total = 0
+        self.foreground = 0
+        self.dominant = None
+
+    def __bool__(self):
+        return self.total > 0
+
+    def _intern(self, key):
+        """Return the canonical instance of an activity key"""
+        canonical = self._keys.get(key)
+        if canonical is None:
+            proc, cat, subcat = key
+            canonical = (
+                sys.intern(proc),
+                sys.intern(cat),
+                sys.intern(subcat) if subcat else subcat,
+            )
+            self._keys[canonical] = canonical
+        return canonical
+
+    def add(self, proc, title, cat, subcat, score, weight=1):
+        """Fold one sample into the current interval"""
+        self.total += weight
+
+        # Samples with no detectable process only count against foreground ratio
+        if not proc:
+            return
+        self.foreground += weight
+
+        key = (proc, cat, subcat)
+        slot = self.slots.get(key)
+        if slot is None:
+            key = self._intern(key)
+            slot = self.slots[key] = ActivitySlot(key, title, score)
+
+        slot.count += weight
+        dominant = self.dominant
+        if dominant is None or slot.count > dominant.count:
+            self.dominant = slot
+
+    def drain(self):
+        """Return (total, foreground, dominant slot) and start a new interval"""
+        result = (self.total, self.foreground, self.dominant)
+        self.reset()
+        return result
@@ -0,0 +1,255 @@
+"""
+Monthly Parquet archive for the Activity Watcher
+Closed months of sessions and idle periods are exported to
+<ARCHIVE_DIR>/<table>/year=YYYY/month=MM/part-0.parquet for long-range analytics
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Column name -> Arrow type; strings are dictionary-encoded (few distinct values per month)
+TABLES = {
+    "sessions": {
+        "query": """
+            SELECT id, start_time, end_time, process_name, process_display_name,
+                   window_title, category, subcategory, duration_seconds,
+                   foreground_seconds, keystroke_count, mouse_click_count,
+                   is_focus_session, productivity_score, rule_version, domain
+            FROM sessions WHERE start_time >= ? AND start_time < ?
+            ORDER BY start_time
+        """,
+        "columns": [
+            ("id", "int64"), ("start_time", "timestamp"), ("end_time", "timestamp"),
+            ("process_name", "dictionary"), ("process_display_name", "dictionary"),
+            ("window_title", "dictionary"), ("category", "dictionary"), ("subcategory", "dictionary"),
+            ("duration_seconds", "float64"), ("foreground_seconds", "float64"),
+            ("keystroke_count", "int64"), ("mouse_click_count", "int64"),
+            ("is_focus_session", "int8"), ("productivity_score", "float64"),
+            ("rule_version", "dictionary"), ("domain", "dictionary"),
+        ],
+    },
+    "idle_periods": {
+        "query": """
+            SELECT id, start_time, end_time, duration_seconds, reason
+            FROM idle_periods WHERE start_time >= ? AND start_time < ?
+            ORDER BY start_time
+        """,
+        "columns": [
+            ("id", "int64"), ("start_time", "timestamp"), ("end_time", "timestamp"),
+            ("duration_seconds", "float64"), ("reason", "dictionary"),
+        ],
+    },
+}
+
+PART_FILE = "part-0.parquet"
+
+
+def available():
+    """True when pyarrow is installed"""
+    return pa is not None
+
+
+def month_start(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(dt):
+    return month_start(month_start(dt) + timedelta(days=32))
+
+
+def partition_path(archive_dir, table, month):
+    return os.path.join(archive_dir, table, f"year={month.year:04d}", f"month={month.month:02d}", PART_FILE)
+
+
+def to_arrow(kind, values):
+    """One column of SQLite values as an Arrow array"""
+    if kind == "timestamp":
+        return pa.array([datetime.fromisoformat(v) if v else None for v in values], type=pa.timestamp("us"))
+    if kind == "dictionary":
+        return pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.array(values, type=getattr(pa, kind)())
+
+
+class MonthlyArchive:
+    """
+    Exports every closed month of sessions and idle periods to Parquet.
+
+    A month is closed one day after it ends (a session started before
+    midnight may still be extended). Months are exported oldest first on
+    a background thread through a read-only connection, so the writer
+    lock is never taken; each file is written under a temporary name and
+    renamed, so a partition either exists completely or not at all.
+
+    horizon() is the start of the oldest month not archived yet; retention
+    never deletes sessions or idle periods from there on.
+    """
+
+    def __init__(self, db_path, archive_dir):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.thread = None
+        self.exported_months = 0
+        self.exported_rows = 0
+        self.failures = 0
+        self.archived = self.scan()
+        # (current month, horizon); dropped whenever a month is exported
+        self.horizon_cache = None
+
+    def scan(self):
+        """Months that already have a sessions partition"""
+        months = set()
+        root = os.path.join(self.archive_dir, "sessions")
+        for year in os.listdir(root) if os.path.isdir(root) else []:
+            for month in os.listdir(os.path.join(root, year)):
+                if year.startswith("year=") and month.startswith("month="):
+                    path = os.path.join(root, year, month, PART_FILE)
+                    if os.path.exists(path):
+                        months.add(datetime(int(year[5:]), int(month[6:]), 1))
+        return months
+
+    def connect(self):
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, timeout=config.DB_BUSY_TIMEOUT / 1000.0)
+
+    def first_month(self, conn):
+        """Month of the oldest session or idle period still in the database"""
+        row = conn.execute("""
+            SELECT MIN(t) FROM (
+                SELECT MIN(start_time) AS t FROM session_facts
+                UNION ALL SELECT MIN(start_time) FROM idle_periods
+            )
+        """).fetchone()
+        return month_start(datetime.fromisoformat(row[0])) if row and row[0] else None
+
+    def months(self, now):
+        """Every month from the oldest row in the database up to (not including) the current one"""
+        conn = self.connect()
+        try:
+            month = self.first_month(conn)
+        finally:
+            conn.close()
+        months = []
+        while month is not None and month < month_start(now):
+            months.append(month)
+            month = next_month(month)
+        return months
+
+    def pending(self, now):
+        """Closed months that have no partition yet, oldest first"""
+        return [m for m in self.months(now) if m not in self.archived and next_month(m) + timedelta(days=1) <= now]
+
+    def horizon(self, now):
+        """ISO start of the oldest month that is not archived (rows from there on are kept)"""
+        current = month_start(now)
+        cached = self.horizon_cache
+        if cached is not None and cached[0] == current:
+            return cached[1]
+        horizon = current.isoformat()
+        for month in self.months(now):
+            if month not in self.archived:
+                horizon = month.isoformat()
+                break
+        self.horizon_cache = (current, horizon)
+        return horizon
+
+    def export_month(self, conn, month):
+        """Write one month of every table; returns the number of rows written"""
+        bounds = (month.isoformat(), next_month(month).isoformat())
+        written = 0
+        # sessions last: its partition marks the month as archived
+        for table in ("idle_periods", "sessions"):
+            spec = TABLES[table]
+            rows = conn.execute(spec["query"], bounds).fetchall()
+            values = list(zip(*rows)) if rows else [()] * len(spec["columns"])
+            arrays = [to_arrow(kind, column) for (_, kind), column in zip(spec["columns"], values)]
+            data = pa.Table.from_arrays(arrays, names=[name for name, _ in spec["columns"]])
+
+            path = partition_path(self.archive_dir, table, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = os.path.join(os.path.dirname(path), "." + PART_FILE + ".tmp")
+            pq.write_table(
+                data, tmp,
+                compression=config.ARCHIVE_COMPRESSION,
+                row_group_size=config.ARCHIVE_ROW_GROUP_ROWS,
+                use_dictionary=True,
+            )
+            os.replace(tmp, path)
+            written += len(rows)
+        return written
+
+    def run(self, now):
+        """Export every pending month; returns the number of months written"""
+        months = self.pending(now)
+        if not months:
+            return 0
+        conn = self.connect()
+        try:
+            for month in months:
+                rows = self.export_month(conn, month)
+                self.archived.add(month)
+                self.horizon_cache = None
+                self.exported_months += 1
+                self.exported_rows += rows
+                logging.info(f"Archived {month:%Y-%m}: {rows} rows")
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Archive export failed: {e}")
+        finally:
+            conn.close()
+        return len(months)
+
+    def start(self, now):
+        """Export pending months in the background unless an export is already running"""
+        if self.thread and self.thread.is_alive():
+            return False
+        self.thread = threading.Thread(target=self.run, args=(now,), name="archiver", daemon=True)
+        self.thread.start()
+        return True
+
+    def stats(self):
+        return {
+            "archived_months": len(self.archived),
+            "exported_months": self.exported_months,
+            "exported_rows": self.exported_rows,
+            "failures": self.failures,
+        }
+
+
+def open_archive(db_path):
+    """The monthly archive for a database, or None if disabled/unavailable"""
+    if not config.ARCHIVE_DIR:
+        return None
+    if not available():
+        logging.warning("Parquet archive disabled: pyarrow is not installed")
+        return None
+    return MonthlyArchive(db_path, config.ARCHIVE_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export closed months to the Parquet archive now")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--dir", default=config.ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if not available():
+        parser.error("pyarrow is not installed")
+    archive = MonthlyArchive(args.db, args.dir)
+    archive.run(datetime.now())
+    print(archive.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1941 @@
+"""
+Activity Watcher Benchmarks
+Run from the watcher directory: python bench.py <benchmark> [options]
+Results are printed as JSON; `python bench.py suite --output results.json`
+runs everything and `python bench.py compare old.json new.json` diffs runs.
+"""
+import argparse
+import bisect
+import fnmatch
+import json
+import logging
+import logging.handlers
+import os
+import platform
+import queue
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime, timedelta
+
+import psutil
+
+import archive
+import config
+import migrations
+import storage
+from categorizer import Categorizer
+from clock import SystemClock, VirtualClock
+from foreground import ForegroundProvider
+from inputs import InputCounters, InputSource, SyntheticInputSource
+from journal import SampleJournal
+from logs import FILE_FORMAT, RateLimitFilter
+from matcher import DomainMatcher
+from metrics import Histogram, start_server
+from replay import WORKLOADS, ReplayProvider, run_replay
+from retention import RetentionPolicy, convert_to_incremental
+from rollups import interval_records
+from rules import CATEGORY_SCORES, RuleSet, RulesFile, default_rules
+from sampling import AdaptiveSampler
+from titles import TitleParser, domain_suffixes
+
+
+def percentiles(samples):
+    """Summarize a list of latencies (seconds) in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Database write path
+# ---------------------------------------------------------------------------
+
+SESSION_INSERT = storage.STATEMENTS["session"]
+
+
+SYNTHETIC_ACTIVITIES = [
+    ("Code.exe", "PRIMARY_WORK", "VSCode", None),
+    ("chrome.exe", "PRIMARY_WORK", "Chrome", "github.com"),
+    ("Telegram.exe", "SECONDARY_WORK", "Telegram", None),
+    ("firefox.exe", "BROWSER_NONWORK", "Firefox (Leisure)", "youtube.com"),
+]
+SYNTHETIC_WINDOWS = 500  # distinct titles per activity
+
+
+def synthetic_session(ts):
+    """One plausible session_facts row starting at ts (ids from seed_dimensions)"""
+    activity = random.randrange(len(SYNTHETIC_ACTIVITIES))
+    domain = SYNTHETIC_ACTIVITIES[activity][3]
+    return (
+        None, ts.isoformat(), (ts + timedelta(seconds=60)).isoformat(),
+        activity + 1, activity * SYNTHETIC_WINDOWS + random.randint(1, SYNTHETIC_WINDOWS), activity + 1,
+        60, random.uniform(30, 60), random.randint(0, 300), random.randint(0, 60),
+        0, random.uniform(0, 100), None, domain,
+    )
+
+
+def seed_dimensions(conn):
+    """Dictionary rows referenced by synthetic_session"""
+    for i, (proc, cat, subcat, _) in enumerate(SYNTHETIC_ACTIVITIES):
+        conn.execute(storage.STATEMENTS["apps"], (i + 1, proc, subcat))
+        conn.execute(storage.STATEMENTS["categories"], (i + 1, cat, subcat))
+        conn.executemany(storage.STATEMENTS["titles"], [
+            (i * SYNTHETIC_WINDOWS + n, f"{subcat} - window {n}") for n in range(1, SYNTHETIC_WINDOWS + 1)
+        ])
+
+
+def build_database(path, rows):
+    """Create a rollback-journal database with `rows` synthetic sessions"""
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    seed_dimensions(conn)
+    start = datetime.now() - timedelta(minutes=rows)
+    batch = []
+    for i in range(rows):
+        batch.append(synthetic_session(start + timedelta(minutes=i)))
+        if len(batch) >= 50_000:
+            conn.executemany(SESSION_INSERT, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(SESSION_INSERT, batch)
+    conn.commit()
+    conn.close()
+
+
+def write_legacy(db_path, writes):
+    """Connect, insert, commit and close per write (the pre-WAL behaviour)"""
+    latencies = []
+    for _ in range(writes):
+        row = synthetic_session(datetime.now())
+        t0 = time.perf_counter()
+        conn = sqlite3.connect(db_path)
+        conn.execute(SESSION_INSERT, row)
+        conn.commit()
+        conn.close()
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def write_wal(db_path, writes):
+    """Insert through the long-lived WAL writer connection"""
+    db = storage.WriterConnection(db_path)
+    latencies = []
+    for _ in range(writes):
+        row = synthetic_session(datetime.now())
+        t0 = time.perf_counter()
+        db.execute(SESSION_INSERT, row)
+        latencies.append(time.perf_counter() - t0)
+    db.close()
+    return latencies
+
+
+WRITERS = {"legacy": write_legacy, "wal": write_wal}
+
+
+def count_fsyncs(mode, db_path, writes):
+    """Count fsync/fdatasync calls of the write phase using strace, if present"""
+    if not shutil.which("strace"):
+        return None
+    cmd = [
+        "strace", "-f", "-c", "-e", "trace=fsync,fdatasync",
+        sys.executable, os.path.abspath(__file__), "db-writes",
+        "--mode", mode, "--db", db_path, "--writes", str(writes),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        match = re.match(r"\s*[\d.]+\s+[\d.]+\s+\d+\s+(\d+)\s+(?:\d+\s+)?(fsync|fdatasync)$", line)
+        if match:
+            total += int(match.group(1))
+    return total
+
+
+def bench_db(args):
+    """Per-write latency and fsync count: connect-per-write vs WAL writer"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        base = os.path.join(workdir, "base.db")
+        t0 = time.perf_counter()
+        build_database(base, args.rows)
+        build_seconds = time.perf_counter() - t0
+
+        results = {"rows": args.rows, "writes": args.writes, "build_seconds": build_seconds}
+        for mode, writer in WRITERS.items():
+            db_path = os.path.join(workdir, f"{mode}.db")
+            shutil.copy(base, db_path)
+            latencies = writer(db_path, args.writes)
+
+            shutil.copy(base, db_path)
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            fsyncs = count_fsyncs(mode, db_path, args.writes)
+
+            results[mode] = {
+                "latency": percentiles(latencies),
+                "fsyncs": fsyncs,
+                "fsyncs_per_write": fsyncs / args.writes if fsyncs is not None else None,
+            }
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_db_writes(args):
+    """Write phase only (used under strace by the db benchmark)"""
+    latencies = WRITERS[args.mode](args.db, args.writes)
+    return {"mode": args.mode, "latency": percentiles(latencies)}
+
+
+# ---------------------------------------------------------------------------
+# Dictionary-encoded sessions
+# ---------------------------------------------------------------------------
+
+# The sessions table as it was before the apps/titles/categories dictionaries
+LEGACY_SESSIONS = [
+    """
+        CREATE TABLE sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            process_name TEXT NOT NULL,
+            process_display_name TEXT,
+            window_title TEXT,
+            category TEXT NOT NULL,
+            subcategory TEXT,
+            duration_seconds REAL NOT NULL,
+            foreground_seconds REAL NOT NULL,
+            keystroke_count INTEGER DEFAULT 0,
+            mouse_click_count INTEGER DEFAULT 0,
+            is_focus_session BOOLEAN DEFAULT 0,
+            productivity_score REAL DEFAULT 0
+        )
+    """,
+    "CREATE INDEX idx_sessions_start ON sessions(start_time)",
+    "CREATE INDEX idx_sessions_category ON sessions(category)",
+]
+LEGACY_INSERT = """
+    INSERT INTO sessions
+    (start_time, end_time, process_name, process_display_name, window_title,
+     category, subcategory, duration_seconds, foreground_seconds,
+     keystroke_count, mouse_click_count, is_focus_session, productivity_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# The query DataLoader.load_sessions runs (used when pandas is not installed)
+LOAD_SESSIONS_QUERY = """
+    SELECT id, start_time, end_time, process_name, process_display_name,
+           window_title, category, subcategory, duration_seconds,
+           foreground_seconds, keystroke_count, mouse_click_count,
+           is_focus_session, productivity_score
+    FROM sessions
+    WHERE start_time >= datetime('now', ?)
+    ORDER BY start_time DESC
+"""
+
+
+def year_of_titles(rng):
+    """Window title pools per activity, sized like a year of real use"""
+    files = [f"{w}{i}.py" for w in ("models", "views", "utils", "test_api", "schema") for i in range(200)]
+    projects = [f"project-{i}" for i in range(12)]
+    issues = [f"Issue #{i}: {rng.choice(['Fix', 'Add', 'Refactor', 'Investigate'])} the flaky upload handler on retry" for i in range(3000)]
+    videos = [f"{rng.choice(['Lo-fi', 'Talk', 'Tutorial', 'Live'])} {i} - something long enough to look like a real title" for i in range(4000)]
+    return [
+        ("Code.exe", "PRIMARY_WORK", "VSCode", 0.45, [f"{f} - {p} - Visual Studio Code" for f in files for p in projects[:3]]),
+        ("chrome.exe", "PRIMARY_WORK", "Chrome", 0.25, [f"{t} - github.com - Google Chrome" for t in issues]),
+        ("Telegram.exe", "SECONDARY_WORK", "Telegram", 0.10, ["Telegram"] + [f"Telegram ({i})" for i in range(1, 50)]),
+        ("firefox.exe", "BROWSER_NONWORK", "Firefox (Leisure)", 0.15, [f"{v} - youtube.com - Mozilla Firefox" for v in videos]),
+        ("msedge.exe", "BROWSER_WORK", "Edge (Work)", 0.05, [f"{t} - docs.python.org - Microsoft Edge" for t in issues[:500]]),
+    ]
+
+
+def build_legacy_year(path, rows_per_day, seed=1, days=365, interval=60):
+    """A pre-dictionary database with a year (or `days`) of per-minute (or per-`interval`) session rows"""
+    rng = random.Random(seed)
+    activities = year_of_titles(rng)
+    weights = [a[3] for a in activities]
+    conn = sqlite3.connect(path)
+    for sql in LEGACY_SESSIONS:
+        conn.execute(sql)
+    start = datetime.now() - timedelta(days=days)
+    batch = []
+    for day in range(days):
+        t = start + timedelta(days=day, hours=9)
+        for _ in range(rows_per_day):
+            proc, cat, subcat, _, titles = rng.choices(activities, weights)[0]
+            # Recently used titles recur: skew picks toward the front of the pool
+            title = titles[min(int(rng.paretovariate(1.2)) - 1, len(titles) - 1)] if rng.random() < 0.7 else rng.choice(titles)
+            batch.append((
+                t.isoformat(), (t + timedelta(seconds=interval)).isoformat(), proc, subcat, title,
+                cat, subcat, float(interval), rng.uniform(interval / 2, interval), rng.randint(0, 300), rng.randint(0, 60),
+                0, rng.uniform(0, 100),
+            ))
+            t += timedelta(seconds=interval)
+        if len(batch) >= 50_000:
+            conn.executemany(LEGACY_INSERT, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(LEGACY_INSERT, batch)
+    conn.commit()
+    conn.close()
+
+
+def time_load_sessions(db_path, days, rounds):
+    """Seconds per DataLoader.load_sessions call (or its query, without pandas)"""
+    try:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dashboard"))
+        from utils.data_loader import DataLoader
+        loader = DataLoader(db_path)
+        load = lambda: loader.load_sessions(days)
+        method = "DataLoader.load_sessions"
+    except ImportError:
+        def load():
+            conn = sqlite3.connect(db_path)
+            conn.execute(LOAD_SESSIONS_QUERY, (f"-{days} days",)).fetchall()
+            conn.close()
+        method = "load_sessions query"
+
+    timings = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - t0)
+    return method, percentiles(timings)
+
+
+def bench_dictionary(args):
+    """DB size and load_sessions time for a year of sessions: text columns vs dictionary tables"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        legacy = os.path.join(workdir, "legacy.db")
+        build_legacy_year(legacy, args.rows_per_day)
+        encoded = os.path.join(workdir, "encoded.db")
+        shutil.copy(legacy, encoded)
+
+        conn = sqlite3.connect(encoded)
+        moved = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        t0 = time.perf_counter()
+        migrations.migrate(conn)
+        migrate_seconds = time.perf_counter() - t0
+        dictionary_rows = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("apps", "titles", "categories")}
+        conn.close()
+
+        results = {"sessions": moved, "migrate_seconds": migrate_seconds, "dictionary_rows": dictionary_rows}
+        for name, path in (("text_columns", legacy), ("dictionary", encoded)):
+            conn = sqlite3.connect(path)
+            conn.execute("VACUUM")
+            conn.close()
+            method, load = time_load_sessions(path, 365, args.rounds)
+            results[name] = {"db_mb": os.path.getsize(path) / 1e6, "load_sessions": load}
+        results["load_method"] = method
+        results["size_ratio"] = results["dictionary"]["db_mb"] / results["text_columns"]["db_mb"]
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def timed_migration(db_path, chunk_rows, fail_after=None):
+    """Seconds to migrate and the longest write transaction; optionally die after some chunks"""
+    conn = sqlite3.connect(db_path)
+    chunks = []
+    mark = [time.perf_counter()]
+
+    def progress(migration, rows):
+        now = time.perf_counter()
+        chunks.append(now - mark[0])
+        mark[0] = now
+        if fail_after is not None and len(chunks) >= fail_after:
+            raise KeyboardInterrupt
+
+    t0 = time.perf_counter()
+    try:
+        migrations.migrate(conn, chunk_rows, progress)
+    except KeyboardInterrupt:
+        pass
+    seconds = time.perf_counter() - t0
+    version = migrations.schema_version(conn)
+    conn.close()
+    return {"seconds": seconds, "chunks": len(chunks), "max_lock_ms": max(chunks, default=seconds) * 1000, "version": version}
+
+
+def bench_migrations(args):
+    """Upgrade of a year-old database: one transaction vs chunked backfill, resume, and startup cost once current"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        legacy = os.path.join(workdir, "legacy.db")
+        build_legacy_year(legacy, args.rows_per_day)
+        conn = sqlite3.connect(legacy)
+        rows = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        conn.close()
+        results = {"rows": rows, "db_mb": os.path.getsize(legacy) / 1e6}
+
+        for name, chunk_rows in (("single_transaction", rows + 1), ("chunked", args.chunk_rows)):
+            path = os.path.join(workdir, f"{name}.db")
+            shutil.copy(legacy, path)
+            results[name] = timed_migration(path, chunk_rows)
+
+        # Kill the upgrade halfway, then start again: it resumes at the last chunk
+        path = os.path.join(workdir, "resumed.db")
+        shutil.copy(legacy, path)
+        chunks = -(-rows // args.chunk_rows)
+        interrupted = timed_migration(path, args.chunk_rows, fail_after=chunks // 2)
+        resumed = timed_migration(path, args.chunk_rows)
+        results["resume"] = {
+            "interrupted_after_chunks": interrupted["chunks"],
+            "resumed_chunks": resumed["chunks"],
+            "resumed_seconds": resumed["seconds"],
+        }
+
+        # Startup on a current database: version check vs re-running every CREATE ... IF NOT EXISTS
+        conn = sqlite3.connect(os.path.join(workdir, "chunked.db"))
+        timings = {"user_version": [], "create_if_not_exists": []}
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            migrations.migrate(conn)
+            timings["user_version"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            with conn:
+                for sql in storage.SCHEMA + storage.VIEWS:
+                    conn.execute(sql)
+            timings["create_if_not_exists"].append(time.perf_counter() - t0)
+        conn.close()
+        results["startup"] = {name: percentiles(samples) for name, samples in timings.items()}
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Rollup tables
+# ---------------------------------------------------------------------------
+
+# What the dashboard reads for one view: every session, or rollups plus focus sessions and the timeline
+DASHBOARD_QUERIES = {
+    "sessions": [(LOAD_SESSIONS_QUERY, lambda days: (f"-{days} days",))],
+    "rollups": [
+        ("""
+            SELECT r.hour, c.category, c.subcategory, a.process_name, a.display_name,
+                   r.duration_seconds, r.foreground_seconds, r.productivity_weighted,
+                   r.session_count, r.category_switches
+            FROM hourly_rollups r
+            JOIN categories c ON c.id = r.category_id
+            JOIN apps a ON a.id = r.app_id
+            WHERE r.hour >= ?
+        """, lambda days: ((datetime.now() - timedelta(days=days)).replace(minute=0, second=0, microsecond=0).isoformat(),)),
+        ("""
+            SELECT r.day, c.category, a.process_name, a.display_name,
+                   r.duration_seconds, r.session_count
+            FROM daily_rollups r
+            JOIN categories c ON c.id = r.category_id
+            JOIN apps a ON a.id = r.app_id
+            WHERE r.day >= ?
+        """, lambda days: ((datetime.now() - timedelta(days=days)).date().isoformat(),)),
+        ("""
+            SELECT id, start_time, end_time, process_name, process_display_name,
+                   category, duration_seconds, foreground_seconds, is_focus_session
+            FROM sessions WHERE is_focus_session = 1 AND start_time >= ?
+        """, lambda days: ((datetime.now() - timedelta(days=days)).isoformat(),)),
+        (LOAD_SESSIONS_QUERY + " LIMIT 50", lambda days: (f"-{days} days",)),
+    ],
+}
+
+
+def bench_rollups(args):
+    """Rows read and load time for a dashboard view: raw sessions vs rollup tables"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        path = os.path.join(workdir, "rollups.db")
+        build_legacy_year(path, args.rows_per_day, days=args.days, interval=args.interval)
+        conn = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        migrations.migrate(conn)
+        results = {"backfill_seconds": time.perf_counter() - t0}
+        results["table_rows"] = {
+            t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            for t in ("session_facts", "hourly_rollups", "daily_rollups")
+        }
+
+        for name, queries in DASHBOARD_QUERIES.items():
+            timings = []
+            for _ in range(args.rounds):
+                t0 = time.perf_counter()
+                rows = sum(len(conn.execute(sql, params(args.days)).fetchall()) for sql, params in queries)
+                timings.append(time.perf_counter() - t0)
+            results[name] = {"rows": rows, "load": percentiles(timings)}
+        results["row_reduction"] = results["sessions"]["rows"] / max(1, results["rollups"]["rows"])
+
+        # Write side: one interval's session update alone vs with its rollup upserts
+        session_id = conn.execute("SELECT MAX(id) FROM session_facts").fetchone()[0]
+        conn.close()
+        conn = storage.connect(path)
+        start = datetime.now().replace(minute=59, second=50, microsecond=0)  # crosses an hour
+        for name, with_rollups in (("session_only", False), ("with_rollups", True)):
+            timings = []
+            for i in range(args.writes):
+                records = [("session_update", (start.isoformat(), None, 30.0 * i, 20.0 * i, 0, 0, 0, 50.0, session_id))]
+                if with_rollups:
+                    records += interval_records(start, 30.0, 20.0, 50.0, 1, 1)
+                t0 = time.perf_counter()
+                with conn:
+                    for kind, params in records:
+                        conn.execute(storage.STATEMENTS[kind], params)
+                timings.append(time.perf_counter() - t0)
+            results[f"write_{name}"] = percentiles(timings)
+        conn.close()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Retention
+# ---------------------------------------------------------------------------
+
+def add_idle_and_events(path, days, events_per_day, seed=1):
+    """Idle periods (lunch, a meeting, overnight) and system events for each day of a built year"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    start = datetime.now() - timedelta(days=days)
+    idle, events = [], []
+    for day in range(days):
+        base = start + timedelta(days=day)
+        for hour, reason in ((12.5, "idle"), (15, "lock"), (19, "sleep")):
+            t = base + timedelta(hours=hour)
+            seconds = rng.uniform(300, 3600)
+            idle.append((t.isoformat(), (t + timedelta(seconds=seconds)).isoformat(), seconds, reason))
+        for i in range(events_per_day):
+            t = base + timedelta(seconds=rng.uniform(0, 86400))
+            events.append(("flush", t.isoformat(), f"event {i}"))
+    conn.executemany(storage.STATEMENTS["idle_period"], idle)
+    conn.executemany(storage.STATEMENTS["system_event"], events)
+    conn.commit()
+    conn.close()
+
+
+def file_mb(db):
+    """Size of the database file with the WAL folded in"""
+    db.checkpoint()
+    return os.path.getsize(db.db_path) / 1e6
+
+
+def run_retention(path, convert_first):
+    """Expire a year-old database batch by batch, then vacuum it; lock times per transaction and step"""
+    db = storage.WriterConnection(path)
+    try:
+        if convert_first:
+            # What a database created by this version looks like
+            db.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            db.conn.execute("VACUUM")
+        size_before = file_mb(db)
+
+        policy = RetentionPolicy(db, None, SystemClock())
+        transactions = []
+        t0 = time.perf_counter()
+        while True:
+            t1 = time.perf_counter()
+            if not policy.expire_batch(db.conn):
+                break
+            transactions.append(time.perf_counter() - t1)
+        expire_seconds = time.perf_counter() - t0
+        size_expired = file_mb(db)
+        free_pages = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        steps = []
+        t0 = time.perf_counter()
+        while True:
+            t1 = time.perf_counter()
+            more = policy.vacuum_step(db.conn)
+            steps.append(time.perf_counter() - t1)
+            if not more:
+                break
+        vacuum_seconds = time.perf_counter() - t0
+        size_vacuumed = file_mb(db)
+
+        # An older file is only converted offline (python retention.py), never by the watcher
+        convert_seconds = None
+        if not policy.incremental:
+            convert_seconds = convert_to_incremental(db.conn)
+
+        remaining = {
+            table: db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("session_facts", "idle_periods", "system_events", "hourly_rollups", "daily_rollups")
+        }
+        return {
+            "batches": policy.stats()["batches_by_table"],
+            "expire_seconds": expire_seconds,
+            "transaction": percentiles(transactions),
+            "free_pages": free_pages,
+            "vacuum_seconds": vacuum_seconds,
+            "vacuum_step": percentiles(steps),
+            "incremental": policy.incremental,
+            "offline_convert_seconds": convert_seconds,
+            "mb_before": size_before,
+            "mb_after_expire": size_expired,
+            "mb_after_vacuum": size_vacuumed,
+            "mb_after_convert": file_mb(db) if convert_seconds is not None else None,
+            "remaining_rows": remaining,
+        }
+    finally:
+        db.close()
+
+
+def bench_retention(args):
+    """Aging out a year of data: write lock held per batch, file size, and totals kept by the rollups"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    saved = {name: getattr(config, name) for name in (
+        "RETENTION_SESSION_DAYS", "RETENTION_HOURLY_DAYS", "RETENTION_EVENT_DAYS", "RETENTION_BATCH_ROWS",
+    )}
+    try:
+        config.RETENTION_SESSION_DAYS = args.session_days
+        config.RETENTION_HOURLY_DAYS = args.hourly_days
+        config.RETENTION_EVENT_DAYS = args.event_days
+        config.RETENTION_BATCH_ROWS = args.batch_rows
+
+        legacy = os.path.join(workdir, "year.db")
+        build_legacy_year(legacy, args.rows_per_day)
+        conn = sqlite3.connect(legacy)
+        migrations.migrate(conn)
+        conn.close()
+        add_idle_and_events(legacy, 365, args.events_per_day)
+
+        results = {}
+        # An existing file (converted offline afterwards) vs one created with incremental vacuum
+        for name, convert_first in (("existing_file", False), ("incremental_file", True)):
+            path = os.path.join(workdir, f"{name}.db")
+            shutil.copy(legacy, path)
+            results[name] = run_retention(path, convert_first)
+        return results
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Parquet archive
+# ---------------------------------------------------------------------------
+
+# load_sessions over the archived months only, so both sides return the same rows
+ARCHIVED_SESSIONS_QUERY = """
+    SELECT id, start_time, end_time, process_name, process_display_name,
+           window_title, category, subcategory, duration_seconds,
+           foreground_seconds, keystroke_count, mouse_click_count,
+           is_focus_session, productivity_score
+    FROM sessions
+    WHERE start_time >= ? AND start_time < ?
+    ORDER BY start_time DESC
+"""
+ARCHIVE_COLUMNS = [
+    "id", "start_time", "end_time", "process_name", "process_display_name",
+    "window_title", "category", "subcategory", "duration_seconds",
+    "foreground_seconds", "keystroke_count", "mouse_click_count",
+    "is_focus_session", "productivity_score",
+]
+
+
+def read_archive(archive_dir, since, end):
+    """Rows DataLoader.load_archive reads for [since, end): partition and row-group pruned"""
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    partitioning = pads.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive")
+    dataset = pads.dataset(os.path.join(archive_dir, "sessions"), format="parquet", partitioning=partitioning)
+    expr = (pads.field("year") > since.year) | ((pads.field("year") == since.year) & (pads.field("month") >= since.month))
+    expr = expr & (pads.field("start_time") >= since) & (pads.field("start_time") < end)
+    return dataset.to_table(columns=ARCHIVE_COLUMNS, filter=expr).num_rows
+
+
+def bench_archive(args):
+    """Monthly Parquet archive of a year of sessions: export time, size, and long-range loads vs SQLite"""
+    if not archive.available():
+        return {"skipped": "pyarrow is not installed"}
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        path = os.path.join(workdir, "year.db")
+        build_legacy_year(path, args.rows_per_day)
+        conn = sqlite3.connect(path)
+        migrations.migrate(conn)
+        conn.execute("VACUUM")
+        conn.close()
+
+        archive_dir = os.path.join(workdir, "archive")
+        store = archive.MonthlyArchive(path, archive_dir)
+        t0 = time.perf_counter()
+        months = store.run(datetime.now())
+        export_seconds = time.perf_counter() - t0
+        parquet_bytes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(archive_dir) for name in names
+        )
+        results = {
+            "months": months,
+            "rows": store.exported_rows,
+            "export_seconds": export_seconds,
+            "sqlite_mb": os.path.getsize(path) / 1e6,
+            "parquet_mb": parquet_bytes / 1e6,
+        }
+
+        end = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        conn = sqlite3.connect(path)
+        for days in args.days:
+            since = datetime.now() - timedelta(days=days)
+            timings = {"sqlite": [], "parquet": []}
+            for _ in range(args.rounds):
+                t0 = time.perf_counter()
+                rows = len(conn.execute(ARCHIVED_SESSIONS_QUERY, (since.isoformat(), end.isoformat())).fetchall())
+                timings["sqlite"].append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                read_archive(archive_dir, since, end)
+                timings["parquet"].append(time.perf_counter() - t0)
+            results[f"load_{days}d"] = {
+                "rows": rows,
+                **{name: percentiles(samples) for name, samples in timings.items()},
+            }
+        conn.close()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Browser domain matching
+# ---------------------------------------------------------------------------
+
+def synthetic_domains(count):
+    """Split `count` domains into (work, non-work) lists, real ones first"""
+    work = list(config.WORK_DOMAINS)
+    nonwork = list(config.NON_WORK_DOMAINS)
+    i = 0
+    while len(work) + len(nonwork) < count:
+        (work if i % 2 == 0 else nonwork).append(f"site{i}-{random.choice('abcdefgh')}.example.com")
+        i += 1
+    work = work[:count // 2]
+    nonwork = nonwork[:count - len(work)]
+    return work, nonwork
+
+
+def synthetic_titles(work, nonwork, count):
+    """Browser titles: a third work sites, a third leisure sites, a third neither"""
+    titles = []
+    for i in range(count):
+        kind = i % 3
+        page = f"Issue #{random.randint(1, 9999)} - Some page title with a few words"
+        if kind == 0:
+            titles.append(f"{page} - {random.choice(work)} - Mozilla Firefox")
+        elif kind == 1:
+            titles.append(f"{page} - {random.choice(nonwork)} - Mozilla Firefox")
+        else:
+            titles.append(f"{page} - Mozilla Firefox")
+    return titles
+
+
+def match_loop(work, nonwork, title):
+    """The original per-sample linear substring scan"""
+    title_lower = title.lower()
+    for domain in work:
+        if domain in title_lower:
+            return "BROWSER_WORK"
+    for domain in nonwork:
+        if domain in title_lower:
+            return "BROWSER_NONWORK"
+    return None
+
+
+def best_of(repeat, fn):
+    """Shortest of `repeat` timed calls, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return min(timings)
+
+
+def bench_domains(args):
+    """Samples/second of domain classification: linear scan vs compiled regex vs the shipped matcher"""
+    results = {"default_config_domains": len(config.WORK_DOMAINS) + len(config.NON_WORK_DOMAINS)}
+    for count in args.domains:
+        work, nonwork = synthetic_domains(count)
+        titles = synthetic_titles(work, nonwork, args.samples)
+        classes = [("BROWSER_WORK", work), ("BROWSER_NONWORK", nonwork)]
+        matchers = {"compiled": DomainMatcher(classes, loop_max=0), "matcher": DomainMatcher(classes)}
+
+        loop_seconds = best_of(args.repeat, lambda: [match_loop(work, nonwork, t) for t in titles])
+
+        result = {"loop_samples_per_sec": len(titles) / loop_seconds}
+        for name, matcher in matchers.items():
+            seconds = best_of(args.repeat, lambda: [matcher.match(t) for t in titles])
+            result[f"{name}_samples_per_sec"] = len(titles) / seconds
+            result[f"{name}_speedup"] = loop_seconds / seconds
+        result["matcher_uses_regex"] = matchers["matcher"].pattern is not None
+        results[str(count)] = result
+    return results
+
+
+def labelled_browser_titles(count, seed=1):
+    """
+    (process, title, expected class) for browser windows, a quarter of them
+    pages on one site whose title mentions a domain of the other class
+    """
+    rng = random.Random(seed)
+    browsers = [("firefox.exe", "Mozilla Firefox"), ("chrome.exe", "Google Chrome"), ("msedge.exe", "Microsoft Edge"), ("brave.exe", "Brave")]
+    sites = [(d, "BROWSER_WORK") for d in config.WORK_DOMAINS] + [(d, "BROWSER_NONWORK") for d in config.NON_WORK_DOMAINS]
+    titles = []
+    for i in range(count):
+        process, suffix = rng.choice(browsers)
+        domain, label = rng.choice(sites)
+        if i % 4 == 0:
+            other = rng.choice([d for d, l in sites if l != label])
+            page = f"Why {other} went down today"
+        else:
+            page = f"Issue #{rng.randint(1, 9999)} - Some page title"
+        titles.append((process, f"{page} - {domain} - {suffix}", label))
+    return titles
+
+
+def bench_titles(args):
+    """Browser title parsing: cost per title and misclassifications, substring search vs hostname"""
+    titles = labelled_browser_titles(args.titles)
+    rules = default_rules()
+
+    t0 = time.perf_counter()
+    substring = [rules.domain_matcher.match(title) for _, title, _ in titles]
+    substring_seconds = time.perf_counter() - t0
+
+    parser = TitleParser(rules.browser_apps, rules.site_domains, cache_size=len(titles))
+    t0 = time.perf_counter()
+    parsed = [rules.classify_domain(parser.domain(process, title) or "") for process, title, _ in titles]
+    parse_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for process, title, _ in titles:
+        parser.domain(process, title)
+    cached_seconds = time.perf_counter() - t0
+
+    return {
+        "titles": len(titles),
+        "substring_us_per_title": substring_seconds / len(titles) * 1e6,
+        "parse_us_per_title": parse_seconds / len(titles) * 1e6,
+        "cached_us_per_title": cached_seconds / len(titles) * 1e6,
+        "substring_misclassified": sum(1 for got, (_, _, want) in zip(substring, titles) if got != want),
+        "parser_misclassified": sum(1 for got, (_, _, want) in zip(parsed, titles) if got != want),
+    }
+
+
+def synthetic_rules(count, seed=1):
+    """
+    `count` ordered rules over 40 processes: mostly domain rules, some
+    literal and regex title rules, a few globbed, process-less or
+    time-of-day rules. Returns (rule dicts, processes, title words).
+    """
+    rng = random.Random(seed)
+    processes = [f"app{i}.exe" for i in range(32)] + ["chrome.exe", "firefox.exe", "msedge.exe", "brave.exe", "code.exe", "slack.exe", "teams.exe", "zoom.exe"]
+    categories = sorted(CATEGORY_SCORES)
+    words = []
+    rules = []
+    for i in range(count):
+        roll = rng.random()
+        rule = {"category": rng.choice(categories)}
+        if roll < 0.80:
+            rule["process"] = rng.choice(processes)
+        elif roll < 0.95:
+            rule["process"] = rng.choice(processes)[:3] + "*"
+        kind = rng.random()
+        if kind < 0.70:
+            rule["domain"] = [f"site{i}-{j}.example.com" for j in range(rng.randint(1, 3))]
+            words.extend(rule["domain"])
+        elif kind < 0.90:
+            rule["title"] = f"Project {i} board"
+            words.append(rule["title"])
+        else:
+            rule["title"] = rf"\bticket-{i}\b"
+            words.append(f"ticket-{i}")
+        if rng.random() < 0.02:
+            rule["hours"] = rng.choice(["09:00-17:00", "22:00-06:00"])
+        rules.append(rule)
+    return rules, processes, words
+
+
+def match_rules_loop(rules, process_lower, title, minute, domain):
+    """Reference: evaluate every rule in order"""
+    lowered = title.lower()
+    suffixes = domain_suffixes(domain) if domain else None
+    for rule in rules:
+        if fnmatch.fnmatchcase(process_lower, rule.process) and rule.applies(title, lowered, minute, suffixes):
+            return rule
+    return None
+
+
+def bench_rule_engine(args):
+    """Per-sample cost of the ordered rule engine vs evaluating every rule in order"""
+    rules, processes, words = synthetic_rules(args.rules)
+    t0 = time.perf_counter()
+    engine = RuleSet({}, {}, {}, [], [], rules=rules).engine
+    compile_seconds = time.perf_counter() - t0
+
+    # Browsers get their hostname from the title parser, other apps search the title
+    rng = random.Random(2)
+    parser = TitleParser()
+    samples = []
+    for i in range(args.samples):
+        process = rng.choice(processes)
+        page = f"Issue #{rng.randint(1, 9999)} - Some page title with a few words"
+        title = f"{page} - {rng.choice(words)}" if i % 2 == 0 else page
+        samples.append((process, title, rng.randrange(1440), parser.domain(process, title)))
+
+    t0 = time.perf_counter()
+    for process, _, _, _ in samples:
+        engine.bucket(process)
+    bucket_seconds = time.perf_counter() - t0  # first sight of each process resolves its globs
+
+    t0 = time.perf_counter()
+    actual = [engine.match(process, title, minute, domain) for process, title, minute, domain in samples]
+    engine_seconds = time.perf_counter() - t0
+
+    reference_samples = samples[:max(1, len(samples) // 10)]
+    t0 = time.perf_counter()
+    for sample in reference_samples:
+        match_rules_loop(engine.rules, *sample)
+    loop_seconds = time.perf_counter() - t0
+
+    return {
+        "rules": len(engine.rules),
+        "compile_ms": compile_seconds * 1000,
+        "bucket_resolve_ms": bucket_seconds * 1000,
+        "largest_bucket": max(sum(group.size for group in bucket) for bucket in engine._buckets.values()),
+        "engine_us_per_sample": engine_seconds / len(samples) * 1e6,
+        "loop_us_per_sample": loop_seconds / len(reference_samples) * 1e6,
+        "rule_hits": sum(1 for rule in actual if rule is not None),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Adaptive sampling
+# ---------------------------------------------------------------------------
+
+def synthetic_trace(hours, mean_dwell=120.0, seed=1):
+    """Foreground changes (t, key) with exponential dwell times"""
+    rng = random.Random(seed)
+    keys = [f"window-{i}" for i in range(20)]
+    trace, t = [], 0.0
+    while t < hours * 3600:
+        trace.append((t, rng.choice(keys)))
+        t += max(1.0, rng.expovariate(1.0 / mean_dwell))
+    return trace
+
+
+def true_durations(trace, end):
+    """Exact seconds per key from the change trace"""
+    totals = {}
+    for (t, key), nxt in zip(trace, trace[1:] + [(end, None)]):
+        totals[key] = totals.get(key, 0.0) + min(nxt[0], end) - t
+    return totals
+
+
+def replay_sampler(trace, end, sampler):
+    """Sample the trace on the sampler's schedule, weighting by elapsed time"""
+    times = [t for t, _ in trace]
+    totals = {}
+    t, prev, prev_t = 0.0, None, 0.0
+    while t < end:
+        key = trace[bisect.bisect_right(times, t) - 1][1]
+        if prev is not None:
+            totals[prev] = totals.get(prev, 0.0) + t - prev_t
+        prev, prev_t = key, t
+        t += sampler.observe(key)
+    totals[prev] = totals.get(prev, 0.0) + end - prev_t
+    return totals
+
+
+def attribution_error(estimate, reference, total):
+    """Fraction of time credited to the wrong activity"""
+    keys = set(estimate) | set(reference)
+    return sum(abs(estimate.get(k, 0.0) - reference.get(k, 0.0)) for k in keys) / 2 / total
+
+
+def bench_adaptive(args):
+    """Wakeups per hour and duration error: adaptive vs fixed 1s sampling"""
+    results = {}
+    for dwell in args.dwell:
+        end = args.hours * 3600.0
+        trace = synthetic_trace(args.hours, dwell)
+        truth = true_durations(trace, end)
+
+        fixed = AdaptiveSampler(enabled=False)
+        adaptive = AdaptiveSampler(enabled=True)
+        fixed_totals = replay_sampler(trace, end, fixed)
+        adaptive_totals = replay_sampler(trace, end, adaptive)
+
+        results[f"mean_dwell_{dwell:g}s"] = {
+            "changes": len(trace),
+            "fixed_wakeups_per_hour": fixed.wakeups / args.hours,
+            "adaptive_wakeups_per_hour": adaptive.wakeups / args.hours,
+            "fixed_error_vs_truth": attribution_error(fixed_totals, truth, end),
+            "adaptive_error_vs_truth": attribution_error(adaptive_totals, truth, end),
+            "adaptive_error_vs_fixed": attribution_error(adaptive_totals, fixed_totals, end),
+        }
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Watcher hot path
+# ---------------------------------------------------------------------------
+
+def trace_samples(trace, seconds):
+    """Expand a change trace into one (process, process_lower, title) per second"""
+    samples, i = [], 0
+    for t in range(int(seconds)):
+        while i + 1 < len(trace) and trace[i + 1][0] <= t:
+            i += 1
+        _, proc, title = trace[i]
+        samples.append((proc, proc.lower() if proc else None, title))
+    return samples
+
+
+def make_watcher(db_path):
+    """ActivityWatcher on a virtual clock with no desktop attached"""
+    from watcher import ActivityWatcher
+    return ActivityWatcher(
+        db_path=db_path, provider=ForegroundProvider(), clock=VirtualClock(), interactive=False,
+        input_source=InputSource(),
+    )
+
+
+def bench_categorize(args):
+    """Samples/second through categorize_activity for each replay workload"""
+    results = {}
+    for name, generator in sorted(WORKLOADS.items()):
+        samples = trace_samples(generator(args.hours), args.hours * 3600)
+
+        categorizer = Categorizer()
+        t0 = time.perf_counter()
+        for proc, proc_lower, title in samples:
+            categorizer.categorize(proc, proc_lower, title)
+        cached = time.perf_counter() - t0
+
+        uncached_categorizer = Categorizer()
+        t0 = time.perf_counter()
+        for proc, proc_lower, title in samples:
+            if proc:
+                uncached_categorizer._categorize(proc, proc_lower, title)
+        uncached = time.perf_counter() - t0
+
+        results[name] = {
+            "samples": len(samples),
+            "samples_per_sec": len(samples) / cached,
+            "uncached_samples_per_sec": len(samples) / uncached,
+            "cache": categorizer.stats(),
+        }
+    return results
+
+
+def bench_flush(args):
+    """flush_buffer latency percentiles for different per-interval sample counts"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    watcher = make_watcher(os.path.join(workdir, "flush.db"))
+    try:
+        samples = trace_samples(WORKLOADS["high_switching"](24), 24 * 3600)
+        categorized = [
+            (proc, title, *watcher.categorize_activity(proc, proc_lower, title))
+            for proc, proc_lower, title in samples
+        ]
+
+        results = {}
+        for size in args.sizes:
+            fill, flush = [], []
+            for r in range(args.rounds):
+                offset = (r * size) % max(1, len(categorized) - size)
+                chunk = categorized[offset:offset + size]
+                t0 = time.perf_counter()
+                for sample in chunk:
+                    watcher.buffer.add(*sample)
+                t1 = time.perf_counter()
+                watcher.flush_buffer(force=True)
+                t2 = time.perf_counter()
+                fill.append((t1 - t0) / max(1, len(chunk)))
+                flush.append(t2 - t1)
+            results[str(size)] = {
+                "flush": percentiles(flush),
+                "add_per_sample_us": statistics.fmean(fill) * 1e6,
+            }
+        return results
+    finally:
+        watcher.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def dashboard_reader(db_path, stop, counts):
+    """Repeat the dashboard's 30-day session query until stopped"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    while not stop.is_set():
+        conn.execute("""
+            SELECT * FROM sessions
+            WHERE start_time >= datetime('now', '-30 days')
+            ORDER BY start_time DESC
+        """).fetchall()
+        counts.append(1)
+    conn.close()
+
+
+def bench_concurrent(args):
+    """WAL writer latency with and without concurrent dashboard readers"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        db_path = os.path.join(workdir, "concurrent.db")
+        build_database(db_path, args.rows)
+        db = storage.WriterConnection(db_path)
+
+        results = {"rows": args.rows}
+        for readers in sorted({0, args.readers}):
+            stop, counts = threading.Event(), []
+            threads = [
+                threading.Thread(target=dashboard_reader, args=(db_path, stop, counts), daemon=True)
+                for _ in range(readers)
+            ]
+            for thread in threads:
+                thread.start()
+
+            latencies = []
+            for _ in range(args.writes):
+                row = synthetic_session(datetime.now())
+                t0 = time.perf_counter()
+                db.execute(SESSION_INSERT, row)
+                latencies.append(time.perf_counter() - t0)
+                time.sleep(args.interval)
+
+            stop.set()
+            for thread in threads:
+                thread.join()
+            results[f"readers_{readers}"] = {
+                "write": percentiles(latencies),
+                "reader_queries": len(counts),
+            }
+        db.close()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_memory(args):
+    """Memory footprint of the watcher after a simulated day"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        trace = WORKLOADS[args.workload](args.hours)
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        watcher = run_replay(trace, os.path.join(workdir, "memory.db"), args.hours * 3600)
+        wall = time.perf_counter() - t0
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "workload": args.workload,
+            "simulated_hours": args.hours,
+            "wall_seconds": wall,
+            "samples": watcher.provider.samples,
+            "traced_current_mb": current / 2**20,
+            "traced_peak_mb": peak / 2**20,
+            # Portable (the resource module is Unix-only); the day has run, so current RSS is near the peak
+            "rss_mb": psutil.Process().memory_info().rss / 2**20,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_sessions(args):
+    """sessions rows per simulated day and dashboard query time, coalesced vs one row per flush"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    coalescing = config.SESSION_COALESCING
+    try:
+        results = {}
+        for name, generator in sorted(WORKLOADS.items()):
+            trace = generator(args.hours)
+            result = {}
+            for mode, enabled in (("per_flush", False), ("coalesced", True)):
+                config.SESSION_COALESCING = enabled
+                db_path = os.path.join(workdir, f"{name}-{mode}.db")
+                run_replay(trace, db_path, args.hours * 3600)
+
+                conn = sqlite3.connect(db_path)
+                rows, total, focus = conn.execute(
+                    "SELECT COUNT(*), SUM(duration_seconds), SUM(is_focus_session) FROM sessions"
+                ).fetchone()
+                latencies = []
+                for _ in range(args.queries):
+                    t0 = time.perf_counter()
+                    conn.execute("""
+                        SELECT * FROM sessions
+                        WHERE start_time >= datetime('now', '-30 days')
+                        ORDER BY start_time DESC
+                    """).fetchall()
+                    latencies.append(time.perf_counter() - t0)
+                conn.close()
+                result[mode] = {
+                    "rows": rows,
+                    "duration_seconds": total,
+                    "focus_sessions": focus,
+                    "query": percentiles(latencies),
+                }
+            result["row_reduction"] = result["per_flush"]["rows"] / max(1, result["coalesced"]["rows"])
+            results[name] = result
+        return results
+    finally:
+        config.SESSION_COALESCING = coalescing
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class DriftingClock(VirtualClock):
+    """
+    Virtual clock with real-world timing faults: every sleep overshoots
+    (timer slack plus an exponential tail), some steps stall (slow flush,
+    GC, swapped-out process) and the wall clock is stepped every few hours
+    (NTP corrections, manual changes, DST-like offsets).
+    """
+
+    def __init__(self, start, seed=1, overshoot=0.002, stall_rate=0.001, jump_every=6 * 3600.0):
+        super().__init__(start)
+        self.rng = random.Random(seed)
+        self.overshoot = overshoot
+        self.stall_rate = stall_rate
+        self.jump_every = jump_every
+        self.next_jump = jump_every
+        self.wall_offset = 0.0
+        self.jumps = 0
+
+    def time(self):
+        return self.start + self.elapsed + self.wall_offset
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        self.elapsed += seconds + self.rng.expovariate(1.0 / self.overshoot)
+        if self.rng.random() < self.stall_rate:
+            self.elapsed += self.rng.uniform(0.5, 3.0)
+        if self.elapsed >= self.next_jump:
+            self.wall_offset += self.rng.choice([-1, 1]) * self.rng.uniform(5, 120)
+            self.next_jump += self.jump_every
+            self.jumps += 1
+
+
+def bench_drift(args):
+    """Accumulated duration error over a simulated week: measured vs FLUSH_INTERVAL per flush"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        # Always-active trace (no away periods), so every second is tracked
+        procs = ["Code.exe", "Telegram.exe", "Cursor.exe", "Spotify.exe"]
+        trace = [
+            (t, procs[int(key.split("-")[1]) % len(procs)], f"{key} - work")
+            for t, key in synthetic_trace(args.days * 24, args.dwell)
+        ]
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=args.days)
+        clock = DriftingClock(start)
+        db_path = os.path.join(workdir, "drift.db")
+        watcher = run_replay(trace, db_path, args.days * 86400.0, clock=clock)
+
+        conn = sqlite3.connect(db_path)
+        recorded, rows, last_end = conn.execute(
+            "SELECT SUM(duration_seconds), COUNT(*), MAX(end_time) FROM sessions"
+        ).fetchone()
+        conn.close()
+
+        # Time the activity was actually in the foreground, on the true timeline
+        truth = clock.monotonic()
+        synthesized = watcher.flushes * config.FLUSH_INTERVAL
+        true_end = datetime.fromtimestamp(clock.start + truth + clock.wall_offset)
+        return {
+            "simulated_days": args.days,
+            "flushes": watcher.flushes,
+            "rows": rows,
+            "wall_clock_jumps": clock.jumps,
+            "detected_jumps": watcher.wall.jumps,
+            "true_seconds": truth,
+            "measured_seconds": recorded,
+            "measured_error_seconds": recorded - truth,
+            "measured_error_pct": (recorded - truth) / truth * 100,
+            "synthesized_seconds": synthesized,
+            "synthesized_error_seconds": synthesized - truth,
+            "synthesized_error_pct": (synthesized - truth) / truth * 100,
+            "last_end_time_error_seconds": (datetime.fromisoformat(last_end) - true_end).total_seconds(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def office_day(seed=1):
+    """
+    24h trace where the editor stays in the foreground through lunch and
+    overnight, plus the OS idle periods that go with it
+    """
+    editor = ("Code.exe", "watcher.py - activity-tracker - Visual Studio Code")
+    # (work starts, work hours, away until) - 09:00-12:00, 13:00-18:00
+    blocks = [(0.0, 3, 4 * 3600.0), (4 * 3600.0, 5, 24 * 3600.0)]
+    trace, idle = [], []
+    for i, (offset, hours, away_until) in enumerate(blocks):
+        trace += [(offset + t, proc, title) for t, proc, title in WORKLOADS["deep_work"](hours, seed + i)]
+        trace.append((offset + hours * 3600.0, *editor))
+        idle.append((offset + hours * 3600.0, away_until))
+    return trace, idle
+
+
+def bench_idle(args):
+    """Hot-path work and tracked time over a day with lunch and overnight: OS idle counter vs window heuristic"""
+    from idle import FakeIdleProvider, IdleProvider
+    from replay import away_periods
+
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        trace, idle = office_day()
+        start = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        results = {"true_active_seconds": 8 * 3600.0}
+        for mode in ("heuristic", "os_idle"):
+            clock = VirtualClock(start)
+            provider = IdleProvider() if mode == "heuristic" else FakeIdleProvider(clock, idle + away_periods(trace))
+            db_path = os.path.join(workdir, f"{mode}.db")
+            t0 = time.perf_counter()
+            watcher = run_replay(trace, db_path, 24 * 3600.0, clock=clock, idle_provider=provider)
+            wall = time.perf_counter() - t0
+
+            conn = sqlite3.connect(db_path)
+            tracked = conn.execute("SELECT SUM(duration_seconds) FROM sessions").fetchone()[0]
+            idle_rows, idle_seconds = conn.execute("SELECT COUNT(*), SUM(duration_seconds) FROM idle_periods").fetchone()
+            conn.close()
+            cache = watcher.categorizer.stats()
+            results[mode] = {
+                "foreground_lookups": watcher.provider.samples,
+                "categorizations": cache["hits"] + cache["misses"],
+                "skipped_samples": watcher.skipped_samples,
+                "tracked_seconds": tracked,
+                "idle_periods": idle_rows,
+                "idle_seconds": idle_seconds,
+                "wall_seconds": wall,
+            }
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_input(args):
+    """Per-event cost of the input counters and end-to-end counts at 100+ events/second"""
+    n = args.events
+    counters = InputCounters()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        counters.key()
+    lock_free = time.perf_counter() - t0
+
+    lock, locked = threading.Lock(), [0]
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with lock:
+            locked[0] += 1
+    with_lock = time.perf_counter() - t0
+
+    events = queue.SimpleQueue()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        events.put(("key", time.time()))
+    per_event_queue = time.perf_counter() - t0
+
+    results = {
+        "events": n,
+        "lock_free_ns": lock_free / n * 1e9,
+        "locked_ns": with_lock / n * 1e9,
+        "event_queue_ns": per_event_queue / n * 1e9,
+    }
+
+    # Synthetic sources on background threads: nothing may be lost
+    for rate in args.rates:
+        source = SyntheticInputSource(rate=rate, threads=args.threads, seed=1)
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        harvested = 0
+        while time.perf_counter() - t0 < args.seconds:
+            time.sleep(0.25)
+            harvested += sum(source.harvest())
+        source.close()
+        wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+        harvested += sum(source.harvest())
+        results[f"rate_{rate}"] = {
+            "generated": source.generated_events,
+            "harvested": harvested,
+            "lost": source.generated_events - harvested,
+            "events_per_sec": harvested / wall,
+            "cpu_percent": cpu / wall * 100,
+        }
+
+    # End to end on the real clock: a watcher with one foreground window and
+    # a 1s flush interval must record every generated event in sessions
+    from watcher import ActivityWatcher
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    flush_interval = config.FLUSH_INTERVAL
+    config.FLUSH_INTERVAL = 1
+    try:
+        db_path = os.path.join(workdir, "input.db")
+        clock = SystemClock()
+        source = SyntheticInputSource(rate=max(args.rates), threads=args.threads, seed=2)
+        provider = ReplayProvider([(0.0, "Code.exe", "bench.py - Visual Studio Code")], clock)
+        watcher = ActivityWatcher(db_path=db_path, provider=provider, clock=clock, interactive=False, input_source=source)
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            watcher.monitor_step()
+        source.close()
+        watcher.shutdown()
+
+        conn = sqlite3.connect(db_path)
+        keys, clicks = conn.execute("SELECT SUM(keystroke_count), SUM(mouse_click_count) FROM sessions").fetchone()
+        conn.close()
+        results["watcher"] = {
+            "seconds": args.seconds,
+            "generated": source.generated_events,
+            "recorded_keystrokes": keys,
+            "recorded_clicks": clicks,
+            "lost": source.generated_events - (keys or 0) - (clicks or 0),
+        }
+    finally:
+        config.FLUSH_INTERVAL = flush_interval
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def bench_journal(args):
+    """Per-sample cost of the sample journal vs the old tuple buffer plus logging"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        categorizer = Categorizer()
+        samples = [
+            (proc, title, *categorizer.categorize(proc, proc_lower, title))
+            for proc, proc_lower, title in trace_samples(WORKLOADS["high_switching"](args.hours), args.hours * 3600)
+        ]
+        n = len(samples)
+        ts = time.time()
+
+        # Old hot path: timestamped 7-tuple appended to a list, plus a debug log call
+        buffer = []
+        t0 = time.perf_counter()
+        for proc, title, cat, subcat, score in samples:
+            buffer.append((time.time(), proc, proc, title, cat, subcat, score))
+            logging.debug(f"Sample: {proc} | {cat}")
+        baseline = time.perf_counter() - t0
+
+        path = os.path.join(workdir, "bench.db-samples")
+        journal = SampleJournal(path)
+        appending = flushing = committing = 0.0
+        for start in range(0, n, config.FLUSH_INTERVAL):
+            chunk = samples[start:start + config.FLUSH_INTERVAL]
+            t0 = time.perf_counter()
+            for sample in chunk:
+                journal.append(sample, time.time(), 1.0)
+            t1 = time.perf_counter()
+            # Flush every interval like the watcher does; the writer thread commits it
+            seq = journal.flush()
+            t2 = time.perf_counter()
+            journal.commit(seq)
+            appending += t1 - t0
+            flushing += t2 - t1
+            committing += time.perf_counter() - t2
+        flushes = -(-n // config.FLUSH_INTERVAL)
+        rewinds = journal.stats()["rewinds"]
+        journal.close()
+
+        # A writer that falls behind: the file grows, then shrinks on the first rewind
+        journal = SampleJournal(os.path.join(workdir, "behind.db-samples"))
+        seqs = []
+        for start in range(0, min(n, 20000), config.FLUSH_INTERVAL):
+            for i, sample in enumerate(samples[start:start + config.FLUSH_INTERVAL]):
+                journal.append(sample, ts + start + i, 1.0)
+            seqs.append(journal.flush())
+        grown = journal.size
+        journal.commit(seqs[-1])
+        journal.append(samples[0], ts, 1.0)
+        shrunk = journal.size
+        journal.close()
+
+        # Crash recovery: one committed interval, one flushed but not
+        # committed, one still open; only the last two are read back
+        path = os.path.join(workdir, "crash.db-samples")
+        journal = SampleJournal(path)
+        for interval in range(3):
+            for i, sample in enumerate(samples[interval * args.recover:(interval + 1) * args.recover]):
+                journal.append(sample, ts + interval * args.recover + i, 1.0)
+            if interval == 0:
+                journal.commit(journal.flush())
+            elif interval == 1:
+                journal.flush()
+        recovered = SampleJournal(path)
+        t0 = time.perf_counter()
+        read_back = recovered.read()
+        recovery = time.perf_counter() - t0
+        journal.close()
+        recovered.close()
+
+        return {
+            "samples": n,
+            "tuple_append_log_us": baseline / n * 1e6,
+            "journal_append_us": appending / n * 1e6,
+            "ratio": appending / baseline,
+            "flush_us": flushing / flushes * 1e6,
+            "rewinds": rewinds,
+            # One commit (header write and msync) per interval, on the writer thread
+            "writer_commit_us": committing / flushes * 1e6,
+            # Real cadence on the sampling thread: one sample per
+            # SAMPLE_INTERVAL, one flush per FLUSH_INTERVAL
+            "amortized_us_per_sample": (
+                appending / n + flushing / flushes * config.SAMPLE_INTERVAL / config.FLUSH_INTERVAL
+            ) * 1e6,
+            "grown_bytes": grown,
+            "shrunk_bytes": shrunk,
+            "recovered_samples": len(read_back),
+            "recovery_ms": recovery * 1e3,
+            "file_bytes": os.path.getsize(path),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Metrics endpoint
+# ---------------------------------------------------------------------------
+
+def bench_metrics(args):
+    """Per-sample cost of the loop timings, and the cost of a scrape of the local endpoint"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        watcher = run_replay(WORKLOADS["high_switching"](args.hours), os.path.join(workdir, "metrics.db"), args.hours * 3600)
+        metrics = watcher.metrics
+        iterations = sum(metrics.loop.counts)
+
+        # What monitor_step adds to a sampling iteration: five perf_counter() calls and three observe()
+        histogram = Histogram()
+        clock = time.perf_counter
+        t0 = clock()
+        for _ in range(args.iterations):
+            started = clock()
+            a = clock()
+            b = clock()
+            c = clock()
+            histogram.observe(b - a)
+            histogram.observe(c - b)
+            histogram.observe(clock() - started)
+        instrumentation = (clock() - t0) / args.iterations
+
+        loop_mean = metrics.loop.sum / max(1, iterations)
+        results = {
+            "iterations": iterations,
+            "loop_mean_us": loop_mean * 1e6,
+            "stage_mean_us": {
+                stage: h.sum / max(1, sum(h.counts)) * 1e6 for stage, h in metrics.stages.items()
+            },
+            "db_write_mean_ms": watcher.writer.write_seconds.sum / max(1, sum(watcher.writer.write_seconds.counts)) * 1000,
+            "instrumentation_ns": instrumentation * 1e9,
+            "instrumentation_pct_of_loop": instrumentation / loop_mean * 100 if loop_mean else None,
+            "instrumentation_pct_of_1s_sample": instrumentation * 100,
+        }
+
+        server = start_server(metrics, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        try:
+            timings = []
+            for _ in range(args.scrapes):
+                t0 = time.perf_counter()
+                with urllib.request.urlopen(url) as response:
+                    body = response.read().decode("utf-8")
+                timings.append(time.perf_counter() - t0)
+        finally:
+            server.shutdown()
+            server.server_close()
+        results["scrape"] = percentiles(timings)
+        results["scrape_bytes"] = len(body)
+        results["series"] = sum(1 for line in body.splitlines() if line and not line.startswith("#"))
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Logging
+# ---------------------------------------------------------------------------
+
+class StallingFileHandler(logging.FileHandler):
+    """A log file on a disk that stalls for `stall` seconds every `every` writes (AV scan, sleeping disk)"""
+
+    def __init__(self, path, stall, every):
+        super().__init__(path, encoding="utf-8")
+        self.stall = stall
+        self.every = every
+        self.writes = 0
+
+    def emit(self, record):
+        self.writes += 1
+        if self.stall and self.writes % self.every == 0:
+            time.sleep(self.stall)
+        super().emit(record)
+
+
+def bench_logging(args):
+    """Time a log call costs the sampling thread: synchronous handlers vs the queue listener; rate-limited warnings"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    results = {}
+    try:
+        for disk, stall in (("normal_disk", 0.0), ("stalling_disk", args.stall_ms / 1000.0)):
+            results[disk] = {}
+            for mode in ("sync", "queue"):
+                logger = logging.getLogger(f"bench.{disk}.{mode}")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                file_handler = StallingFileHandler(os.path.join(workdir, f"{disk}-{mode}.log"), stall, args.every)
+                file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+                devnull = open(os.devnull, "w", encoding="utf-8")
+                console = logging.StreamHandler(devnull)
+                listener = None
+                if mode == "sync":
+                    logger.addHandler(file_handler)
+                    logger.addHandler(console)
+                else:
+                    records = queue.SimpleQueue()
+                    logger.addHandler(logging.handlers.QueueHandler(records))
+                    listener = logging.handlers.QueueListener(records, file_handler, console)
+                    listener.start()
+
+                timings = []
+                for i in range(args.records):
+                    t0 = time.perf_counter()
+                    logger.info(f"💻 Session: VSCode | 60s (total {i * 60}s) | FG: 60.0s | Score: 100")
+                    timings.append(time.perf_counter() - t0)
+                if listener:
+                    listener.stop()
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                    handler.close()
+                devnull.close()
+                results[disk][mode] = percentiles(timings)
+
+        # The no-process-name warning once per flush for a day on Linux
+        limiter = RateLimitFilter(config.LOG_REPEAT_INTERVAL)
+        start = time.time()
+        warnings = 24 * 3600 // config.FLUSH_INTERVAL
+        logged = 0
+        for i in range(warnings):
+            record = logging.LogRecord("root", logging.WARNING, __file__, 1, "Skipping session flush", None, None)
+            record.created = start + i * config.FLUSH_INTERVAL
+            logged += limiter.filter(record)
+        results["rate_limit"] = {"warnings": warnings, "logged": logged}
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Suite and comparison
+# ---------------------------------------------------------------------------
+
+def git_revision():
+    """Current commit, if running from a git checkout"""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_rules(args):
+    """Cost of watching the rules file and of compiling and swapping in an edit"""
+    workdir = tempfile.mkdtemp(prefix="watcher-bench-")
+    try:
+        path = os.path.join(workdir, "rules.json")
+        rules = {
+            "apps": {
+                "primary": dict(config.PRIMARY_WORK_APPS),
+                "secondary": dict(config.SECONDARY_WORK_APPS),
+                "browsers": dict(config.BROWSER_APPS),
+            },
+            "domains": {
+                "work": list(config.WORK_DOMAINS) + [f"work{i}.example.com" for i in range(args.domains)],
+                "nonwork": list(config.NON_WORK_DOMAINS),
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rules, f)
+
+        # Called once per sample for a simulated hour at 1s sampling
+        rules_file = RulesFile(path, check_interval=config.RULES_CHECK_INTERVAL)
+        categorizer = Categorizer(rules_file=rules_file)
+        checks_before = rules_file.checks
+        t0 = time.perf_counter()
+        for second in range(3600):
+            categorizer.check_rules(float(second))
+        poll = time.perf_counter() - t0
+        stats_per_hour = rules_file.checks - checks_before
+
+        # Edit the file and time the stat + parse + compile + swap
+        swaps = []
+        for i in range(args.reloads):
+            rules["apps"]["primary"][f"tool{i}.exe"] = f"Tool {i}"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rules, f)
+            os.utime(path, ns=(0, (i + 1) * 1_000_000_000))  # distinct mtime even on coarse filesystems
+            t0 = time.perf_counter()
+            categorizer.check_rules(1e9 + i * config.RULES_CHECK_INTERVAL)
+            swaps.append(time.perf_counter() - t0)
+
+        return {
+            "domains": len(rules["domains"]["work"]) + len(rules["domains"]["nonwork"]),
+            "check_ns_per_sample": poll / 3600 * 1e9,
+            "stats_per_hour": stats_per_hour,
+            "reload": percentiles(swaps),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_suite(args):
+    """Run every benchmark with suite-sized parameters"""
+    quick = args.quick
+    ns = argparse.Namespace
+    benchmarks = {
+        "categorize": (bench_categorize, ns(hours=4 if quick else 24)),
+        "flush": (bench_flush, ns(sizes=[60, 900, 3600], rounds=20 if quick else 200)),
+        "concurrent_writes": (bench_concurrent, ns(rows=20_000 if quick else 200_000, readers=2, writes=100 if quick else 500, interval=0.002)),
+        "memory": (bench_memory, ns(workload="high_switching", hours=24)),
+        "drift": (bench_drift, ns(days=1 if quick else 7, dwell=120)),
+        "idle": (bench_idle, ns()),
+        "input": (bench_input, ns(events=200_000 if quick else 2_000_000, rates=[100, 1000, 10000], threads=2, seconds=2 if quick else 5)),
+        "sessions": (bench_sessions, ns(hours=9, queries=20 if quick else 200)),
+        "journal": (bench_journal, ns(hours=4 if quick else 24, recover=config.FLUSH_INTERVAL)),
+        "domains": (bench_domains, ns(domains=[10, len(config.WORK_DOMAINS) + len(config.NON_WORK_DOMAINS), 100, 1000], samples=2000 if quick else 20000, repeat=5)),
+        "rules": (bench_rules, ns(domains=1000, reloads=5 if quick else 20)),
+        "titles": (bench_titles, ns(titles=5000 if quick else 50_000)),
+        "rule_engine": (bench_rule_engine, ns(rules=5000, samples=5000 if quick else 50_000)),
+        "adaptive": (bench_adaptive, ns(hours=24, dwell=[15, 120, 900])),
+        "dictionary": (bench_dictionary, ns(rows_per_day=120 if quick else 480, rounds=3 if quick else 10)),
+        "rollups": (bench_rollups, ns(days=90, rows_per_day=1440, interval=30, rounds=3 if quick else 10, writes=200 if quick else 1000)),
+        "retention": (bench_retention, ns(rows_per_day=120 if quick else 480, events_per_day=50, session_days=90, hourly_days=180, event_days=30, batch_rows=config.RETENTION_BATCH_ROWS)),
+        "archive": (bench_archive, ns(rows_per_day=120 if quick else 480, days=[60, 365], rounds=3 if quick else 10)),
+        "migrations": (bench_migrations, ns(rows_per_day=120 if quick else 480, chunk_rows=config.MIGRATION_CHUNK_ROWS, rounds=100 if quick else 1000)),
+        "logging": (bench_logging, ns(records=2000 if quick else 20_000, stall_ms=50, every=500)),
+        "metrics": (bench_metrics, ns(hours=4 if quick else 24, iterations=100_000 if quick else 1_000_000, scrapes=20 if quick else 200)),
+        "db": (bench_db, ns(rows=50_000 if quick else 1_000_000, writes=100 if quick else 500)),
+    }
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+    }
+    for name, (func, params) in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        t0 = time.perf_counter()
+        results[name] = func(params)
+        results["meta"][f"{name}_seconds"] = time.perf_counter() - t0
+    return results
+
+
+def flatten(data, prefix=""):
+    """Numeric leaves of a nested result as {"a.b.c": value}"""
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def bench_compare(args):
+    """Side-by-side numbers of two result files (new / old ratio)"""
+    with open(args.old, encoding="utf-8") as f:
+        old = flatten(json.load(f))
+    with open(args.new, encoding="utf-8") as f:
+        new = flatten(json.load(f))
+    return {
+        key: {"old": old[key], "new": new[key], "ratio": new[key] / old[key] if old[key] else None}
+        for key in sorted(old.keys() & new.keys())
+        if not key.startswith("meta.")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("db", help="write latency and fsyncs, connect-per-write vs WAL")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--writes", type=int, default=500)
+    p.set_defaults(func=bench_db)
+
+    p = sub.add_parser("domains", help="domain classification, linear scan vs compiled regex vs shipped matcher")
+    p.add_argument("--domains", type=int, nargs="+", default=[10, len(config.WORK_DOMAINS) + len(config.NON_WORK_DOMAINS), 100, 1000])
+    p.add_argument("--samples", type=int, default=20000)
+    p.add_argument("--repeat", type=int, default=5, help="timed runs per matcher (best is reported)")
+    p.set_defaults(func=bench_domains)
+
+    p = sub.add_parser("adaptive", help="wakeups/hour and accuracy, adaptive vs fixed 1s sampling")
+    p.add_argument("--hours", type=float, default=24)
+    p.add_argument("--dwell", type=float, nargs="+", default=[15, 120, 900])
+    p.set_defaults(func=bench_adaptive)
+
+    p = sub.add_parser("categorize", help="samples/second through categorize_activity")
+    p.add_argument("--hours", type=int, default=24)
+    p.set_defaults(func=bench_categorize)
+
+    p = sub.add_parser("flush", help="flush_buffer latency percentiles per interval size")
+    p.add_argument("--sizes", type=int, nargs="+", default=[60, 900, 3600])
+    p.add_argument("--rounds", type=int, default=200)
+    p.set_defaults(func=bench_flush)
+
+    p = sub.add_parser("concurrent", help="write latency under concurrent dashboard reads")
+    p.add_argument("--rows", type=int, default=200_000)
+    p.add_argument("--readers", type=int, default=2)
+    p.add_argument("--writes", type=int, default=500)
+    p.add_argument("--interval", type=float, default=0.002)
+    p.set_defaults(func=bench_concurrent)
+
+    p = sub.add_parser("memory", help="memory footprint after a simulated day")
+    p.add_argument("--workload", choices=sorted(WORKLOADS), default="high_switching")
+    p.add_argument("--hours", type=float, default=24)
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("drift", help="accumulated duration error over a simulated week with clock faults")
+    p.add_argument("--days", type=float, default=7)
+    p.add_argument("--dwell", type=float, default=120, help="mean seconds between window changes")
+    p.set_defaults(func=bench_drift)
+
+    p = sub.add_parser("idle", help="hot-path work over a day with lunch and overnight, OS idle vs heuristic")
+    p.set_defaults(func=bench_idle)
+
+    p = sub.add_parser("input", help="input counter cost and lost events at 100+ events/second")
+    p.add_argument("--events", type=int, default=2_000_000)
+    p.add_argument("--rates", type=int, nargs="+", default=[100, 1000, 10000])
+    p.add_argument("--threads", type=int, default=2)
+    p.add_argument("--seconds", type=float, default=5)
+    p.set_defaults(func=bench_input)
+
+    p = sub.add_parser("sessions", help="session rows and dashboard query time, coalesced vs per flush")
+    p.add_argument("--hours", type=float, default=9)
+    p.add_argument("--queries", type=int, default=200)
+    p.set_defaults(func=bench_sessions)
+
+    p = sub.add_parser("journal", help="per-sample cost of the crash-safe sample journal")
+    p.add_argument("--hours", type=int, default=24)
+    p.add_argument("--recover", type=int, default=config.FLUSH_INTERVAL, help="samples left unflushed for the recovery check")
+    p.set_defaults(func=bench_journal)
+
+    p = sub.add_parser("rules", help="rules file watch cost and reload latency")
+    p.add_argument("--domains", type=int, default=1000, help="extra work domains in the rules file")
+    p.add_argument("--reloads", type=int, default=20)
+    p.set_defaults(func=bench_rules)
+
+    p = sub.add_parser("titles", help="browser title parsing cost and misclassifications")
+    p.add_argument("--titles", type=int, default=50_000)
+    p.set_defaults(func=bench_titles)
+
+    p = sub.add_parser("rule-engine", help="per-sample cost of the ordered rule engine")
+    p.add_argument("--rules", type=int, default=5000)
+    p.add_argument("--samples", type=int, default=50_000)
+    p.set_defaults(func=bench_rule_engine)
+
+    p = sub.add_parser("dictionary", help="DB size and load_sessions time, text columns vs dictionary tables")
+    p.add_argument("--rows-per-day", type=int, default=480, help="per-minute session rows per day, for a year")
+    p.add_argument("--rounds", type=int, default=10)
+    p.set_defaults(func=bench_dictionary)
+
+    p = sub.add_parser("rollups", help="dashboard rows read and load time, raw sessions vs rollup tables")
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--rows-per-day", type=int, default=1440, help="session rows per day (one per flush interval)")
+    p.add_argument("--interval", type=int, default=30, help="seconds per session row")
+    p.add_argument("--rounds", type=int, default=10)
+    p.add_argument("--writes", type=int, default=1000)
+    p.set_defaults(func=bench_rollups)
+
+    p = sub.add_parser("migrations", help="schema upgrade lock time, resume after a kill, and startup cost")
+    p.add_argument("--rows-per-day", type=int, default=480, help="per-minute session rows per day, for a year")
+    p.add_argument("--chunk-rows", type=int, default=config.MIGRATION_CHUNK_ROWS)
+    p.add_argument("--rounds", type=int, default=1000)
+    p.set_defaults(func=bench_migrations)
+
+    p = sub.add_parser("retention", help="write lock per retention batch, file size after vacuum, totals kept")
+    p.add_argument("--rows-per-day", type=int, default=480, help="per-minute session rows per day, for a year")
+    p.add_argument("--events-per-day", type=int, default=50)
+    p.add_argument("--session-days", type=int, default=90)
+    p.add_argument("--hourly-days", type=int, default=180)
+    p.add_argument("--event-days", type=int, default=30)
+    p.add_argument("--batch-rows", type=int, default=config.RETENTION_BATCH_ROWS)
+    p.set_defaults(func=bench_retention)
+
+    p = sub.add_parser("archive", help="Parquet archive export time, size and long-range loads vs SQLite")
+    p.add_argument("--rows-per-day", type=int, default=480, help="per-minute session rows per day, for a year")
+    p.add_argument("--days", type=int, nargs="+", default=[60, 365])
+    p.add_argument("--rounds", type=int, default=10)
+    p.set_defaults(func=bench_archive)
+
+    p = sub.add_parser("metrics", help="per-sample cost of the loop timings and scrape latency")
+    p.add_argument("--hours", type=float, default=24)
+    p.add_argument("--iterations", type=int, default=1_000_000)
+    p.add_argument("--scrapes", type=int, default=200)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("logging", help="log call latency on the caller thread, synchronous vs queued; rate limiting")
+    p.add_argument("--records", type=int, default=20_000)
+    p.add_argument("--stall-ms", type=float, default=50, help="simulated disk stall")
+    p.add_argument("--every", type=int, default=500, help="writes between stalls")
+    p.set_defaults(func=bench_logging)
+
+    p = sub.add_parser("suite", help="run all benchmarks")
+    p.add_argument("--quick", action="store_true", help="smaller parameters for a fast smoke run")
+    p.add_argument("--only", nargs="+", help="run only these benchmarks")
+    p.add_argument("--output", help="also write the JSON results to this file")
+    p.set_defaults(func=bench_suite)
+
+    p = sub.add_parser("compare", help="compare two JSON result files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.set_defaults(func=bench_compare)
+
+    p = sub.add_parser("db-writes", help=argparse.SUPPRESS)
+    p.add_argument("--mode", choices=sorted(WRITERS), required=True)
+    p.add_argument("--db", required=True)
+    p.add_argument("--writes", type=int, default=500)
+    p.set_defaults(func=bench_db_writes)
+
+    args = parser.parse_args()
+
+    # The watcher logs every flush; keep benchmark output to the JSON result
+    logging.getLogger().setLevel(logging.WARNING)
+
+    output = json.dumps(args.func(args), indent=2)
+    if getattr(args, "output", None):
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
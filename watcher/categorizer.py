@@ -0,0 +1,143 @@
+"""
+Activity categorization for the Activity Watcher
+Compiled rule sets from the rules file, fronted by an LRU memo cache
+"""
+import logging
+import sys
+from collections import OrderedDict
+from datetime import datetime
+
+import config
+from rules import RulesFile
+from titles import TitleParser
+
+
+class Categorizer:
+    """
+    Intelligent categorization system:
+    - PRIMARY_WORK: Main coding/development tools
+    - SECONDARY_WORK: Communication, music, support tools
+    - BROWSER_WORK: Browsers on work-related sites
+    - BROWSER_NONWORK: Browsers on entertainment sites
+    - IDLE: Everything else
+
+    The same foreground window is usually sampled many times in a row, so
+    results are memoized per (process_lower, window_title) in a bounded LRU
+    cache; with time-of-day rules the key also holds the stretch of the day
+    between rule boundaries. Rules come from config.RULES_PATH (built-in config tables when
+    there is no file) as an immutable RuleSet; an edited file is compiled
+    and swapped in together with a fresh cache.
+    """
+
+    def __init__(self, cache_size=None, rules_file=None, now=None):
+        self.cache_size = cache_size or config.CATEGORY_CACHE_SIZE
+        self.now = now or datetime.now  # local time for time-of-day rules
+        self.rules_file = rules_file or RulesFile()
+        self.rules = self.rules_file.rules
+        self.titles = TitleParser(self.rules.browser_apps, self.rules.site_domains)
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def rule_version(self):
+        """Version of the rules results are currently computed with"""
+        return self.rules.version
+
+    def check_rules(self, now):
+        """Swap in the rules file if it changed (stats it at most every RULES_CHECK_INTERVAL)"""
+        rules = self.rules_file.poll(now)
+        if rules is not None:
+            self.titles = TitleParser(rules.browser_apps, rules.site_domains)
+            self.rules, self.cache = rules, OrderedDict()
+            logging.info(f"Categorization rules changed to {rules.version} - cache invalidated")
+
+    def domain(self, process_lower, window_title):
+        """Hostname of the page in a browser window title, or None"""
+        return self.titles.domain(process_lower, window_title)
+
+    def categorize(self, process_name, process_lower, window_title):
+        """Return (category, display_name, score), memoized per window"""
+        if not process_name:
+            return "IDLE", None, 0
+
+        engine = self.rules.engine
+        if engine.boundaries:
+            now = self.now()
+            minute = now.hour * 60 + now.minute
+            key = (process_lower, window_title, engine.time_slot(minute))
+        else:
+            minute = None
+            key = (process_lower, window_title)
+        cache = self.cache
+        result = cache.get(key)
+        if result is not None:
+            self.hits += 1
+            cache.move_to_end(key)
+            return result
+
+        self.misses += 1
+        category, display_name, score = self._categorize(process_name, process_lower, window_title, minute)
+        result = (category, sys.intern(display_name) if display_name else display_name, score)
+        cache[key] = result
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return result
+
+    def _categorize(self, process_name, process_lower, window_title, minute=None):
+        """Uncached rule evaluation"""
+        rules = self.rules
+        domain = self.titles.domain(process_lower, window_title)
+
+        # Ordered rules first (only those whose process glob covers this process)
+        rule = rules.engine.match(process_lower, window_title, minute, domain)
+        if rule is not None:
+            display_name = (
+                rule.subcategory or
+                rules.primary_apps.get(process_lower) or
+                rules.secondary_apps.get(process_lower) or
+                rules.browser_apps.get(process_lower) or
+                process_name
+            )
+            return rule.category, display_name, rule.score
+
+        # Check primary work apps (VSCode, Cursor, etc.)
+        if process_lower in rules.primary_apps:
+            return "PRIMARY_WORK", rules.primary_apps[process_lower], 100
+
+        # Check secondary work apps (Telegram, Spotify)
+        if process_lower in rules.secondary_apps:
+            return "SECONDARY_WORK", rules.secondary_apps[process_lower], 60
+
+        # Browser intelligence
+        if process_lower in rules.browser_apps:
+            display_name = rules.browser_apps[process_lower]
+
+            # The page's hostname decides; titles without one fall back to
+            # searching every domain in the title (work domains first)
+            if domain:
+                domain_class = rules.classify_domain(domain)
+            else:
+                domain_class = rules.domain_matcher.match(window_title)
+            if domain_class == "BROWSER_WORK":
+                return "BROWSER_WORK", f"{display_name} (Work)", 80
+            if domain_class == "BROWSER_NONWORK":
+                return "BROWSER_NONWORK", f"{display_name} (Leisure)", 20
+
+            # Default to work for unknown browser activity
+            return "BROWSER_WORK", display_name, 70
+
+        # Everything else is idle
+        return "IDLE", process_name, 0
+
+    def stats(self):
+        """Cache hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size": len(self.cache),
+            "rules": self.rules.version,
+            "titles": self.titles.stats(),
+        }
@@ -0,0 +1,80 @@
+"""
+Clocks for the Activity Watcher
+The watcher reads time only through a clock so replays can run on virtual time
+"""
+import time
+from datetime import datetime
+
+
+class SystemClock:
+    """Real wall-clock and monotonic time"""
+
+    @staticmethod
+    def time():
+        return time.time()
+
+    @staticmethod
+    def monotonic():
+        return time.monotonic()
+
+    @staticmethod
+    def now():
+        return datetime.now()
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Simulated time for replays: sleep() advances the clock instantly,
+    so a full simulated day runs in seconds.
+    """
+
+    def __init__(self, start=None):
+        self.start = (start or datetime.now()).timestamp()
+        self.elapsed = 0.0
+
+    def time(self):
+        return self.start + self.elapsed
+
+    def monotonic(self):
+        return self.elapsed
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.elapsed += seconds
+
+
+class WallAnchor:
+    """
+    Maps monotonic readings to wall-clock datetimes.
+
+    Durations are measured on the monotonic clock; only the displayed
+    start/end times go through this offset. resync() picks up NTP steps,
+    manual clock changes and suspend, and reports how far the wall clock
+    jumped relative to the monotonic clock.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.offset = clock.time() - clock.monotonic()
+        self.jumps = 0
+
+    def resync(self, threshold):
+        """Adopt the current offset if it moved more than threshold seconds; return the jump"""
+        offset = self.clock.time() - self.clock.monotonic()
+        jump = offset - self.offset
+        if abs(jump) <= threshold:
+            return 0.0
+        self.offset = offset
+        self.jumps += 1
+        return jump
+
+    def datetime(self, monotonic):
+        """Wall-clock datetime of a monotonic reading"""
+        return datetime.fromtimestamp(self.offset + monotonic)
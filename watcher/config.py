@@ -19,28 +19,104 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 DB_PATH = os.getenv("DB_PATH", str(DATA_DIR / "activity.db"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = 5 * 1024 * 1024  # rotate watcher.log at this size
+LOG_BACKUP_COUNT = 3  # rotated files kept (watcher.log.1 ... .3)
+LOG_REPEAT_INTERVAL = 600  # seconds - the same warning from the same line is logged at most this often
+
+# Database Settings (single long-lived WAL writer connection)
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across app crashes in WAL mode
+DB_BUSY_TIMEOUT = 5000  # milliseconds - wait for dashboard readers before failing
+DB_JOURNAL_SIZE_LIMIT = 4 * 1024 * 1024  # bytes - truncate WAL after checkpoints
+DB_WAL_AUTOCHECKPOINT = 1000  # pages
+MIGRATION_CHUNK_ROWS = 10000  # rows per backfill transaction when upgrading an existing database
+
+# Write-behind queue (sampling thread never waits on SQLite)
+WRITE_QUEUE_SIZE = 10000  # records - new records are dropped when full
+WRITE_BATCH_SIZE = 500  # records per transaction
+WRITE_DRAIN_TIMEOUT = 10  # seconds - max wait for the queue to drain on exit
+TITLE_DICTIONARY_SIZE = 4096  # window title -> id entries kept in memory (apps/categories are all kept)
+
+# Retention (old rows are deleted in small batches through the write-behind queue; 0 keeps forever)
+RETENTION_SESSION_DAYS = int(os.getenv("RETENTION_SESSION_DAYS", 180))  # raw sessions and idle periods - their time stays in the rollups
+RETENTION_HOURLY_DAYS = int(os.getenv("RETENTION_HOURLY_DAYS", 730))  # hourly rollups - daily rollups are kept forever
+RETENTION_EVENT_DAYS = int(os.getenv("RETENTION_EVENT_DAYS", 30))  # system events
+RETENTION_CHECK_INTERVAL = 3600  # seconds between checks once nothing is left to delete
+RETENTION_BATCH_ROWS = 200  # rows per delete transaction (a few ms of write lock)
+RETENTION_BATCH_PAUSE = 1  # seconds between batches while catching up
+RETENTION_VACUUM_PAGES = 256  # free pages returned to the OS per incremental vacuum step (only while idle)
+
+# Parquet archive of closed months (needs pyarrow; empty ARCHIVE_DIR disables it)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", str(Path(DB_PATH).parent / "archive"))  # retention keeps rows until their month is archived
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_ROW_GROUP_ROWS = 16384  # rows per row group - smaller groups prune date ranges more finely
+
+# Metrics endpoint (Prometheus text format, local only)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))
+
+# Sample journal (unflushed samples survive a crash and are recovered on startup)
+JOURNAL_ENABLED = True
+JOURNAL_INITIAL_SIZE = 256 * 1024  # bytes - doubles while the writer falls behind, shrinks back once it catches up
 
 # Monitoring Settings
 SAMPLE_INTERVAL = 1  # seconds
+ADAPTIVE_SAMPLING = True  # back off while the foreground window is stable
+SAMPLE_BACKOFF_STEPS = [1, 2, 5]  # seconds - sampling intervals, fastest first
+SAMPLE_BACKOFF_AFTER = 5  # identical samples before moving to the next step
 FLUSH_INTERVAL = 60  # seconds - create session every 60s
+SESSION_COALESCING = True  # extend the open session while the dominant activity is unchanged
+SESSION_MAX_GAP = 30  # seconds - a longer gap between intervals starts a new session
 IDLE_THRESHOLD = 300  # seconds - auto-idle after 5min of no input
+SAMPLE_MAX_LATENESS = 30  # seconds - a sample this late (suspend, hang) stops crediting the previous window
+CLOCK_JUMP_THRESHOLD = 2  # seconds - wall-clock steps larger than this re-anchor session timestamps
+
+# Foreground window provider: auto, windows, x11 or none
+# x11 is event-driven (needs python-xlib and DISPLAY, e.g. Xvfb in Docker)
+FOREGROUND_PROVIDER = os.getenv("FOREGROUND_PROVIDER", "auto")
+
+# OS idle-time provider: auto, windows, x11 (MIT-SCREEN-SAVER) or none
+# none falls back to the input source, then to foreground-window changes
+IDLE_PROVIDER = os.getenv("IDLE_PROVIDER", "auto")
+
+# Input activity source: auto, hooks, synthetic or none
+# hooks uses the keyboard/mouse packages (Windows; Linux needs root)
+INPUT_SOURCE = os.getenv("INPUT_SOURCE", "auto")
+SYNTHETIC_INPUT_RATE = 100  # events/second generated by the synthetic source
 
 # Application Categorization
+CATEGORY_CACHE_SIZE = 512  # (process, window title) results kept in the LRU cache
+TITLE_CACHE_SIZE = 512  # browser title -> domain results kept in the LRU cache
+
+# Rules file (.toml or .json, see rules.example.toml) - edits are picked up
+# without a restart; the tables below are the built-in rules used without one
+RULES_PATH = os.getenv("RULES_PATH", str(BASE_DIR / "rules.toml"))
+RULES_CHECK_INTERVAL = 10  # seconds - at most one stat of the rules file per interval
+
 PRIMARY_WORK_APPS = {
     "code.exe": "VSCode",
     "cursor.exe": "Cursor", 
     "chrome.exe": "Chrome",
+    # Linux (X11) process names
+    "code": "VSCode",
+    "cursor": "Cursor",
+    "chrome": "Chrome",
 }
 
 SECONDARY_WORK_APPS = {
     "telegram.exe": "Telegram",
     "spotify.exe": "Spotify",
+    "telegram-desktop": "Telegram",
+    "spotify": "Spotify",
 }
 
 BROWSER_APPS = {
     "firefox.exe": "Firefox",
     "msedge.exe": "Edge",
     "brave.exe": "Brave",
+    "firefox": "Firefox",
+    "msedge": "Edge",
+    "brave": "Brave",
 }
 
 # Browser Domain Categorization
@@ -72,6 +148,13 @@ NON_WORK_DOMAINS = [
     "twitch.tv",
 ]
 
+# Ordered rules checked before the tables above; the first match wins.
+# Conditions: process (glob), title (regex), domain, hours ("09:00-18:00")
+CATEGORY_RULES = [
+    # Chrome is a work app, except on leisure sites
+    {"process": "chrome*", "domain": NON_WORK_DOMAINS, "category": "BROWSER_NONWORK", "subcategory": "Chrome (Leisure)"},
+]
+
 # Hotkeys
 HOTKEY_IDLE_START = "ctrl+alt+shift+i"
 HOTKEY_IDLE_END = "ctrl+alt+shift+o"
@@ -0,0 +1,357 @@
+"""
+Foreground window providers for the Activity Watcher
+Windows (polling via Win32) and Linux X11 (event-driven via EWMH properties)
+"""
+import ctypes
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import pygetwindow as gw
+except (ImportError, NotImplementedError):
+    # pygetwindow raises NotImplementedError on Linux
+    gw = None
+
+try:
+    from Xlib import X, Xatom
+    from Xlib import display as xdisplay
+    from Xlib import error as xerror
+except ImportError:
+    xdisplay = None
+
+NO_WINDOW = (None, None, None)
+
+
+class ProcessNameCache:
+    """
+    PID -> process name cache for the sampler.
+
+    - Same PID as the previous sample: no system call at all.
+    - PID seen before: one create-time check (psutil.Process.is_running)
+      instead of a full lookup, so a reused PID is detected.
+    - Unknown PID: full psutil lookup, then cached.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # pid -> (psutil.Process, name)
+        self.last_pid = None
+        self.last_name = None
+
+        self.hits = 0
+        self.validations = 0
+        self.lookups = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    def name(self, pid):
+        """Return the process name for pid, or None if it no longer exists"""
+        if pid == self.last_pid and self.last_name is not None:
+            self.hits += 1
+            return self.last_name
+
+        t0 = time.perf_counter()
+        try:
+            entry = self.entries.get(pid)
+            if entry is not None:
+                self.validations += 1
+                proc, name = entry
+                if proc.is_running():
+                    self.entries.move_to_end(pid)
+                    self.last_pid, self.last_name = pid, name
+                    return name
+                del self.entries[pid]
+
+            self.lookups += 1
+            try:
+                proc = psutil.Process(pid)
+                name = proc.name()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                # Process might have closed between getting PID and looking up
+                self.misses += 1
+                logging.debug(f"Process with PID {pid} not found.")
+                self.last_pid, self.last_name = None, None
+                return None
+
+            self.entries[pid] = (proc, name)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.last_pid, self.last_name = pid, name
+            return name
+        finally:
+            self.lookup_seconds += time.perf_counter() - t0
+
+    def stats(self):
+        """Lookup counters and time spent outside the fast path"""
+        return {
+            "pid_hits": self.hits,
+            "validations": self.validations,
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "lookup_seconds": round(self.lookup_seconds, 4),
+        }
+
+
+class ForegroundProvider:
+    """
+    Source of (process_name, process_lower, window_title) samples.
+
+    Polling providers do their work in sample(); event-driven providers
+    keep the current window up to date from a background thread, so
+    sample() is free and wait() returns as soon as the window changes.
+    """
+
+    name = "none"
+    event_driven = False
+
+    def sample(self):
+        """Return the current foreground (process_name, process_lower, title)"""
+        return NO_WINDOW
+
+    def wait(self, timeout):
+        """Sleep up to timeout seconds; return True if woken by a window change"""
+        time.sleep(timeout)
+        return False
+
+    def stats(self):
+        """Lookup counters for diagnostics"""
+        return {}
+
+    def close(self):
+        """Release provider resources"""
+
+
+class WindowsProvider(ForegroundProvider):
+    """Polls the active window through pygetwindow and the Win32 API"""
+
+    name = "windows"
+
+    def __init__(self):
+        self.process_names = ProcessNameCache()
+        self.last_window = None
+        self.window_fast_hits = 0
+
+    def sample(self):
+        """
+        Get currently active window and process using reliable PID lookup via Windows API.
+        This fixes the flawed string matching logic.
+        """
+        try:
+            win = gw.getActiveWindow()
+            if not win or not win.title.strip():
+                return NO_WINDOW
+
+            title = win.title.strip()
+
+            # 1. Get the Window Handle (hWnd) from pygetwindow object
+            # We access the internal handle attribute
+            hWnd = win._hWnd
+
+            # Fast path: same window and title as the previous sample
+            last = self.last_window
+            if last is not None and last[0] == hWnd and last[1] == title:
+                self.window_fast_hits += 1
+                return last[2]
+
+            # 2. Use ctypes to call GetWindowThreadProcessId (Windows API)
+            user32 = ctypes.windll.user32
+            pid = ctypes.c_ulong()
+            # Get the PID of the process that owns the window handle
+            user32.GetWindowThreadProcessId(hWnd, ctypes.pointer(pid))
+            proc_id = pid.value
+
+            # 3. Resolve the process name from the reliable PID (cached, PID reuse checked)
+            if proc_id != 0:
+                proc_name = self.process_names.name(proc_id)
+                if proc_name:
+                    result = (proc_name, proc_name.lower(), title)
+                    self.last_window = (hWnd, title, result)
+                    return result
+
+            self.last_window = None
+            return "Unknown.exe", "unknown.exe", title # Fallback if PID lookup fails
+
+        except Exception as e:
+            # Catch errors related to pygetwindow or ctypes failure
+            logging.debug(f"Failed to get foreground app (PID lookup failed): {e}")
+            return NO_WINDOW
+
+    def stats(self):
+        """Sampler lookup budget: fast-path hits, PID cache counters, time spent"""
+        return {"window_fast_hits": self.window_fast_hits, **self.process_names.stats()}
+
+
+class X11Provider(ForegroundProvider):
+    """
+    Event-driven provider for X11 window managers that follow EWMH.
+
+    A background thread listens for PropertyNotify events on the root
+    window (_NET_ACTIVE_WINDOW) and on the active window (_NET_WM_NAME /
+    WM_NAME) instead of polling. sample() only returns the cached state,
+    and wait() wakes the monitor loop the moment focus or title changes.
+    Works against any X server, including Xvfb (DISPLAY=:99).
+    """
+
+    name = "x11"
+    event_driven = True
+
+    def __init__(self, display_name=None):
+        self.display = xdisplay.Display(display_name)
+        self.root = self.display.screen().root
+        # Windows can disappear between an event and our request; ignore
+        # the asynchronous BadWindow errors that follow
+        self.display.set_error_handler(lambda *args: None)
+        self.atoms = {
+            name: self.display.intern_atom(name)
+            for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID", "UTF8_STRING")
+        }
+        self.process_names = ProcessNameCache()
+
+        self.active = None
+        self.state = NO_WINDOW
+        self.changed = threading.Event()
+        self.changed_at = time.monotonic()
+        self.events = 0
+        self.running = True
+
+        self.root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._refresh_active()
+
+        self.thread = threading.Thread(target=self._event_loop, name="x11-foreground", daemon=True)
+        self.thread.start()
+
+    def _property(self, window, atom, prop_type):
+        """Read a window property, or None if it is missing or the window is gone"""
+        try:
+            prop = window.get_full_property(atom, prop_type)
+        except xerror.XError:
+            return None
+        return prop.value if prop else None
+
+    def _title(self, window):
+        """UTF-8 _NET_WM_NAME with a WM_NAME fallback"""
+        value = self._property(window, self.atoms["_NET_WM_NAME"], self.atoms["UTF8_STRING"])
+        if value is None:
+            value = self._property(window, Xatom.WM_NAME, X.AnyPropertyType)
+        if value is None:
+            return ""
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", "replace")
+        return value.strip()
+
+    def _refresh_active(self):
+        """Re-read the active window after a focus change"""
+        value = self._property(self.root, self.atoms["_NET_ACTIVE_WINDOW"], Xatom.WINDOW)
+        window_id = value[0] if value is not None and len(value) else 0
+
+        if self.active is not None and self.active.id != window_id:
+            try:
+                self.active.change_attributes(event_mask=X.NoEventMask)
+            except xerror.XError:
+                pass
+        if not window_id:
+            self.active = None
+            self._publish(NO_WINDOW)
+            return
+
+        self.active = self.display.create_resource_object("window", window_id)
+        try:
+            self.active.change_attributes(event_mask=X.PropertyChangeMask)
+        except xerror.XError:
+            self.active = None
+            self._publish(NO_WINDOW)
+            return
+        self._refresh_title()
+
+    def _refresh_title(self):
+        """Re-read process and title of the active window"""
+        window = self.active
+        title = self._title(window)
+        if not title:
+            self._publish(NO_WINDOW)
+            return
+
+        pid = self._property(window, self.atoms["_NET_WM_PID"], Xatom.CARDINAL)
+        proc_name = self.process_names.name(pid[0]) if pid is not None and len(pid) else None
+        if proc_name:
+            self._publish((proc_name, proc_name.lower(), title))
+        else:
+            self._publish(("unknown", "unknown", title))
+
+    def _publish(self, state):
+        """Swap in the new state and wake the monitor loop if it changed"""
+        if state != self.state:
+            self.state = state
+            self.changed_at = time.monotonic()
+            self.changed.set()
+
+    def _event_loop(self):
+        """Block on X events and update the cached foreground state"""
+        active_atom = self.atoms["_NET_ACTIVE_WINDOW"]
+        title_atoms = (self.atoms["_NET_WM_NAME"], Xatom.WM_NAME)
+        while self.running:
+            try:
+                event = self.display.next_event()
+                if event.type != X.PropertyNotify:
+                    continue
+                self.events += 1
+                if event.window.id == self.root.id and event.atom == active_atom:
+                    self._refresh_active()
+                elif self.active is not None and event.window.id == self.active.id and event.atom in title_atoms:
+                    self._refresh_title()
+            except Exception as e:
+                if not self.running:
+                    break
+                logging.debug(f"X11 event loop error: {e}")
+                time.sleep(1)
+
+    def sample(self):
+        """Current foreground window, as of the last X event"""
+        return self.state
+
+    def wait(self, timeout):
+        """Sleep until the foreground window changes or timeout expires"""
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
+
+    def stats(self):
+        """Event and PID cache counters"""
+        return {"x11_events": self.events, **self.process_names.stats()}
+
+    def close(self):
+        """Stop listening and close the X connection"""
+        self.running = False
+        try:
+            self.display.close()
+        except Exception:
+            pass
+
+
+def create_provider(kind=None):
+    """Pick the foreground provider for this platform (config.FOREGROUND_PROVIDER)"""
+    kind = (kind or config.FOREGROUND_PROVIDER).lower()
+
+    if kind in ("auto", "windows") and sys.platform == "win32" and gw is not None and psutil is not None:
+        return WindowsProvider()
+
+    if kind in ("auto", "x11") and xdisplay is not None and os.environ.get("DISPLAY"):
+        try:
+            return X11Provider()
+        except Exception as e:
+            logging.warning(f"X11 foreground provider unavailable: {e}")
+
+    if kind != "none":
+        logging.warning("No foreground window provider available - activity will not be detected")
+    return ForegroundProvider()
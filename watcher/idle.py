@@ -0,0 +1,128 @@
+"""
+Idle-time providers for the Activity Watcher
+Ask the OS how long ago the last keyboard/mouse input happened
+"""
+import ctypes
+import logging
+import os
+import sys
+
+import config
+
+try:
+    from Xlib import display as xdisplay
+    from Xlib.ext import screensaver
+except ImportError:
+    xdisplay = None
+
+
+class IdleProvider:
+    """
+    Source of "seconds since the last user input".
+
+    idle_seconds() is called once per sample, so backends must be a single
+    cheap query. The base class is the null provider: it returns None
+    (unknown) and the watcher falls back to its own activity heuristics.
+    """
+
+    name = "none"
+
+    def idle_seconds(self):
+        """Seconds since the last keyboard/mouse input, or None if unknown"""
+        return None
+
+    def close(self):
+        """Release provider resources"""
+
+
+class WindowsIdleProvider(IdleProvider):
+    """GetLastInputInfo: tick count of the last input event in this session"""
+
+    name = "windows"
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    def __init__(self):
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+        self.info = self.LASTINPUTINFO()
+        self.info.cbSize = ctypes.sizeof(self.info)
+
+    def idle_seconds(self):
+        if not self.user32.GetLastInputInfo(ctypes.byref(self.info)):
+            return None
+        # Both are 32-bit millisecond tick counts; mask handles the 49.7-day wrap
+        return ((self.kernel32.GetTickCount() - self.info.dwTime) & 0xFFFFFFFF) / 1000.0
+
+
+class X11IdleProvider(IdleProvider):
+    """MIT-SCREEN-SAVER extension: the X server's own input idle counter"""
+
+    name = "x11"
+
+    def __init__(self, display_name=None):
+        self.display = xdisplay.Display(display_name)
+        if not self.display.has_extension("MIT-SCREEN-SAVER"):
+            self.display.close()
+            raise RuntimeError("X server has no MIT-SCREEN-SAVER extension")
+        self.root = self.display.screen().root
+
+    def idle_seconds(self):
+        try:
+            return self.display.screensaver_query_info(self.root).idle / 1000.0
+        except Exception as e:
+            logging.debug(f"Screensaver idle query failed: {e}")
+            return None
+
+    def close(self):
+        try:
+            self.display.close()
+        except Exception:
+            pass
+
+
+class FakeIdleProvider(IdleProvider):
+    """
+    Idle time from a schedule of away periods, for tests and replays.
+    periods: (start, end) offsets on clock.monotonic() during which there
+    is no input; outside them input is continuous.
+    """
+
+    name = "fake"
+
+    def __init__(self, clock, periods=()):
+        self.clock = clock
+        self.periods = sorted(periods)
+        self.queries = 0
+
+    def idle_seconds(self):
+        self.queries += 1
+        now = self.clock.monotonic()
+        for start, end in self.periods:
+            if start <= now < end:
+                return now - start
+            if start > now:
+                break
+        return 0.0
+
+
+def create_idle_provider(kind=None):
+    """Pick the idle-time provider for this platform (config.IDLE_PROVIDER)"""
+    kind = (kind or config.IDLE_PROVIDER).lower()
+
+    if kind in ("auto", "windows") and sys.platform == "win32":
+        try:
+            return WindowsIdleProvider()
+        except Exception as e:
+            logging.warning(f"Windows idle provider unavailable: {e}")
+
+    if kind in ("auto", "x11") and xdisplay is not None and os.environ.get("DISPLAY"):
+        try:
+            return X11IdleProvider()
+        except Exception as e:
+            logging.warning(f"X11 idle provider unavailable: {e}")
+
+    if kind not in ("auto", "none"):
+        logging.warning(f"Idle provider {kind!r} unavailable - falling back to activity heuristics")
+    return IdleProvider()
@@ -0,0 +1,245 @@
+"""
+Input activity sources for the Activity Watcher
+Keystroke and mouse-click counters harvested once per flush
+"""
+import logging
+import random
+import sys
+import threading
+import time
+
+import config
+
+try:
+    import keyboard
+except ImportError:
+    keyboard = None
+
+try:
+    import mouse
+except ImportError:
+    mouse = None
+
+
+class _Slot:
+    """Counters owned by one reporting thread"""
+
+    __slots__ = ("keys", "clicks", "moves")
+
+    def __init__(self):
+        self.keys = 0
+        self.clicks = 0
+        self.moves = 0
+
+
+class InputCounters:
+    """
+    Lock-free input event counters.
+
+    Every thread that reports events gets its own slot on first use; a
+    slot is only ever written by its owner and only read by the harvester,
+    so increments need no lock and are never lost. Counters only grow:
+    harvest() returns the difference to the previous harvest. Events are
+    counted in place - no event objects, queues or per-event DB work.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._slots = []
+        self._register_lock = threading.Lock()  # only taken by a thread's first event
+        self._harvested = (0, 0)
+
+    def _slot(self):
+        """This thread's slot, registering it on first use"""
+        slot = _Slot()
+        with self._register_lock:
+            self._slots = self._slots + [slot]
+        self._local.slot = slot
+        return slot
+
+    def key(self):
+        try:
+            self._local.slot.keys += 1
+        except AttributeError:
+            self._slot().keys += 1
+
+    def click(self):
+        try:
+            self._local.slot.clicks += 1
+        except AttributeError:
+            self._slot().clicks += 1
+
+    def move(self):
+        try:
+            self._local.slot.moves += 1
+        except AttributeError:
+            self._slot().moves += 1
+
+    def events(self):
+        """Total events of any kind so far (changes whenever there is input)"""
+        return sum(slot.keys + slot.clicks + slot.moves for slot in self._slots)
+
+    def totals(self):
+        """(keystrokes, clicks) since start"""
+        slots = self._slots
+        return sum(slot.keys for slot in slots), sum(slot.clicks for slot in slots)
+
+    def harvest(self):
+        """(keystrokes, clicks) since the previous harvest"""
+        keys, clicks = self.totals()
+        last_keys, last_clicks = self._harvested
+        self._harvested = (keys, clicks)
+        return keys - last_keys, clicks - last_clicks
+
+
+class InputSource:
+    """
+    Source of keyboard and mouse activity.
+
+    Sources feed an InputCounters from their own threads. The monitor loop
+    polls events() to drive last_activity, and the flush harvests the
+    keystroke/click counts into the session. The base class is the null
+    source: no input visibility, so the watcher falls back to treating a
+    detected foreground process as activity.
+    """
+
+    name = "none"
+    available = False
+
+    def __init__(self):
+        self.counters = InputCounters()
+
+    def events(self):
+        return self.counters.events()
+
+    def harvest(self):
+        return self.counters.harvest()
+
+    def stats(self):
+        keys, clicks = self.counters.totals()
+        return {"source": self.name, "keystrokes": keys, "clicks": clicks, "threads": len(self.counters._slots)}
+
+    def close(self):
+        """Stop listening"""
+
+
+class HookInputSource(InputSource):
+    """
+    Global keyboard and mouse hooks through the `keyboard` and `mouse`
+    packages (low-level hooks on Windows, /dev/input on Linux as root).
+    Both libraries call back from their own listener thread.
+    """
+
+    name = "hooks"
+    available = True
+
+    def __init__(self):
+        super().__init__()
+        counters = self.counters
+        self.hooks = []
+
+        if keyboard is not None:
+            def on_key(event):
+                if event.event_type == "down":
+                    counters.key()
+            self.hooks.append((keyboard, keyboard.hook(on_key)))
+
+        if mouse is not None:
+            # A click is its press (a double click may report "double" for
+            # the second press); releases are not counted. Scrolling counts
+            # as movement: both are activity, neither is a click.
+            button_event, presses = mouse.ButtonEvent, (mouse.DOWN, mouse.DOUBLE)
+            pointer_events = (mouse.MoveEvent, mouse.WheelEvent)
+
+            def on_mouse(event):
+                if type(event) is button_event:
+                    if event.event_type in presses:
+                        counters.click()
+                elif isinstance(event, pointer_events):
+                    counters.move()
+            self.hooks.append((mouse, mouse.hook(on_mouse)))
+
+    def close(self):
+        for lib, hook in self.hooks:
+            try:
+                lib.unhook(hook)
+            except Exception:
+                pass
+        self.hooks = []
+
+
+class SyntheticInputSource(InputSource):
+    """
+    Generates input events from background threads at a fixed rate, for
+    headless runs, tests and benchmarks. Each thread emits its share of
+    `rate` events per second in small bursts, about `click_ratio` of
+    them clicks.
+    """
+
+    name = "synthetic"
+    available = True
+
+    def __init__(self, rate=None, threads=2, click_ratio=0.2, seed=None, tick=0.01):
+        super().__init__()
+        self.rate = rate or config.SYNTHETIC_INPUT_RATE
+        self.click_ratio = click_ratio
+        self.tick = tick
+        self.running = True
+        self._generated = [0] * threads
+        self.threads = [
+            threading.Thread(
+                target=self._emit,
+                args=(i, random.Random(None if seed is None else seed + i), self.rate / threads),
+                name=f"synthetic-input-{i}",
+                daemon=True,
+            )
+            for i in range(threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _emit(self, index, rng, rate):
+        """Emit events until closed, keeping up with the target rate"""
+        counters = self.counters
+        started = time.monotonic()
+        emitted = 0
+        while self.running:
+            due = int((time.monotonic() - started) * rate)
+            for _ in range(due - emitted):
+                if rng.random() < self.click_ratio:
+                    counters.click()
+                else:
+                    counters.key()
+            emitted = due
+            self._generated[index] = emitted
+            time.sleep(self.tick)
+
+    @property
+    def generated_events(self):
+        """Events emitted so far, for checking harvests against"""
+        return sum(self._generated)
+
+    def close(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(1)
+
+
+def create_input_source(kind=None):
+    """Pick the input source for this platform (config.INPUT_SOURCE)"""
+    kind = (kind or config.INPUT_SOURCE).lower()
+
+    if kind == "synthetic":
+        return SyntheticInputSource()
+
+    if kind in ("auto", "hooks") and (keyboard is not None or mouse is not None):
+        # On Linux the hooks need root; only use them there when asked to
+        if kind == "hooks" or sys.platform == "win32":
+            try:
+                return HookInputSource()
+            except Exception as e:
+                logging.warning(f"Input hooks unavailable: {e}")
+
+    if kind not in ("auto", "none"):
+        logging.warning(f"Input source {kind!r} unavailable - keystrokes and clicks will not be counted")
+    return InputSource()
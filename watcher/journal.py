@@ -0,0 +1,257 @@
+"""
+Crash-safe sample journal for the Activity Watcher
+Append-only, memory-mapped mirror of the in-memory interval buffer
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+
+import config
+
+# Every record is 24 bytes: kind, flags, payload length, key id, timestamp, value
+RECORD = struct.Struct("<BBHIdd")
+RECORD_SIZE = RECORD.size
+# A sample record followed by the END marker, packed in one call
+SAMPLE_AND_END = struct.Struct("<BBHIdd" + "BBHIdd")
+
+END = 0  # unused slot - readers stop here
+SAMPLE = 1  # key_id, timestamp = wall-clock start, value = weight in seconds
+KEY = 2  # key_id, length = payload bytes in the following RECORD_SIZE blocks
+HEADER = 3  # first record; key_id = last flush sequence the database has committed
+FLUSH = 4  # end of an interval; key_id = its flush sequence
+
+MAX_PAYLOAD = 0xFFFF
+NO_KEY = 0
+
+
+class SampleJournal:
+    """
+    Mirrors ActivityAggregator.add() calls to disk so an interval survives
+    a crash, kill or sleep. Samples are fixed-size records written into a
+    memory-mapped file with no allocation beyond struct packing; the
+    distinct (process, title, category, subcategory, score) keys are
+    written once per interval as KEY records followed by their UTF-8
+    payload.
+
+    flush() ends an interval with a numbered FLUSH record; once the writer
+    has committed it, commit(seq) records the number in the header and
+    msyncs the file, once per interval, on the writer thread. Recovery
+    skips intervals up to the committed number, so an interval is replayed
+    only if it never reached the database. Once every flushed interval is
+    committed, the next sample rewinds the file to just past the header
+    and shrinks it back to JOURNAL_INITIAL_SIZE, so the file only grows
+    past that while the writer falls behind.
+    """
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.initial_size = size or config.JOURNAL_INITIAL_SIZE
+        self.size = self.initial_size
+        self.key_ids = {}
+        self.appended = 0
+        self.syncs = 0
+        self.rewinds = 0
+        # Held to remap the file or write the header from the writer thread
+        self.lock = threading.Lock()
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            current = os.fstat(fd).st_size
+            if current < self.size:
+                os.ftruncate(fd, self.size)
+            else:
+                self.size = current
+            self.map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+        kind, _, _, committed, _, _ = RECORD.unpack_from(self.map, 0)
+        if kind == HEADER:
+            self.committed = self.flushed = committed
+            self.pos = self._scan()[1]
+        else:
+            self.committed = self.flushed = 0
+            RECORD.pack_into(self.map, 0, HEADER, 0, 0, 0, 0.0, 0.0)
+            RECORD.pack_into(self.map, RECORD_SIZE, END, 0, 0, 0, 0.0, 0.0)
+            self.pos = RECORD_SIZE
+        # Where the last flushed interval ends; `limit` is zeroed by flush()
+        # so the next write takes the slow path in _ensure() and may rewind
+        self.mark = RECORD_SIZE
+        self.limit = self.size
+
+    # -- writing --------------------------------------------------------
+
+    def _ensure(self, needed):
+        """Rewind if every interval is committed, then grow so `needed` more bytes plus an END slot fit"""
+        if self.pos + needed + RECORD_SIZE <= self.limit:
+            return
+        if self.pos == self.mark and self.pos > RECORD_SIZE and self.committed >= self.flushed:
+            self._rewind()
+        self.limit = self.size
+        if self.pos + needed + RECORD_SIZE <= self.size:
+            return
+        new_size = self.size * 2
+        while self.pos + needed + RECORD_SIZE > new_size:
+            new_size *= 2
+        self._remap(new_size)
+
+    def _remap(self, new_size):
+        """Resize the file and map it again"""
+        with self.lock:
+            self.map.flush()
+            self.map.close()
+            with open(self.path, "r+b") as f:
+                f.truncate(new_size)
+                self.map = mmap.mmap(f.fileno(), new_size)
+            self.size = self.limit = new_size
+
+    def _rewind(self):
+        """Start over after the header: everything before the mark is in the database"""
+        RECORD.pack_into(self.map, RECORD_SIZE, END, 0, 0, 0, 0.0, 0.0)
+        self.pos = self.mark = RECORD_SIZE
+        self.key_ids.clear()
+        self.rewinds += 1
+        if self.size > self.initial_size:
+            self._remap(self.initial_size)
+
+    def _key_id(self, sample):
+        """Id of a sample key in this interval, writing its KEY record if new"""
+        key_id = self.key_ids.get(sample)
+        if key_id is not None:
+            return key_id
+
+        proc, title, cat, subcat, score = sample
+        payload = "\x1f".join((proc or "", title or "", cat or "", subcat or "", str(score))).encode("utf-8")[:MAX_PAYLOAD]
+        blocks = -(-len(payload) // RECORD_SIZE)
+        # May rewind and forget the keys of committed intervals
+        self._ensure(RECORD_SIZE * (2 + blocks))
+        key_id = len(self.key_ids) + 1
+
+        RECORD.pack_into(self.map, self.pos, KEY, 0, len(payload), key_id, 0.0, 0.0)
+        start = self.pos + RECORD_SIZE
+        self.map[start:start + len(payload)] = payload
+        self.pos = start + blocks * RECORD_SIZE
+        self.key_ids[sample] = key_id
+        return key_id
+
+    def append(self, sample, timestamp, weight):
+        """Record one aggregated sample: (proc, title, cat, subcat, score)"""
+        if self.pos + 2 * RECORD_SIZE > self.limit:
+            # Full, or the first sample of an interval: may rewind, which forgets the keys
+            self._ensure(RECORD_SIZE)
+        key_id = self.key_ids.get(sample)
+        if key_id is None:
+            key_id = self._key_id(sample) if sample[0] else NO_KEY
+        pos = self.pos
+        # The trailing END marker keeps stale records from a previous
+        # interval from ever being read back
+        SAMPLE_AND_END.pack_into(self.map, pos, SAMPLE, 0, 0, key_id, timestamp, weight, END, 0, 0, 0, 0.0, 0.0)
+        self.pos = pos + RECORD_SIZE
+        self.appended += 1
+
+    def flush(self):
+        """End the current interval (handed to the writer); returns its sequence number for commit(), None if empty"""
+        if self.pos == self.mark:
+            return None
+        self._ensure(RECORD_SIZE)
+        self.flushed += 1
+        SAMPLE_AND_END.pack_into(self.map, self.pos, FLUSH, 0, 0, self.flushed, 0.0, 0.0, END, 0, 0, 0, 0.0, 0.0)
+        self.pos = self.mark = self.pos + RECORD_SIZE
+        self.limit = 0
+        return self.flushed
+
+    def commit(self, seq):
+        """The writer committed interval `seq` and everything before it: record that and sync"""
+        with self.lock:
+            if self.map is None or seq <= self.committed:
+                return
+            RECORD.pack_into(self.map, 0, HEADER, 0, 0, seq, 0.0, 0.0)
+            self.committed = seq
+            # One msync per interval, off the sampling thread
+            self.map.flush()
+            self.syncs += 1
+
+    def sync(self):
+        """Flush dirty pages to disk"""
+        with self.lock:
+            self.map.flush()
+            self.syncs += 1
+
+    def stats(self):
+        """Append, msync and rewind counters"""
+        return {
+            "appended": self.appended,
+            "syncs": self.syncs,
+            "rewinds": self.rewinds,
+            "uncommitted_intervals": self.flushed - self.committed,
+            "bytes": self.size,
+        }
+
+    def close(self):
+        """Sync and unmap"""
+        if self.map is not None:
+            self.sync()
+            with self.lock:
+                self.map.close()
+                self.map = None
+
+    # -- recovery -------------------------------------------------------
+
+    def _scan(self):
+        """Samples of intervals the database has not committed, and the offset of the END marker"""
+        keys = {NO_KEY: (None, None, "IDLE", None, 0)}
+        samples = []
+        interval = []
+        pos = RECORD_SIZE
+        while pos + RECORD_SIZE <= self.size:
+            kind, _, length, key_id, timestamp, value = RECORD.unpack_from(self.map, pos)
+            if kind == SAMPLE:
+                if key_id not in keys:
+                    break
+                interval.append((keys[key_id], timestamp, value))
+            elif kind == KEY:
+                blocks = -(-length // RECORD_SIZE)
+                if pos + RECORD_SIZE + blocks * RECORD_SIZE > self.size:
+                    break
+                start = pos + RECORD_SIZE
+                fields = bytes(self.map[start:start + length]).decode("utf-8", "replace").split("\x1f")
+                if len(fields) != 5:
+                    break
+                proc, title, cat, subcat, score = fields
+                try:
+                    score = float(score)
+                except ValueError:
+                    break
+                keys[key_id] = (proc or None, title, cat, subcat or None, score)
+                pos += blocks * RECORD_SIZE
+            elif kind == FLUSH:
+                if key_id > self.committed:
+                    samples += interval
+                interval = []
+                self.flushed = max(self.flushed, key_id)
+            else:
+                break
+            pos += RECORD_SIZE
+        return samples + interval, pos
+
+    def read(self):
+        """Return the journaled samples as (sample, timestamp, weight) tuples"""
+        return self._scan()[0]
+
+
+def journal_path(db_path):
+    """Journal file that belongs to a database"""
+    return f"{db_path}-samples"
+
+
+def open_journal(db_path):
+    """Open the journal next to the database, or None if disabled/unavailable"""
+    if not config.JOURNAL_ENABLED:
+        return None
+    try:
+        return SampleJournal(journal_path(db_path))
+    except (OSError, ValueError) as e:
+        logging.error(f"Sample journal unavailable: {e}")
+        return None
@@ -0,0 +1,77 @@
+"""
+Logging for the Activity Watcher
+Records are queued by the calling thread; a listener thread writes the rotating log file and the console
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+import config
+
+FILE_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets a warning from one call site through at most once per `interval`
+    seconds; the next one that passes says how many were dropped in
+    between. DEBUG, INFO, ERROR and CRITICAL records always pass: only
+    warnings repeat in a loop, and a failure must never go unlogged.
+
+    Runs in the calling thread before the record is queued, so a
+    suppressed record costs a dictionary lookup and nothing else.
+    """
+
+    def __init__(self, interval):
+        super().__init__()
+        self.interval = interval
+        self.sites = {}  # (pathname, lineno) -> [time last let through, suppressed since]
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno != logging.WARNING or self.interval <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        site = self.sites.get(key)
+        if site is None:
+            self.sites[key] = [record.created, 0]
+            return True
+        if record.created - site[0] < self.interval:
+            site[1] += 1
+            self.suppressed += 1
+            return False
+        if site[1]:
+            record.msg = f"{record.getMessage()} ({site[1]} similar messages suppressed)"
+            record.args = None
+        site[0] = record.created
+        site[1] = 0
+        return True
+
+
+def setup_logging():
+    """Route the root logger through a queue to the rotating log file and the console; returns the listener"""
+    file_handler = logging.handlers.RotatingFileHandler(
+        config.LOG_DIR / "watcher.log",
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+
+    # Unbounded: put() never blocks, and the listener keeps up with a few lines a minute
+    records = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(RateLimitFilter(config.LOG_REPEAT_INTERVAL))
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, config.LOG_LEVEL))
+    root.addHandler(handler)
+
+    listener = logging.handlers.QueueListener(records, file_handler, console, respect_handler_level=True)
+    listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,126 @@
+"""
+Compiled multi-pattern domain and keyword matching for window titles
+"""
+import re
+
+# Up to this many domains in all, one substring test per domain beats the
+# compiled regex (bench.py domains); the regex only pays off for long lists
+LOOP_MAX_DOMAINS = 128
+
+
+def trie_pattern(words):
+    """
+    Build a regex alternation shaped like a prefix trie, e.g.
+    ["github.com", "gitlab.com"] -> "git(?:hub\\.com|lab\\.com)".
+    Each position of the title then costs one branch per character
+    instead of one attempt per domain.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        is_word_end = "" in node
+        if len(branches) == 1 and not is_word_end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if is_word_end else body
+
+    return emit(trie)
+
+
+class DomainMatcher:
+    """
+    Matches window titles against several ordered domain lists in one pass.
+
+    All lists are compiled into a single trie-shaped regex with one named
+    group per list, highest priority first. The highest-priority list that
+    has a domain anywhere in the title wins, exactly like checking the
+    lists one after another with substring tests - which is what short
+    lists (up to loop_max domains in all) do instead, as it is faster.
+    """
+
+    def __init__(self, classes, loop_max=LOOP_MAX_DOMAINS):
+        """classes: ordered (label, domains) pairs, highest priority first"""
+        self.labels = []
+        self.lists = []
+        groups = []
+        for label, domains in classes:
+            domains = {d.lower() for d in domains if d}
+            if not domains:
+                continue
+            groups.append(f"(?P<g{len(self.labels)}>{trie_pattern(domains)})")
+            self.labels.append(label)
+            self.lists.append((label, tuple(sorted(domains))))
+
+        size = sum(len(domains) for _, domains in self.lists)
+        self.pattern = re.compile("|".join(groups)) if groups and size > loop_max else None
+
+    def match(self, title):
+        """Return the highest-priority label with a domain in title, or None"""
+        if not title:
+            return None
+
+        text = title.lower()
+        if self.pattern is None:
+            for label, domains in self.lists:
+                for domain in domains:
+                    if domain in text:
+                        return label
+            return None
+
+        search = self.pattern.search
+        best = None
+        m = search(text)
+        while m:
+            index = m.lastindex - 1
+            if index == 0:
+                return self.labels[0]
+            if best is None or index < best:
+                best = index
+            # A lower-priority hit may overlap a higher-priority domain
+            # starting further right, so resume right after its start
+            m = search(text, m.start() + 1)
+        return self.labels[best] if best is not None else None
+
+
+class KeywordMatcher:
+    """
+    Finds every keyword that occurs anywhere in a title, in one pass.
+
+    Keywords are compiled into a single trie-shaped regex. At each position
+    the trie yields the longest keyword starting there; shorter keywords
+    that are prefixes of it are picked up by lookup, and the search resumes
+    right after the match start so overlapping keywords are found too.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = {k.lower() for k in keywords if k}
+        self.lengths = sorted({len(k) for k in self.keywords})
+        self.pattern = re.compile(trie_pattern(self.keywords)) if self.keywords else None
+
+    def find_all(self, text):
+        """Set of keywords found in text (already lowercased)"""
+        found = set()
+        if self.pattern is None or not text:
+            return found
+
+        keywords = self.keywords
+        search = self.pattern.search
+        m = search(text)
+        while m:
+            word = m.group()
+            found.add(word)
+            for n in self.lengths:
+                if n >= len(word):
+                    break
+                if word[:n] in keywords:
+                    found.add(word[:n])
+            m = search(text, m.start() + 1)
+        return found
@@ -0,0 +1,158 @@
+"""
+Local metrics endpoint for the Activity Watcher
+Latency histograms and state gauges in the Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics
+"""
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Upper bounds in seconds: 10us .. 10s (the loop is sub-ms, a flush a few ms, a slow write more)
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0,
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram.
+
+    observe() is a bisect and two additions, cheap enough for every
+    sample. Each histogram is only observed from one thread; a scrape
+    from the HTTP thread may see a sum one observation ahead of the
+    counts, which Prometheus tolerates.
+    """
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+
+    def render(self, name, labels=""):
+        """Prometheus text lines (cumulative buckets, sum, count)"""
+        sep = "," if labels else ""
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {total}')
+        total += self.counts[-1]
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {total}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.9f}")
+        lines.append(f"{name}_count{suffix} {total}")
+        return lines
+
+
+class WatcherMetrics:
+    """
+    Timings recorded by the monitor loop, plus gauges read from the
+    watcher only when the endpoint is scraped.
+    """
+
+    STAGES = ("foreground", "categorize", "flush")
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+        self.loop = Histogram()
+        self.stages = {stage: Histogram() for stage in self.STAGES}
+        self.scrapes = 0
+
+    def process_lines(self):
+        """Resident memory and CPU time of the watcher process"""
+        times = os.times()
+        lines = [
+            "# TYPE process_cpu_seconds_total counter",
+            f"process_cpu_seconds_total {times.user + times.system:.3f}",
+        ]
+        if psutil is not None:
+            lines += [
+                "# TYPE process_resident_memory_bytes gauge",
+                f"process_resident_memory_bytes {psutil.Process().memory_info().rss}",
+            ]
+        return lines
+
+    def render(self):
+        """The full scrape in Prometheus text format"""
+        self.scrapes += 1
+        w = self.watcher
+        writer = w.writer.stats()
+        lines = [
+            "# HELP watcher_loop_seconds Work per monitor loop iteration, excluding the wait for the next sample",
+            "# TYPE watcher_loop_seconds histogram",
+            *self.loop.render("watcher_loop_seconds"),
+            "# HELP watcher_stage_seconds Time in get_foreground_app, categorize_activity and flush_buffer",
+            "# TYPE watcher_stage_seconds histogram",
+        ]
+        for stage, histogram in self.stages.items():
+            lines += histogram.render("watcher_stage_seconds", f'stage="{stage}"')
+        lines += [
+            "# HELP watcher_db_write_seconds Write-behind transaction latency",
+            "# TYPE watcher_db_write_seconds histogram",
+            *w.writer.write_seconds.render("watcher_db_write_seconds"),
+            "# TYPE watcher_write_queue_depth gauge",
+            f"watcher_write_queue_depth {writer['queue_depth']}",
+            "# TYPE watcher_write_records_total counter",
+            *(f'watcher_write_records_total{{state="{state}"}} {writer[state]}' for state in ("written", "dropped", "failed", "orphaned", "rejected")),
+            "# HELP watcher_buffer_seconds Sampled seconds in the current flush interval",
+            "# TYPE watcher_buffer_seconds gauge",
+            f"watcher_buffer_seconds {w.buffer.total:g}",
+            "# TYPE watcher_buffer_activities gauge",
+            f"watcher_buffer_activities {len(w.buffer.slots)}",
+            "# TYPE watcher_sample_interval_seconds gauge",
+            f"watcher_sample_interval_seconds {w.sampler.interval}",
+            "# TYPE watcher_skipped_samples_total counter",
+            f"watcher_skipped_samples_total {w.skipped_samples}",
+            "# TYPE watcher_idle gauge",
+            f"watcher_idle {int(w.is_idle)}",
+            "# TYPE watcher_paused gauge",
+            f"watcher_paused {int(w.is_paused)}",
+        ]
+        lines += self.process_lines()
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics; everything else is 404"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the watcher log
+        pass
+
+
+def start_server(metrics, host, port):
+    """Serve metrics from a daemon thread (port 0 picks a free one); None if the port is taken"""
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logging.error(f"Metrics endpoint unavailable on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Metrics: http://{host}:{server.server_port}/metrics")
+    return server
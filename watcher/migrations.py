@@ -0,0 +1,243 @@
+"""
+Versioned schema migrations for the Activity Watcher
+The schema version is kept in PRAGMA user_version; a current database skips all DDL
+"""
+import logging
+from datetime import datetime
+
+import config
+import storage
+from rollups import interval_records
+
+
+class Migration:
+    """
+    One schema version.
+
+    steps are SQL statements or callables taking the connection; they run
+    together with the user_version bump in a single transaction. backfill,
+    if set, moves data ahead of the steps in resumable chunks: it is called
+    as backfill(conn, chunk_rows) in its own short transaction until it
+    returns 0, and must pick up where a killed run stopped.
+    """
+
+    def __init__(self, version, description, steps, backfill=None):
+        self.version = version
+        self.description = description
+        self.steps = steps
+        self.backfill = backfill
+
+
+def is_table(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] == "table"
+
+
+def backfill_legacy_sessions(conn, chunk_rows):
+    """
+    Dictionary-encode the next chunk of a sessions table from before the
+    apps/titles/categories tables into session_facts. Progress is the
+    highest id already copied, so an interrupted upgrade resumes there.
+    Returns the number of rows moved.
+    """
+    if not is_table(conn, "sessions"):
+        return 0
+
+    # Columns added by later releases may be missing from older databases
+    columns = {info[1] for info in conn.execute("PRAGMA table_info(sessions)")}
+    optional = {c: f"s.{c}" if c in columns else "NULL" for c in ("rule_version", "domain")}
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM session_facts").fetchone()[0]
+    params = (last_id, chunk_rows)
+    chunk = "(SELECT * FROM sessions WHERE id > ? ORDER BY id LIMIT ?)"
+
+    # NULLs never collide under UNIQUE, so OR IGNORE would add a NULL display
+    # name or subcategory again in every chunk; look them up with IS instead
+    conn.execute(f"""
+        INSERT INTO apps (process_name, display_name)
+        SELECT DISTINCT s.process_name, s.process_display_name FROM {chunk} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM apps a WHERE a.process_name = s.process_name AND a.display_name IS s.process_display_name
+        )
+    """, params)
+    conn.execute(f"""
+        INSERT INTO categories (category, subcategory)
+        SELECT DISTINCT s.category, s.subcategory FROM {chunk} s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM categories c WHERE c.category = s.category AND c.subcategory IS s.subcategory
+        )
+    """, params)
+    conn.execute(f"""
+        INSERT OR IGNORE INTO titles (title)
+        SELECT DISTINCT window_title FROM {chunk} WHERE window_title IS NOT NULL
+    """, params)
+    return conn.execute(f"""
+        INSERT INTO session_facts
+        (id, start_time, end_time, app_id, title_id, category_id,
+         duration_seconds, foreground_seconds, keystroke_count,
+         mouse_click_count, is_focus_session, productivity_score,
+         rule_version, domain)
+        SELECT
+            s.id, s.start_time, s.end_time, a.id, t.id, c.id,
+            s.duration_seconds, s.foreground_seconds, s.keystroke_count,
+            s.mouse_click_count, s.is_focus_session, s.productivity_score,
+            {optional["rule_version"]}, {optional["domain"]}
+        FROM {chunk} s
+        JOIN apps a ON a.process_name = s.process_name AND a.display_name IS s.process_display_name
+        JOIN categories c ON c.category = s.category AND c.subcategory IS s.subcategory
+        LEFT JOIN titles t ON t.title = s.window_title
+        ORDER BY s.id
+    """, params).rowcount
+
+
+def drop_legacy_sessions(conn):
+    """Drop the fully copied sessions table so the view can take its name"""
+    if not is_table(conn, "sessions"):
+        return
+    left = conn.execute("""
+        SELECT COUNT(*) FROM sessions
+        WHERE id > (SELECT COALESCE(MAX(id), 0) FROM session_facts)
+    """).fetchone()[0]
+    if left:
+        raise RuntimeError(f"{left} legacy sessions were not copied; keeping the sessions table")
+    conn.execute("DROP TABLE sessions")
+
+
+# Where each unfinished backfill stopped, for backfills whose target has no row ids
+BACKFILL_PROGRESS = [
+    """
+        CREATE TABLE IF NOT EXISTS schema_backfill (
+            version INTEGER PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """,
+]
+
+
+def backfill_rollups(conn, chunk_rows):
+    """
+    Add the next chunk of existing sessions to the hourly and daily
+    rollups. A session's time is spread evenly from its start_time; the
+    last session id done is kept in schema_backfill.
+    Returns the number of sessions added.
+    """
+    row = conn.execute("SELECT last_id FROM schema_backfill WHERE version = 4").fetchone()
+    last_id = row[0] if row else 0
+    rows = conn.execute("""
+        SELECT s.id, s.start_time, s.duration_seconds, s.foreground_seconds,
+               s.productivity_score, s.app_id, s.category_id, c.category
+        FROM session_facts s JOIN categories c ON c.id = s.category_id
+        WHERE s.id > ? ORDER BY s.id LIMIT ?
+    """, (last_id, chunk_rows)).fetchall()
+    if not rows:
+        return 0
+
+    row = conn.execute("SELECT category FROM sessions WHERE id <= ? ORDER BY id DESC LIMIT 1", (last_id,)).fetchone()
+    previous = row[0] if row else None
+    hourly = []
+    daily = []
+    for session_id, start, duration, foreground, productivity, app_id, category_id, category in rows:
+        switches = int(previous is not None and previous != category)
+        previous = category
+        for kind, params in interval_records(
+            datetime.fromisoformat(start), duration, foreground, productivity or 0.0, app_id, category_id, 1, switches
+        ):
+            (hourly if kind == "hourly_rollup" else daily).append(params)
+    conn.executemany(storage.STATEMENTS["hourly_rollup"], hourly)
+    conn.executemany(storage.STATEMENTS["daily_rollup"], daily)
+    conn.execute("INSERT OR REPLACE INTO schema_backfill (version, last_id) VALUES (4, ?)", (rows[-1][0],))
+    return len(rows)
+
+
+MIGRATIONS = [
+    Migration(1, "base tables", storage.SCHEMA),
+    Migration(
+        2, "dictionary-encoded sessions behind a view",
+        [drop_legacy_sessions] + storage.VIEWS,
+        backfill=backfill_legacy_sessions,
+    ),
+    Migration(3, "hourly and daily rollup tables", storage.ROLLUPS + BACKFILL_PROGRESS),
+    Migration(
+        4, "rollups of existing sessions",
+        ["DELETE FROM schema_backfill WHERE version = 4"],
+        backfill=backfill_rollups,
+    ),
+    Migration(5, "idle rollups and system event index for retention", storage.RETENTION),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply(conn, migrations):
+    """Run the steps of several migrations and the version bump in one transaction"""
+    if not migrations:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have upgraded while we waited for the write lock
+        current = schema_version(conn)
+        for migration in migrations:
+            if migration.version <= current:
+                continue
+            for step in migration.steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            logging.info(f"Schema migration {migration.version}: {migration.description}")
+        if migrations[-1].version > current:
+            conn.execute(f"PRAGMA user_version = {int(migrations[-1].version)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run_backfill(conn, migration, chunk_rows, progress=None):
+    """Call a migration's backfill in chunked transactions until it is done"""
+    total = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            moved = migration.backfill(conn, chunk_rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if not moved:
+            break
+        total += moved
+        if progress:
+            progress(migration, total)
+    if total:
+        logging.info(f"Schema migration {migration.version}: backfilled {total} rows")
+    return total
+
+
+def migrate(conn, chunk_rows=None, progress=None):
+    """
+    Bring the database to SCHEMA_VERSION. Consecutive migrations share one
+    transaction; a backfill commits what came before it and then runs in
+    chunks of chunk_rows (config.MIGRATION_CHUNK_ROWS). progress(migration,
+    rows) is called after every chunk. Returns (old_version, new_version).
+    """
+    current = schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        if current > SCHEMA_VERSION:
+            logging.warning(f"Database schema version {current} is newer than this release ({SCHEMA_VERSION})")
+        return current, current
+
+    chunk_rows = chunk_rows or config.MIGRATION_CHUNK_ROWS
+    batch = []
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        if migration.backfill:
+            apply(conn, batch)
+            batch = []
+            run_backfill(conn, migration, chunk_rows, progress)
+        batch.append(migration)
+    apply(conn, batch)
+    return current, schema_version(conn)
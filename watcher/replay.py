@@ -0,0 +1,293 @@
+"""
+Trace replay for the Activity Watcher
+Feeds recorded or generated (timestamp, process, title) traces through the
+real sampling, categorization and flush code on a virtual clock.
+
+Usage:
+    python replay.py deep_work --hours 9
+    python replay.py --trace my_day.jsonl --db replay.db
+"""
+import argparse
+import bisect
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from clock import VirtualClock
+from foreground import ForegroundProvider, NO_WINDOW
+from idle import FakeIdleProvider
+from inputs import InputSource
+
+
+# ---------------------------------------------------------------------------
+# Traces
+# ---------------------------------------------------------------------------
+
+def load_trace(path):
+    """Read a JSON-lines trace of {"t", "process", "title"} events"""
+    trace = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                trace.append((float(event["t"]), event.get("process"), event.get("title")))
+    trace.sort(key=lambda e: e[0])
+    # Recorded traces may use epoch timestamps; replays start at offset 0
+    origin = trace[0][0] if trace else 0.0
+    return [(t - origin, proc, title) for t, proc, title in trace]
+
+
+def save_trace(trace, path):
+    """Write a trace as JSON lines"""
+    with open(path, "w", encoding="utf-8") as f:
+        for t, proc, title in trace:
+            f.write(json.dumps({"t": round(t, 3), "process": proc, "title": title}) + "\n")
+
+
+CODE_TITLES = [
+    "watcher.py - activity-tracker - Visual Studio Code",
+    "data_loader.py - activity-tracker - Visual Studio Code",
+    "README.md - activity-tracker - Visual Studio Code",
+    "test_api.py - backend - Cursor",
+]
+WORK_PAGES = [
+    "Pull requests · team/activity-tracker - github.com",
+    "python - How to use executemany - stackoverflow.com",
+    "sqlite3 — DB-API 2.0 interface - docs.python.org",
+    "Deployments - vercel.com",
+    "localhost:8501 - Activity Tracker Pro",
+]
+LEISURE_PAGES = [
+    "Lo-fi beats to code to - youtube.com",
+    "r/programming - reddit.com",
+    "Home / twitter.com",
+    "Stranger Things - netflix.com",
+]
+OTHER_PAGES = [
+    "Google Calendar - Week of March 3",
+    "Inbox (12) - Mail",
+    "Weather forecast",
+]
+
+
+def _code(rng):
+    return rng.choice([("Code.exe", t) for t in CODE_TITLES[:3]] + [("Cursor.exe", CODE_TITLES[3])])
+
+
+def _browser(pages):
+    def pick(rng):
+        proc, suffix = rng.choice([("firefox.exe", "Mozilla Firefox"), ("msedge.exe", "Microsoft Edge"), ("brave.exe", "Brave")])
+        return proc, f"{rng.choice(pages)} - {suffix}"
+    return pick
+
+
+def _chat(rng):
+    return rng.choice([("Telegram.exe", "Telegram"), ("Spotify.exe", "Spotify Premium")])
+
+
+def _away(rng):
+    return None, None
+
+
+def generate(activities, hours, seed=None):
+    """
+    Build a trace from weighted activities.
+
+    activities: list of (weight, (min_s, max_s), picker) where picker(rng)
+    returns (process, title) and the dwell time is uniform in the range.
+    """
+    rng = random.Random(seed)
+    weights = [a[0] for a in activities]
+    trace, t, end = [], 0.0, hours * 3600.0
+    while t < end:
+        _, (low, high), picker = rng.choices(activities, weights)[0]
+        proc, title = picker(rng)
+        trace.append((t, proc, title))
+        t += rng.uniform(low, high)
+    return trace
+
+
+def deep_work_day(hours=9, seed=1):
+    """Long editor stretches with occasional chat, docs and short breaks"""
+    return generate([
+        (6, (25 * 60, 90 * 60), _code),
+        (2, (60, 8 * 60), _browser(WORK_PAGES)),
+        (2, (30, 5 * 60), _chat),
+        (1, (60, 4 * 60), _away),
+    ], hours, seed)
+
+
+def high_switching_day(hours=9, seed=2):
+    """Constant context switching between many apps and tabs"""
+    return generate([
+        (4, (10, 120), _code),
+        (3, (5, 90), _browser(WORK_PAGES)),
+        (2, (5, 60), _browser(LEISURE_PAGES)),
+        (3, (5, 45), _chat),
+        (1, (5, 60), _browser(OTHER_PAGES)),
+        (1, (10, 3 * 60), _away),
+    ], hours, seed)
+
+
+def browser_heavy_day(hours=9, seed=3):
+    """Mostly browser work: docs, PRs, dashboards, with some leisure tabs"""
+    return generate([
+        (5, (60, 15 * 60), _browser(WORK_PAGES)),
+        (2, (60, 10 * 60), _browser(LEISURE_PAGES)),
+        (1, (60, 5 * 60), _browser(OTHER_PAGES)),
+        (2, (5 * 60, 30 * 60), _code),
+        (1, (60, 4 * 60), _away),
+    ], hours, seed)
+
+
+WORKLOADS = {
+    "deep_work": deep_work_day,
+    "high_switching": high_switching_day,
+    "browser_heavy": browser_heavy_day,
+}
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+class ReplayProvider(ForegroundProvider):
+    """Foreground provider that reads a trace on a virtual clock"""
+
+    name = "replay"
+
+    def __init__(self, trace, clock, event_driven=False):
+        self.clock = clock
+        self.event_driven = event_driven
+        self.times = [t for t, _, _ in trace]
+        self.states = [
+            (proc, proc.lower(), title) if proc else NO_WINDOW
+            for _, proc, title in trace
+        ]
+        self.samples = 0
+
+    @property
+    def end(self):
+        """Offset of the last event"""
+        return self.times[-1] if self.times else 0.0
+
+    def sample(self):
+        """Trace state at the current virtual time"""
+        self.samples += 1
+        i = bisect.bisect_right(self.times, self.clock.monotonic()) - 1
+        return self.states[i] if i >= 0 else NO_WINDOW
+
+    def wait(self, timeout):
+        """Advance the clock; event-driven replays stop at the next change"""
+        now = self.clock.monotonic()
+        if self.event_driven:
+            i = bisect.bisect_right(self.times, now)
+            if i < len(self.times) and self.times[i] - now < timeout:
+                self.clock.sleep(self.times[i] - now)
+                return True
+        self.clock.sleep(timeout)
+        return False
+
+    def stats(self):
+        return {"samples": self.samples}
+
+
+def session_summary(db_path):
+    """Per-category totals of the sessions table, for comparing replays"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT category, COUNT(*), SUM(duration_seconds), SUM(foreground_seconds)
+            FROM sessions GROUP BY category ORDER BY category
+        """).fetchall()
+    finally:
+        conn.close()
+    return {
+        category: {"sessions": count, "duration_seconds": duration, "foreground_seconds": fg}
+        for category, count, duration, fg in rows
+    }
+
+
+def away_periods(trace):
+    """(start, end) offsets of the trace's no-window stretches, as idle periods"""
+    periods = []
+    for (t, proc, _), nxt in zip(trace, trace[1:] + [(float("inf"), None, None)]):
+        if not proc:
+            periods.append((t, nxt[0]))
+    return periods
+
+
+def run_replay(trace, db_path, duration=None, event_driven=False, start=None, clock=None,
+               input_source=None, idle_provider=None):
+    """
+    Replay a trace through ActivityWatcher on a virtual clock.
+    Returns the watcher (already shut down) for inspection.
+    Without an input source, activity falls back to process detection;
+    the default idle provider treats the trace's no-window stretches as away.
+    """
+    from watcher import ActivityWatcher
+
+    clock = clock or VirtualClock(start or datetime.now().replace(hour=9, minute=0, second=0, microsecond=0))
+    provider = ReplayProvider(trace, clock, event_driven=event_driven)
+    watcher = ActivityWatcher(
+        db_path=db_path, provider=provider, clock=clock, interactive=False,
+        input_source=input_source or InputSource(),
+        idle_provider=idle_provider or FakeIdleProvider(clock, away_periods(trace)),
+    )
+
+    end = duration if duration is not None else provider.end
+    while clock.monotonic() < end:
+        watcher.monitor_step()
+    watcher.shutdown()
+    return watcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a foreground-window trace through the watcher")
+    parser.add_argument("workload", nargs="?", choices=sorted(WORKLOADS), default="deep_work")
+    parser.add_argument("--trace", help="JSON-lines trace to replay instead of a generated workload")
+    parser.add_argument("--save-trace", help="write the replayed trace to this file")
+    parser.add_argument("--hours", type=float, default=9)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--db", help="database to write (default: temporary file)")
+    parser.add_argument("--event-driven", action="store_true", help="replay as an event-driven provider")
+    parser.add_argument("--verbose", action="store_true", help="keep per-session INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.trace:
+        trace = load_trace(args.trace)
+        duration = None
+    else:
+        generator = WORKLOADS[args.workload]
+        trace = generator(args.hours) if args.seed is None else generator(args.hours, args.seed)
+        duration = args.hours * 3600.0
+    if args.save_trace:
+        save_trace(trace, args.save_trace)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="watcher-replay-"), "replay.db")
+    t0 = time.perf_counter()
+    watcher = run_replay(trace, db_path, duration, args.event_driven)
+    wall = time.perf_counter() - t0
+
+    print(json.dumps({
+        "workload": args.trace or args.workload,
+        "events": len(trace),
+        "simulated_hours": watcher.clock.monotonic() / 3600.0,
+        "wall_seconds": wall,
+        "samples": watcher.provider.samples,
+        "samples_per_sec": watcher.provider.samples / wall if wall else None,
+        "db": db_path,
+        "sessions": session_summary(db_path),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Retention for the Activity Watcher
+Ages out old rows in small batches and gives free pages back to the OS while idle
+"""
+import argparse
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import config
+import storage
+
+
+class RetentionPolicy:
+    """
+    Deletes rows past their retention age without holding up session writes.
+
+    Raw sessions are already counted in the hourly and daily rollups when
+    they are written, so they are simply deleted; idle periods are first
+    folded into idle_rollups in the same transaction. Hourly rollups are
+    downsampled to the daily ones, and system events have their own TTL.
+
+    With a Parquet archive, sessions and idle periods are only deleted
+    once their month has been exported; the export itself is started from
+    here whenever nothing is left to delete.
+
+    The monitor loop only schedules: tick() queues one step as a task on
+    the write-behind writer, and the probe, the delete and any vacuum run
+    there, between session transactions, so sampling never waits on the
+    database. A step deletes at most one batch (RETENTION_BATCH_ROWS rows
+    of one table); the next one is due RETENTION_BATCH_PAUSE later, or
+    RETENTION_CHECK_INTERVAL once nothing is left. While the user is idle,
+    free pages are returned with incremental vacuum, RETENTION_VACUUM_PAGES
+    per step. A file created before incremental mode keeps its free pages
+    for reuse until it is converted offline (see convert_to_incremental).
+    """
+
+    # Table, age setting, probe for rows older than the cutoff
+    TARGETS = [
+        ("sessions", "RETENTION_SESSION_DAYS", "SELECT 1 FROM session_facts WHERE start_time < ? LIMIT 1"),
+        ("idle_periods", "RETENTION_SESSION_DAYS", "SELECT 1 FROM idle_periods WHERE start_time < ? LIMIT 1"),
+        ("system_events", "RETENTION_EVENT_DAYS", "SELECT 1 FROM system_events WHERE timestamp < ? LIMIT 1"),
+        ("hourly_rollups", "RETENTION_HOURLY_DAYS", "SELECT 1 FROM hourly_rollups WHERE hour < ? LIMIT 1"),
+    ]
+
+    # Tables exported by the archive before they are deleted
+    ARCHIVED = ("sessions", "idle_periods")
+
+    def __init__(self, db, writer, clock, archive=None):
+        self.db = db
+        self.writer = writer
+        self.clock = clock
+        self.archive = archive
+        self.next_run = 0.0
+        self.pending = False
+        self.turn = 0
+        self.table_batches = defaultdict(int)
+        self.batches = 0
+        self.vacuum_steps = 0
+        self.vacuumed_pages = 0
+        self.incremental = None
+
+    def cutoff(self, setting):
+        """ISO timestamp before which rows of a target expire, or None if kept forever"""
+        days = getattr(config, setting)
+        if not days:
+            return None
+        return (self.clock.now() - timedelta(days=days)).isoformat()
+
+    def tick(self, now, idle=False):
+        """Queue the next step on the writer if one is due and the last one has run"""
+        if self.pending or now < self.next_run:
+            return
+        self.pending = True
+        if not self.writer.submit_task(lambda conn: self.step(conn, now, idle)):
+            self.pending = False
+            self.next_run = now + config.RETENTION_BATCH_PAUSE
+
+    def step(self, conn, now, idle=False):
+        """One retention step on the writer thread; schedules the next one"""
+        busy = False
+        try:
+            busy = self.expire_batch(conn)
+            if self.archive and not busy:
+                self.archive.start(self.clock.now())
+            if idle:
+                busy = self.vacuum_step(conn) or busy
+        finally:
+            self.next_run = now + (config.RETENTION_BATCH_PAUSE if busy else config.RETENTION_CHECK_INTERVAL)
+            self.pending = False
+        return busy
+
+    def expire_batch(self, conn):
+        """Delete one batch from the next table (in turn) that has expired rows; True if one was deleted"""
+        for i in range(len(self.TARGETS)):
+            table, setting, probe = self.TARGETS[(self.turn + i) % len(self.TARGETS)]
+            cutoff = self.cutoff(setting)
+            if cutoff is None:
+                continue
+            if self.archive and table in self.ARCHIVED:
+                cutoff = min(cutoff, self.archive.horizon(self.clock.now()))
+            if conn.execute(probe, (cutoff,)).fetchone():
+                self.turn = (self.turn + i + 1) % len(self.TARGETS)
+                with conn:
+                    getattr(self, f"expire_{table}")(conn, cutoff)
+                self.table_batches[table] += 1
+                self.batches += 1
+                return True
+        return False
+
+    def expire_sessions(self, conn, cutoff):
+        conn.execute(storage.STATEMENTS["retention_sessions"], (cutoff, config.RETENTION_BATCH_ROWS))
+
+    def expire_system_events(self, conn, cutoff):
+        conn.execute(storage.STATEMENTS["retention_events"], (cutoff, config.RETENTION_BATCH_ROWS))
+
+    def expire_hourly_rollups(self, conn, cutoff):
+        cutoff = cutoff[:13] + ":00:00"  # whole hours
+        conn.execute(storage.STATEMENTS["retention_hourly"], (cutoff, cutoff, config.RETENTION_BATCH_ROWS, cutoff))
+
+    def expire_idle_periods(self, conn, cutoff):
+        # Fold and delete pick the same rows inside one transaction
+        params = (cutoff, config.RETENTION_BATCH_ROWS)
+        conn.execute(storage.STATEMENTS["retention_idle_fold"], params)
+        conn.execute(storage.STATEMENTS["retention_idle"], params)
+
+    def vacuum_step(self, conn):
+        """Return up to RETENTION_VACUUM_PAGES free pages to the OS; True if more remain"""
+        if self.incremental is None:
+            self.incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            if not self.incremental:
+                # A full VACUUM would hold the write lock for the whole rebuild
+                logging.info(f"Free pages are reused but not returned to the OS; run `python retention.py --db {self.db.db_path}` while the watcher is stopped")
+        if not self.incremental:
+            return False
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free < config.RETENTION_VACUUM_PAGES:
+            return False
+        # execute() steps the pragma once (one page); executescript() runs it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({int(config.RETENTION_VACUUM_PAGES)})")
+        self.vacuum_steps += 1
+        self.vacuumed_pages += min(free, config.RETENTION_VACUUM_PAGES)
+        return free > config.RETENTION_VACUUM_PAGES
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "batches_by_table": dict(self.table_batches),
+            "vacuum_steps": self.vacuum_steps,
+            "vacuumed_pages": self.vacuumed_pages,
+        }
+
+
+def convert_to_incremental(conn):
+    """Switch a database created before incremental vacuum with one full VACUUM; returns seconds taken"""
+    t0 = time.perf_counter()
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Switch the database to incremental vacuum (stop the watcher first)")
+    parser.add_argument("--db", default=config.DB_PATH)
+    args = parser.parse_args()
+
+    conn = storage.connect(args.db)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            print("Already using incremental vacuum")
+            return
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        seconds = convert_to_incremental(conn)
+        print(f"Switched to incremental vacuum in {seconds:.1f}s ({free} free pages returned)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Hourly and daily rollups for the Activity Watcher
+Each interval's totals are split at hour boundaries and added to its hour and day
+"""
+from datetime import timedelta
+
+
+def hour_slices(start, seconds):
+    """Split [start, start + seconds) at hour boundaries: [(hour, seconds), ...]"""
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    end = start + timedelta(seconds=seconds)
+    slices = []
+    t = start
+    while t < end:
+        next_hour = hour + timedelta(hours=1)
+        cut = min(end, next_hour)
+        slices.append((hour, (cut - t).total_seconds()))
+        t, hour = cut, next_hour
+    return slices or [(hour, 0.0)]
+
+
+def interval_records(start, duration, foreground_seconds, productivity, app_id, category_id, sessions=0, switches=0):
+    """
+    Upsert records adding one interval to the hourly and daily rollups.
+    Time is shared out by the seconds that fall in each hour; a new
+    session (and a change of category) counts in the hour it starts.
+    """
+    hourly = []
+    daily = []
+    for i, (hour, seconds) in enumerate(hour_slices(start, duration)):
+        share = seconds / duration if duration else 1.0
+        values = (
+            category_id, app_id, seconds, foreground_seconds * share, productivity * seconds,
+            sessions if i == 0 else 0, switches if i == 0 else 0,
+        )
+        hourly.append(("hourly_rollup", (hour.isoformat(), *values)))
+        daily.append(("daily_rollup", (hour.date().isoformat(), *values)))
+    return hourly + daily
@@ -0,0 +1,475 @@
+"""
+Categorization rules for the Activity Watcher
+Loaded from a TOML/JSON rules file and compiled into immutable lookup tables
+"""
+import bisect
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+from types import MappingProxyType
+
+import config
+from matcher import DomainMatcher, KeywordMatcher
+from titles import domain_suffixes
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+
+# Categories a rule may assign, with the score used when the rule has none
+CATEGORY_SCORES = {
+    "PRIMARY_WORK": 100,
+    "SECONDARY_WORK": 60,
+    "BROWSER_WORK": 80,
+    "BROWSER_NONWORK": 20,
+    "IDLE": 0,
+}
+
+_REGEX_CHARS = set(".^$*+?{}[]\\|()")
+
+
+def required_literal(pattern):
+    """
+    Longest run of plain text every match of `pattern` must contain
+    (lowercased, ASCII only), or "" when none can be found cheaply.
+    Only top-level text counts: groups, classes and escapes like \\b end a
+    run, a quantified character is dropped, and a top-level | means no
+    literal is required at all.
+    """
+    runs, run = [], ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if depth == 0 and not nxt.isalnum() and nxt.isascii():
+                run += nxt  # escaped punctuation is literal
+                continue
+            runs.append(run)
+            run = ""
+            continue
+        if ch == "[":
+            # Character class: skip to its closing bracket
+            runs.append(run)
+            run = ""
+            i = pattern.find("]", i + 2 if pattern[i + 1:i + 2] == "]" else i + 1)
+            if i < 0:
+                return ""
+            i += 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return ""
+        elif ch in "?*{" and depth == 0:
+            run = run[:-1]  # the quantified character may be missing
+            if ch == "{":
+                i = pattern.find("}", i)
+                if i < 0:
+                    return ""
+        elif ch == "+" and depth == 0:
+            pass  # at least once: the character stays required
+        elif depth == 0 and ch not in _REGEX_CHARS and ch.isascii():
+            run += ch
+            i += 1
+            continue
+        runs.append(run)
+        run = ""
+        i += 1
+    runs.append(run)
+    return max(runs, key=len).lower()
+
+
+def parse_hours(text):
+    """ "09:00-18:00" -> (540, 1080) minutes of the day; the end may wrap past midnight"""
+    try:
+        start, end = (part.strip().split(":") for part in text.split("-"))
+        start, end = int(start[0]) * 60 + int(start[1]), int(end[0]) * 60 + int(end[1])
+    except (ValueError, IndexError, AttributeError):
+        raise ValueError(f"hours must look like 09:00-18:00, got {text!r}")
+    if not (0 <= start <= 1440 and 0 <= end <= 1440):
+        raise ValueError(f"hours out of range: {text!r}")
+    return start, end
+
+
+class Rule:
+    """
+    One ordered categorization rule. Every condition that is set must hold:
+    - process: glob on the lowercased process name (all processes if unset)
+    - title: case-insensitive regex searched in the window title
+    - domain: one or more domains; the page's hostname must be one of them
+      or a subdomain, or, when no hostname could be extracted from the
+      title, one of them must appear in the title
+    - hours: local time-of-day range
+    The first matching rule (file order) decides category, subcategory and score.
+    """
+
+    __slots__ = ("index", "process", "title", "domains", "hours", "category", "subcategory", "score", "keywords")
+
+    def __init__(self, index, data):
+        self.index = index
+        unknown = set(data) - {"process", "title", "domain", "hours", "category", "subcategory", "score"}
+        if unknown:
+            raise ValueError(f"unknown fields {sorted(unknown)}")
+
+        self.category = data.get("category")
+        if self.category not in CATEGORY_SCORES:
+            raise ValueError(f"category must be one of {sorted(CATEGORY_SCORES)}, got {self.category!r}")
+        self.subcategory = data.get("subcategory")
+        self.score = data.get("score", CATEGORY_SCORES[self.category])
+        if isinstance(self.score, bool) or not isinstance(self.score, (int, float)):
+            raise ValueError(f"score must be a number, got {self.score!r}")
+
+        process = data.get("process", "*")
+        self.process = process.lower() if isinstance(process, str) else None
+        if not self.process:
+            raise ValueError("process must be a non-empty glob")
+
+        title = data.get("title")
+        domains = data.get("domain", [])
+        if isinstance(domains, str):
+            domains = [domains]
+        self.domains = tuple(d.lower() for d in domains if d)
+        self.title = re.compile(title, re.IGNORECASE) if title else None
+        self.hours = parse_hours(data["hours"]) if "hours" in data else None
+
+        # Literal text the title must contain, so the rule can be found by
+        # keyword search instead of being evaluated for every title
+        if title and not self.title.flags & re.VERBOSE and len(required_literal(title)) >= 3:
+            self.keywords = (required_literal(title),)
+        else:
+            self.keywords = ()
+
+    def applies(self, title, lowered, minute, suffixes=None):
+        """Check the title and time conditions (the process was matched by bucketing)"""
+        if self.domains:
+            if suffixes is not None:
+                if not any(s in self.domains for s in suffixes):
+                    return False
+            elif not any(d in lowered for d in self.domains):
+                return False
+        if self.title is not None and not self.title.search(title):
+            return False
+        if self.hours is not None:
+            start, end = self.hours
+            if minute is None:
+                return False
+            if start <= end:
+                if not start <= minute < end:
+                    return False
+            elif end <= minute < start:
+                return False
+        return True
+
+
+class RuleGroup:
+    """
+    Rules sharing one process pattern, in priority order.
+
+    Domain rules are indexed by domain and looked up with the page's
+    hostname and its parent domains (or, without a hostname, with the
+    domains found in the title). Rules on literal text that a title regex
+    requires are indexed by that text. The candidates are then checked in
+    priority order; only the remaining rules are evaluated one by one, and
+    only up to the best hit.
+    """
+
+    __slots__ = ("size", "by_domain", "by_keyword", "scan")
+
+    def __init__(self, rules):
+        self.size = len(rules)
+        self.by_domain = {}
+        self.by_keyword = {}
+        self.scan = []
+        for rule in rules:
+            if rule.domains:
+                for domain in rule.domains:
+                    self.by_domain.setdefault(domain, []).append(rule)
+            elif rule.keywords:
+                for keyword in rule.keywords:
+                    self.by_keyword.setdefault(keyword, []).append(rule)
+            else:
+                self.scan.append(rule)
+
+    def match(self, title, lowered, minute, found, suffixes=None):
+        """The first rule of the group that applies, given the keywords found in the title"""
+        candidates = set()
+        by_domain = self.by_domain
+        by_keyword = self.by_keyword
+        if by_domain and suffixes is not None:
+            for domain in suffixes:
+                rules = by_domain.get(domain)
+                if rules:
+                    candidates.update(rules)
+        for keyword in found:
+            rules = by_keyword.get(keyword)
+            if rules:
+                candidates.update(rules)
+            if suffixes is None:
+                rules = by_domain.get(keyword)
+                if rules:
+                    candidates.update(rules)
+
+        best = None
+        if candidates:
+            for rule in sorted(candidates, key=lambda r: r.index):
+                if rule.applies(title, lowered, minute, suffixes):
+                    best = rule
+                    break
+
+        for rule in self.scan:
+            if best is not None and rule.index > best.index:
+                break
+            if rule.applies(title, lowered, minute, suffixes):
+                return rule
+        return best
+
+
+class RuleEngine:
+    """
+    Ordered rules compiled into per-process rule groups at load time.
+
+    Rules are grouped by their process pattern: one group per exact process
+    name and one per glob. The first time a process is seen its bucket -
+    its exact group plus the glob groups that match its name - is looked
+    up and memoized, so a sample only evaluates rules relevant to its
+    process. All domains and literal title text are compiled into a single
+    KeywordMatcher, so a title is searched once however many rules there are.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        by_process = {}
+        for rule in self.rules:
+            by_process.setdefault(rule.process, []).append(rule)
+        self.exact = {}
+        self.globbed = []
+        for process, group_rules in by_process.items():
+            group = RuleGroup(group_rules)
+            if set(process) & set("*?["):
+                self.globbed.append((re.compile(fnmatch.translate(process)), group))
+            else:
+                self.exact[process] = group
+        self.keywords = KeywordMatcher({k for rule in self.rules for k in rule.domains + rule.keywords})
+        # Minutes where a time-of-day rule starts or stops applying
+        self.boundaries = sorted({m for rule in self.rules if rule.hours for m in rule.hours})
+        self._buckets = {}
+
+    def bucket(self, process_lower):
+        """The rule groups that can apply to a process (empty when none)"""
+        try:
+            return self._buckets[process_lower]
+        except KeyError:
+            pass
+        groups = [group for pattern, group in self.globbed if pattern.match(process_lower)]
+        if process_lower in self.exact:
+            groups.append(self.exact[process_lower])
+        bucket = tuple(groups)
+        self._buckets[process_lower] = bucket
+        return bucket
+
+    def time_slot(self, minute):
+        """Index of the stretch between rule boundaries that `minute` falls in"""
+        return bisect.bisect_right(self.boundaries, minute)
+
+    def match(self, process_lower, title, minute=None, domain=None):
+        """The first rule that applies to this process and title, or None"""
+        bucket = self.bucket(process_lower)
+        if not bucket:
+            return None
+        title = title or ""
+        lowered = title.lower()
+        suffixes = domain_suffixes(domain) if domain else None
+        found = self.keywords.find_all(lowered)
+        best = None
+        for group in bucket:
+            rule = group.match(title, lowered, minute, found, suffixes)
+            if rule is not None and (best is None or rule.index < best.index):
+                best = rule
+        return best
+
+
+class RuleSet:
+    """
+    One compiled, read-only version of the categorization rules.
+
+    Ordered rules are compiled into a RuleEngine and take precedence; the
+    app tables are lowercased and frozen and the domain lists compiled into
+    a DomainMatcher for processes no rule applies to. `version` is a short hash of the rule content (the
+    same rules give the same version whatever file or format they came
+    from). A RuleSet is never modified: a reload builds a new one and the
+    categorizer swaps it in with a single assignment.
+    """
+
+    __slots__ = (
+        "primary_apps", "secondary_apps", "browser_apps", "domain_matcher",
+        "work_domains", "nonwork_domains", "site_domains", "engine", "version", "source",
+    )
+
+    def __init__(self, primary_apps, secondary_apps, browser_apps, work_domains, nonwork_domains, rules=(), source="config"):
+        self.primary_apps = MappingProxyType({k.lower(): v for k, v in primary_apps.items()})
+        self.secondary_apps = MappingProxyType({k.lower(): v for k, v in secondary_apps.items()})
+        self.browser_apps = MappingProxyType({k.lower(): v for k, v in browser_apps.items()})
+        self.domain_matcher = DomainMatcher([
+            ("BROWSER_WORK", work_domains),
+            ("BROWSER_NONWORK", nonwork_domains),
+        ])
+        self.work_domains = frozenset(d.lower() for d in work_domains if d)
+        self.nonwork_domains = frozenset(d.lower() for d in nonwork_domains if d)
+        compiled = []
+        for i, data in enumerate(rules):
+            try:
+                compiled.append(Rule(i, data))
+            except (ValueError, TypeError, re.error) as e:
+                raise ValueError(f"rule {i + 1}: {e}") from None
+        self.engine = RuleEngine(compiled)
+        # Every domain the rules know, for recognizing site names in titles
+        self.site_domains = tuple(self.work_domains | self.nonwork_domains | {d for r in compiled for d in r.domains})
+        self.version = hashlib.sha1(json.dumps(
+            [dict(self.primary_apps), dict(self.secondary_apps), dict(self.browser_apps),
+             list(work_domains), list(nonwork_domains), list(rules)],
+            sort_keys=True,
+        ).encode()).hexdigest()[:12]
+        self.source = source
+
+    def classify_domain(self, domain):
+        """BROWSER_WORK / BROWSER_NONWORK for a hostname (or a parent domain of it), else None"""
+        suffixes = domain_suffixes(domain)
+        if any(s in self.work_domains for s in suffixes):
+            return "BROWSER_WORK"
+        if any(s in self.nonwork_domains for s in suffixes):
+            return "BROWSER_NONWORK"
+        return None
+
+    @classmethod
+    def from_data(cls, data, source):
+        """
+        Build a RuleSet from a parsed rules file:
+            [apps] primary / secondary / browsers  - process name -> display name
+            [domains] work / nonwork               - lists of domains
+            [[rules]]                              - ordered rules, see Rule
+        """
+        apps = data.get("apps", {})
+        domains = data.get("domains", {})
+        tables = [apps.get("primary", {}), apps.get("secondary", {}), apps.get("browsers", {})]
+        lists = [domains.get("work", []), domains.get("nonwork", [])]
+        rules = data.get("rules", [])
+        if not isinstance(rules, list) or not all(isinstance(r, dict) for r in rules):
+            raise ValueError("rules must be a list of tables")
+        for table in tables:
+            if not isinstance(table, dict) or not all(isinstance(v, str) for v in table.values()):
+                raise ValueError("apps tables must map process names to display names")
+        for domain_list in lists:
+            if not isinstance(domain_list, list) or not all(isinstance(d, str) for d in domain_list):
+                raise ValueError("domains must be lists of strings")
+        return cls(*tables, *lists, rules=rules, source=source)
+
+
+def default_rules():
+    """The built-in rules from config, used when there is no rules file"""
+    return RuleSet(
+        config.PRIMARY_WORK_APPS,
+        config.SECONDARY_WORK_APPS,
+        config.BROWSER_APPS,
+        config.WORK_DOMAINS,
+        config.NON_WORK_DOMAINS,
+        config.CATEGORY_RULES,
+    )
+
+
+def load_rules_file(path):
+    """Parse and compile a .toml or .json rules file"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if str(path).lower().endswith(".json"):
+        data = json.loads(raw)
+    elif tomllib is not None:
+        data = tomllib.loads(raw.decode("utf-8"))
+    else:
+        raise RuntimeError("TOML rules files need Python 3.11+ - use a .json rules file")
+    return RuleSet.from_data(data, source=str(path))
+
+
+class RulesFile:
+    """
+    Watches the rules file and recompiles it when it changes.
+
+    poll() stats the file at most once per `check_interval` seconds and
+    only reads and compiles it when its mtime or size changed. A file that
+    fails to parse is logged and the rules in use are kept; a file that
+    disappears falls back to the built-in rules.
+    """
+
+    def __init__(self, path=None, check_interval=None):
+        self.path = path if path is not None else config.RULES_PATH
+        self.check_interval = config.RULES_CHECK_INTERVAL if check_interval is None else check_interval
+        self.signature = None
+        self.next_check = None
+        self.checks = 0
+        self.reloads = 0
+        self.errors = 0
+        self.rules = self._load(self._stat()) or default_rules()
+
+    def _stat(self):
+        """(mtime_ns, size) of the rules file, or None if it does not exist"""
+        self.checks += 1
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, signature):
+        """Compile the file for `signature`; None if it is missing or broken"""
+        self.signature = signature
+        if signature is None:
+            return None
+        try:
+            rules = load_rules_file(self.path)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Invalid rules file {self.path}: {e}")
+            return None
+        logging.info(f"Loaded categorization rules {rules.version} from {self.path}")
+        return rules
+
+    def poll(self, now):
+        """Return a new RuleSet if the file changed since the last check, else None"""
+        if self.next_check is not None and now < self.next_check:
+            return None
+        self.next_check = now + self.check_interval
+
+        signature = self._stat()
+        if signature == self.signature:
+            return None
+        if signature is None:
+            self.signature = None
+            rules = default_rules()
+            logging.warning(f"Rules file {self.path} removed - using built-in rules")
+        else:
+            rules = self._load(signature)
+            if rules is None:
+                return None  # keep the rules in use
+        if rules.version == self.rules.version:
+            return None  # touched but unchanged
+        self.rules = rules
+        self.reloads += 1
+        return rules
+
+    def stats(self):
+        return {
+            "version": self.rules.version,
+            "source": self.rules.source,
+            "checks": self.checks,
+            "reloads": self.reloads,
+            "errors": self.errors,
+        }
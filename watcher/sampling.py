@@ -0,0 +1,70 @@
+"""
+Adaptive sampling schedule for the Activity Watcher
+Backs off while the foreground activity is stable, snaps back on a change
+"""
+import time
+
+import config
+
+
+class AdaptiveSampler:
+    """
+    Chooses the delay before the next sample.
+
+    After SAMPLE_BACKOFF_AFTER identical samples at one step the interval
+    moves to the next entry of SAMPLE_BACKOFF_STEPS (e.g. 1s -> 2s -> 5s).
+    Any change returns to the first step. The monitor loop weights every
+    sample by the real elapsed time, so backing off does not distort
+    durations; it only delays noticing a switch by at most one interval.
+    """
+
+    def __init__(self, steps=None, backoff_after=None, enabled=None, clock=time):
+        self.steps = list(steps or config.SAMPLE_BACKOFF_STEPS)
+        self.backoff_after = backoff_after or config.SAMPLE_BACKOFF_AFTER
+        self.enabled = config.ADAPTIVE_SAMPLING if enabled is None else enabled
+
+        self.level = 0
+        self.stable = 0
+        self.last_key = None
+
+        self.clock = clock
+        self.wakeups = 0
+        self.started = clock.monotonic()
+
+    @property
+    def interval(self):
+        """Current delay before the next sample, in seconds"""
+        return self.steps[self.level]
+
+    def observe(self, key):
+        """Record one sample and return the delay before the next one"""
+        self.wakeups += 1
+        if not self.enabled:
+            return self.steps[0]
+
+        if key != self.last_key:
+            self.last_key = key
+            self.level = 0
+            self.stable = 0
+            return self.steps[0]
+
+        self.stable += 1
+        if self.stable >= self.backoff_after and self.level < len(self.steps) - 1:
+            self.level += 1
+            self.stable = 0
+        return self.steps[self.level]
+
+    def reset(self):
+        """Back to full resolution (after idle, pause or resume)"""
+        self.level = 0
+        self.stable = 0
+        self.last_key = None
+
+    def stats(self):
+        """Wakeup counters"""
+        hours = (self.clock.monotonic() - self.started) / 3600.0
+        return {
+            "wakeups": self.wakeups,
+            "wakeups_per_hour": round(self.wakeups / hours, 1) if hours > 0 else 0.0,
+            "interval": self.interval,
+        }
@@ -0,0 +1,115 @@
+"""
+Session coalescing for the Activity Watcher
+Consecutive intervals of the same activity extend one sessions row
+"""
+from datetime import timedelta
+
+import config
+
+
+class OpenSession:
+    """
+    The sessions row that is still being extended.
+
+    The row is inserted for the first interval and then updated in place
+    (end_time, durations, focus flag, productivity) while later intervals
+    have the same dominant (process, category, subcategory) and site under
+    the same rule version. A change of activity, site or rules, a gap,
+    idle or pause closes it.
+    """
+
+    __slots__ = (
+        "id", "key", "title", "score", "start", "end",
+        "duration", "foreground", "weighted_productivity", "keystrokes", "clicks",
+        "rule_version", "domain", "app_id", "category_id", "title_id",
+    )
+
+    def __init__(self, session_id, key, title, score, start, rule_version=None, domain=None, app_id=None, category_id=None):
+        self.id = session_id
+        self.key = key
+        self.title = title
+        self.score = score
+        self.start = start
+        self.end = start
+        self.duration = 0.0
+        self.foreground = 0.0
+        self.weighted_productivity = 0.0
+        self.keystrokes = 0
+        self.clicks = 0
+        self.rule_version = rule_version
+        self.domain = domain
+        # Dictionary ids of the app, category and (latest) title strings
+        self.app_id = app_id
+        self.category_id = category_id
+        self.title_id = None
+
+    def continues(self, key, start, rule_version=None, domain=None):
+        """True if an interval of `key` starting at `start` extends this session"""
+        return (
+            key == self.key and
+            rule_version == self.rule_version and
+            domain == self.domain and
+            abs((start - self.end).total_seconds()) <= config.SESSION_MAX_GAP
+        )
+
+    def add(self, title, start, duration, foreground_seconds, productivity, keystrokes=0, clicks=0, title_id=None):
+        """Fold one interval into the session"""
+        self.title = title
+        self.title_id = title_id
+        self.end = start + timedelta(seconds=duration)
+        self.duration += duration
+        self.foreground += foreground_seconds
+        self.weighted_productivity += productivity * duration
+        self.keystrokes += keystrokes
+        self.clicks += clicks
+
+    @property
+    def foreground_ratio(self):
+        return self.foreground / self.duration if self.duration else 0.0
+
+    @property
+    def productivity(self):
+        """Duration-weighted mean of the intervals' productivity"""
+        return self.weighted_productivity / self.duration if self.duration else 0.0
+
+    @property
+    def is_focus(self):
+        """PRIMARY_WORK for at least 10 minutes at 80% or more foreground"""
+        return (
+            self.key[1] == "PRIMARY_WORK" and
+            self.duration >= 600 and
+            self.foreground_ratio >= 0.8
+        )
+
+    def insert_params(self):
+        """Parameters for STATEMENTS["session"]"""
+        return (
+            self.id,
+            self.start.isoformat(),
+            self.end.isoformat(),
+            self.app_id,
+            self.title_id,
+            self.category_id,
+            self.duration,
+            self.foreground,
+            self.keystrokes,
+            self.clicks,
+            1 if self.is_focus else 0,
+            self.productivity,
+            self.rule_version,
+            self.domain,
+        )
+
+    def update_params(self):
+        """Parameters for STATEMENTS["session_update"]"""
+        return (
+            self.end.isoformat(),
+            self.title_id,
+            self.duration,
+            self.foreground,
+            self.keystrokes,
+            self.clicks,
+            1 if self.is_focus else 0,
+            self.productivity,
+            self.id,
+        )
@@ -0,0 +1,604 @@
+"""
+SQLite persistence for the Activity Watcher
+Single long-lived writer connection in WAL mode, fed by a write-behind thread
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from metrics import Histogram
+
+SCHEMA = [
+    # Dictionary tables: each distinct string is stored once and referenced by id
+    """
+        CREATE TABLE IF NOT EXISTS apps (
+            id INTEGER PRIMARY KEY,
+            process_name TEXT NOT NULL,
+            display_name TEXT,
+            UNIQUE (process_name, display_name)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS titles (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL UNIQUE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY,
+            category TEXT NOT NULL,
+            subcategory TEXT,
+            UNIQUE (category, subcategory)
+        )
+    """,
+
+    # Session facts - the heart of tracking, read through the sessions view
+    """
+        CREATE TABLE IF NOT EXISTS session_facts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            title_id INTEGER REFERENCES titles(id),
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            duration_seconds REAL NOT NULL,
+            foreground_seconds REAL NOT NULL,
+            keystroke_count INTEGER DEFAULT 0,
+            mouse_click_count INTEGER DEFAULT 0,
+            is_focus_session BOOLEAN DEFAULT 0,
+            productivity_score REAL DEFAULT 0,
+            rule_version TEXT,
+            domain TEXT
+        )
+    """,
+
+    # Idle periods
+    """
+        CREATE TABLE IF NOT EXISTS idle_periods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            duration_seconds REAL,
+            reason TEXT
+        )
+    """,
+
+    # System events
+    """
+        CREATE TABLE IF NOT EXISTS system_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            details TEXT
+        )
+    """,
+
+    # Create indexes for performance
+    "CREATE INDEX IF NOT EXISTS idx_facts_start ON session_facts(start_time)",
+    "CREATE INDEX IF NOT EXISTS idx_facts_category ON session_facts(category_id)",
+    "CREATE INDEX IF NOT EXISTS idx_facts_domain ON session_facts(domain)",
+    "CREATE INDEX IF NOT EXISTS idx_idle_start ON idle_periods(start_time)",
+]
+
+# The original column layout, so DataLoader and ad-hoc queries keep working
+VIEWS = [
+    """
+        CREATE VIEW IF NOT EXISTS sessions AS
+        SELECT
+            s.id,
+            s.start_time,
+            s.end_time,
+            a.process_name,
+            a.display_name AS process_display_name,
+            t.title AS window_title,
+            c.category,
+            c.subcategory,
+            s.duration_seconds,
+            s.foreground_seconds,
+            s.keystroke_count,
+            s.mouse_click_count,
+            s.is_focus_session,
+            s.productivity_score,
+            s.rule_version,
+            s.domain
+        FROM session_facts s
+        LEFT JOIN apps a ON a.id = s.app_id
+        LEFT JOIN titles t ON t.id = s.title_id
+        LEFT JOIN categories c ON c.id = s.category_id
+    """,
+]
+
+# Pre-aggregated totals per hour (and day) x category x app, upserted with
+# every session write so the dashboard does not scan raw sessions
+ROLLUPS = [
+    """
+        CREATE TABLE IF NOT EXISTS hourly_rollups (
+            hour TEXT NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            duration_seconds REAL NOT NULL DEFAULT 0,
+            foreground_seconds REAL NOT NULL DEFAULT 0,
+            productivity_weighted REAL NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0,
+            category_switches INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, category_id, app_id)
+        ) WITHOUT ROWID
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            day TEXT NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            app_id INTEGER NOT NULL REFERENCES apps(id),
+            duration_seconds REAL NOT NULL DEFAULT 0,
+            foreground_seconds REAL NOT NULL DEFAULT 0,
+            productivity_weighted REAL NOT NULL DEFAULT 0,
+            session_count INTEGER NOT NULL DEFAULT 0,
+            category_switches INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category_id, app_id)
+        ) WITHOUT ROWID
+    """,
+    # Deep work sessions are still read per session; keep them off a full range scan
+    "CREATE INDEX IF NOT EXISTS idx_facts_focus ON session_facts(start_time) WHERE is_focus_session = 1",
+]
+
+# Retention: idle periods past RETENTION_SESSION_DAYS are folded into per-day
+# totals, and system events get an index for their TTL
+RETENTION = [
+    """
+        CREATE TABLE IF NOT EXISTS idle_rollups (
+            day TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            duration_seconds REAL NOT NULL DEFAULT 0,
+            period_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, reason)
+        ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_events_timestamp ON system_events(timestamp)",
+]
+
+ROLLUP_UPSERT = """
+    INSERT INTO {table}
+    ({bucket}, category_id, app_id, duration_seconds, foreground_seconds,
+     productivity_weighted, session_count, category_switches)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT ({bucket}, category_id, app_id) DO UPDATE SET
+        duration_seconds = duration_seconds + excluded.duration_seconds,
+        foreground_seconds = foreground_seconds + excluded.foreground_seconds,
+        productivity_weighted = productivity_weighted + excluded.productivity_weighted,
+        session_count = session_count + excluded.session_count,
+        category_switches = category_switches + excluded.category_switches
+"""
+
+# Statements used by the write-behind thread, keyed by record kind
+STATEMENTS = {
+    # id is assigned by the watcher so later intervals can extend the row
+    "session": """
+        INSERT INTO session_facts
+        (id, start_time, end_time, app_id, title_id, category_id,
+         duration_seconds, foreground_seconds, keystroke_count,
+         mouse_click_count, is_focus_session, productivity_score,
+         rule_version, domain)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    "session_update": """
+        UPDATE session_facts
+        SET end_time = ?, title_id = ?, duration_seconds = ?,
+            foreground_seconds = ?, keystroke_count = ?, mouse_click_count = ?,
+            is_focus_session = ?, productivity_score = ?
+        WHERE id = ?
+    """,
+    # Dictionary rows with known ids (bulk loads); the watcher adds them through Dimension.resolve
+    "apps": "INSERT INTO apps (id, process_name, display_name) VALUES (?, ?, ?)",
+    "titles": "INSERT INTO titles (id, title) VALUES (?, ?)",
+    "categories": "INSERT INTO categories (id, category, subcategory) VALUES (?, ?, ?)",
+    # Interval totals added to the rollups, submitted with the session write
+    "hourly_rollup": ROLLUP_UPSERT.format(table="hourly_rollups", bucket="hour"),
+    "daily_rollup": ROLLUP_UPSERT.format(table="daily_rollups", bucket="day"),
+    # Retention batches: each deletes at most `limit` of the oldest rows
+    "retention_sessions": """
+        DELETE FROM session_facts WHERE id IN (
+            SELECT id FROM session_facts WHERE start_time < ? ORDER BY start_time, id LIMIT ?
+        )
+    """,
+    "retention_events": """
+        DELETE FROM system_events WHERE id IN (
+            SELECT id FROM system_events WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?
+        )
+    """,
+    # Up to the hour of the limit-th oldest row (hourly rollups have no rowid)
+    "retention_hourly": """
+        DELETE FROM hourly_rollups
+        WHERE hour < ? AND hour <= COALESCE(
+            (SELECT hour FROM hourly_rollups WHERE hour < ? ORDER BY hour LIMIT 1 OFFSET ?), ?
+        )
+    """,
+    # Submitted together with retention_idle, which then deletes the same rows
+    "retention_idle_fold": """
+        INSERT INTO idle_rollups (day, reason, duration_seconds, period_count)
+        SELECT substr(start_time, 1, 10), COALESCE(reason, 'unknown'),
+               SUM(COALESCE(duration_seconds, 0)), COUNT(*)
+        FROM idle_periods WHERE id IN (
+            SELECT id FROM idle_periods WHERE start_time < ? ORDER BY start_time, id LIMIT ?
+        )
+        GROUP BY 1, 2
+        ON CONFLICT (day, reason) DO UPDATE SET
+            duration_seconds = duration_seconds + excluded.duration_seconds,
+            period_count = period_count + excluded.period_count
+    """,
+    "retention_idle": """
+        DELETE FROM idle_periods WHERE id IN (
+            SELECT id FROM idle_periods WHERE start_time < ? ORDER BY start_time, id LIMIT ?
+        )
+    """,
+    "idle_period": """
+        INSERT INTO idle_periods
+        (start_time, end_time, duration_seconds, reason)
+        VALUES (?, ?, ?, ?)
+    """,
+    "system_event": """
+        INSERT INTO system_events (event_type, timestamp, details)
+        VALUES (?, ?, ?)
+    """,
+}
+
+
+def connect(db_path):
+    """Open a connection with the watcher's pragma profile applied"""
+    conn = sqlite3.connect(
+        db_path,
+        timeout=config.DB_BUSY_TIMEOUT / 1000.0,
+        check_same_thread=False,
+    )
+    c = conn.cursor()
+
+    # Only takes effect on a new file; retention converts older ones while idle
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # WAL lets the dashboard read while the watcher writes, and turns each
+    # commit into a sequential append instead of a rollback-journal fsync
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+    c.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT)}")
+    c.execute(f"PRAGMA journal_size_limit={int(config.DB_JOURNAL_SIZE_LIMIT)}")
+    c.execute(f"PRAGMA wal_autocheckpoint={int(config.DB_WAL_AUTOCHECKPOINT)}")
+    c.execute("PRAGMA temp_store=MEMORY")
+
+    c.close()
+    return conn
+
+
+class WriterConnection:
+    """
+    Long-lived writer connection shared by every write path of the watcher.
+    Hotkey, tray and monitor threads all write, so access is serialized
+    through a lock instead of opening a connection per write.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = connect(db_path)
+
+    def execute(self, sql, params=()):
+        """Run a single statement in its own transaction"""
+        with self.lock:
+            with self.conn:
+                return self.conn.execute(sql, params)
+
+    def executescript(self, statements):
+        """Run several statements in one transaction"""
+        with self.lock:
+            with self.conn:
+                for sql in statements:
+                    self.conn.execute(sql)
+
+    def next_id(self, table):
+        """First unused row id of a table"""
+        with self.lock:
+            return self.conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+    def checkpoint(self):
+        """Fold the WAL back into the main database file"""
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Checkpoint and close the connection"""
+        with self.lock:
+            if self.conn is None:
+                return
+            try:
+                self.checkpoint()
+            finally:
+                self.conn.close()
+                self.conn = None
+
+
+class DimensionRef:
+    """A dictionary value that was not in the map; the writer resolves its id"""
+
+    __slots__ = ("dimension", "values", "id")
+
+    def __init__(self, dimension, values):
+        self.dimension = dimension
+        self.values = values
+        self.id = None
+
+
+class Dimension:
+    """
+    In-memory interning map for one dictionary table (apps, titles, categories).
+
+    The sampling thread only reads the map: a value that is not in it is
+    returned as a DimensionRef, which the write-behind thread resolves
+    (finding or inserting the row) in the transaction that writes the
+    record referring to it. Ids enter the map only after that transaction
+    commits, so a failed write never leaves an id without its row.
+    cache_size bounds the map (LRU) for tables that keep growing.
+    """
+
+    def __init__(self, table, columns, cache_size=None):
+        self.table = table
+        self.select = f"SELECT id FROM {table} WHERE " + " AND ".join(f"{c} IS ?" for c in columns)
+        self.insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+
+    def id(self, *values):
+        """Integer id of a value tuple, or a DimensionRef if it is not in the map yet"""
+        with self.lock:
+            value_id = self.cache.get(values)
+            if value_id is not None:
+                self.hits += 1
+                if self.cache_size:
+                    self.cache.move_to_end(values)
+                return value_id
+        self.misses += 1
+        return DimensionRef(self, values)
+
+    def resolve(self, conn, values):
+        """Id of a value tuple on the writer thread, adding its row in the open transaction"""
+        with self.lock:
+            value_id = self.cache.get(values)
+        if value_id is not None:
+            return value_id
+        row = conn.execute(self.select, values).fetchone()
+        if row is not None:
+            return row[0]
+        self.created += 1
+        return conn.execute(self.insert, values).lastrowid
+
+    def publish(self, values, value_id):
+        """Add an id to the map once its transaction has committed"""
+        with self.lock:
+            self.cache[values] = value_id
+            if self.cache_size and len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self.cache), "hits": self.hits, "misses": self.misses, "created": self.created}
+
+
+class WriteBehindWriter:
+    """
+    Background thread that owns all database writes.
+
+    The sampling, hotkey and tray threads only enqueue (kind, params)
+    records; the writer drains the queue and persists everything that is
+    waiting in one transaction, with one executemany per run of
+    consecutive records of the same kind (an update never overtakes the
+    insert it refers to). Records queued together with submit_all() are
+    never split across transactions. If a batch fails, each submission is
+    retried in its own transaction, so only the one that fails is lost.
+    submit_task() queues maintenance work (retention) that runs on this
+    thread in queue order, so it never holds the lock for the sampler.
+    The queue is bounded: when it is full new records are dropped and
+    counted instead of stalling the sampler. Session updates that match no
+    row (their insert was dropped or failed) are counted as orphaned, and
+    submissions after close() are rejected rather than queued unwritten.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db):
+        self.db = db
+        self.queue = queue.Queue(maxsize=config.WRITE_QUEUE_SIZE)
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.orphaned = 0
+        self.rejected = 0
+        self.batches = 0
+        self.closed = False
+        # Orders submissions against close(): nothing is queued behind the stop marker
+        self.submit_lock = threading.Lock()
+        self.max_depth = 0
+        self.max_wait = 0.0
+        self.write_seconds = Histogram()
+
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, params):
+        """Queue a record for writing; never blocks the caller"""
+        return self.submit_all(((kind, params),))
+
+    def submit_all(self, records):
+        """Queue (kind, params) records that must commit in the same transaction"""
+        with self.submit_lock:
+            if self.closed:
+                self.rejected += len(records)
+                logging.warning(f"Writer closed, rejected {records[0][0]} record")
+                return False
+            try:
+                self.queue.put_nowait((records, time.monotonic()))
+            except queue.Full:
+                self.dropped += len(records)
+                logging.warning(f"Write queue full ({config.WRITE_QUEUE_SIZE}), dropped {records[0][0]} record")
+                return False
+
+        self.enqueued += len(records)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def submit_task(self, task):
+        """Queue task(conn) to run on the writer thread, in order, between transactions; never blocks the caller"""
+        with self.submit_lock:
+            if self.closed:
+                return False
+            try:
+                self.queue.put_nowait((task, time.monotonic()))
+            except queue.Full:
+                return False
+        return True
+
+    def _run(self):
+        """Drain the queue in grouped transactions until stopped"""
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch = []
+            while True:
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if len(batch) >= config.WRITE_BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        """Persist one batch: submissions in one transaction, queued tasks in order between them"""
+        now = time.monotonic()
+        for _, queued_at in batch:
+            wait = now - queued_at
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+        groups = []
+        for item, _ in batch:
+            if callable(item):
+                # Everything queued before a task is committed before it runs
+                self._write_groups(groups)
+                groups = []
+                self._run_task(item)
+            else:
+                groups.append(item)
+        self._write_groups(groups)
+
+    def _run_task(self, task):
+        """Run a queued task with the connection; it manages its own transactions"""
+        try:
+            t0 = time.perf_counter()
+            with self.db.lock:
+                task(self.db.conn)
+            self.write_seconds.observe(time.perf_counter() - t0)
+        except Exception as e:
+            logging.error(f"Writer task failed: {e}")
+
+    def _write_groups(self, groups):
+        """Write submissions in one transaction; if it fails, retry each on its own"""
+        if not groups:
+            return
+        try:
+            self._commit(groups)
+        except Exception as e:
+            if len(groups) == 1:
+                self.failed += len(groups[0])
+                logging.error(f"Failed to write {groups[0][0][0]} record: {e}")
+                return
+            # One bad record must not take the rest of the batch with it
+            logging.warning(f"Failed to write a batch of {len(groups)} submissions ({e}), retrying one at a time")
+            for records in groups:
+                try:
+                    self._commit([records])
+                except Exception as e:
+                    self.failed += len(records)
+                    logging.error(f"Failed to write {records[0][0]} record: {e}")
+
+    def _commit(self, groups):
+        """Write submissions in one transaction, resolving dictionary references inside it"""
+        runs = []
+        count = 0
+        orphaned = 0
+        refs = {}
+        t0 = time.perf_counter()
+        with self.db.lock:
+            with self.db.conn:
+                for records in groups:
+                    for kind, params in records:
+                        if any(type(v) is DimensionRef for v in params):
+                            params = tuple(self._resolve(v, refs) if type(v) is DimensionRef else v for v in params)
+                        if runs and runs[-1][0] == kind:
+                            runs[-1][1].append(params)
+                        else:
+                            runs.append((kind, [params]))
+                    count += len(records)
+                for kind, rows in runs:
+                    cursor = self.db.conn.executemany(STATEMENTS[kind], rows)
+                    if kind == "session_update" and cursor.rowcount < len(rows):
+                        orphaned += len(rows) - cursor.rowcount
+        self.write_seconds.observe(time.perf_counter() - t0)
+        if orphaned:
+            self.orphaned += orphaned
+            logging.warning(f"{orphaned} session update(s) matched no row; their session insert was not written")
+
+        # Committed: later records and the sampler's map may use these ids
+        for ref, value_id in refs.items():
+            ref.id = value_id
+            ref.dimension.publish(ref.values, value_id)
+        self.written += count
+        self.batches += 1
+
+    def _resolve(self, ref, refs):
+        """Id of a dictionary reference within the open transaction"""
+        if ref.id is not None:
+            return ref.id
+        value_id = refs.get(ref)
+        if value_id is None:
+            value_id = refs[ref] = ref.dimension.resolve(self.db.conn, ref.values)
+        return value_id
+
+    def stats(self):
+        """Backpressure metrics for logging and diagnostics"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "max_wait_seconds": round(self.max_wait, 3),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "orphaned": self.orphaned,
+            "rejected": self.rejected,
+            "batches": self.batches,
+        }
+
+    def close(self, timeout=None):
+        """Write everything still queued, then stop the thread; later submissions are rejected"""
+        with self.submit_lock:
+            if self.closed:
+                return not self.thread.is_alive()
+            self.closed = True
+            if not self.thread.is_alive():
+                return True
+            self.queue.put(self._STOP)
+        self.thread.join(timeout if timeout is not None else config.WRITE_DRAIN_TIMEOUT)
+        return not self.thread.is_alive()
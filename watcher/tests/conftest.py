@@ -0,0 +1,12 @@
+"""
+Shared setup for the watcher tests
+Run from the watcher directory: python -m pytest tests
+"""
+import os
+import tempfile
+
+# Before config is imported: keep logs and data out of the home directory,
+# no archive or metrics endpoint unless a test turns them on
+os.environ.setdefault("WATCHER_BASE_DIR", tempfile.mkdtemp(prefix="watcher-tests-"))
+os.environ.setdefault("ARCHIVE_DIR", "")
+os.environ.setdefault("METRICS_ENABLED", "false")
@@ -0,0 +1,108 @@
+"""
+Crash-safe sample journal
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+import config
+from clock import VirtualClock
+from idle import FakeIdleProvider
+from inputs import InputSource
+from journal import SampleJournal, journal_path
+from replay import WORKLOADS, ReplayProvider
+
+
+SAMPLES = [
+    ("Code.exe", f"module{i}.py - Visual Studio Code", "PRIMARY_WORK", "VSCode", 100.0) for i in range(7)
+] + [(None, None, "IDLE", None, 0)]
+
+
+def fill(journal, start, count):
+    """Append `count` samples from time `start`; returns what read() should give back"""
+    written = []
+    for i in range(count):
+        sample = SAMPLES[(start + i) % len(SAMPLES)]
+        journal.append(sample, 1e9 + start + i, 1.0)
+        written.append((sample, 1e9 + start + i, 1.0))
+    return written
+
+
+def test_only_uncommitted_intervals_are_recovered(tmp_path):
+    path = str(tmp_path / "a.db-samples")
+    journal = SampleJournal(path)
+    fill(journal, 0, 60)
+    journal.commit(journal.flush())
+    expected = fill(journal, 60, 60)
+    journal.flush()  # handed to the writer, never committed
+    expected += fill(journal, 120, 30)
+
+    recovered = SampleJournal(path)
+    assert recovered.read() == expected
+    journal.close()
+    recovered.close()
+
+
+def test_reopened_journal_keeps_its_sequence(tmp_path):
+    path = str(tmp_path / "a.db-samples")
+    journal = SampleJournal(path)
+    fill(journal, 0, 10)
+    first = journal.flush()
+    journal.close()
+
+    journal = SampleJournal(path)
+    second = journal.flush()
+    assert second == first + 1
+    journal.commit(second)
+    journal.close()
+    assert SampleJournal(path).read() == []
+
+
+def test_file_shrinks_once_the_writer_catches_up(tmp_path):
+    journal = SampleJournal(str(tmp_path / "a.db-samples"), size=4096)
+    for interval in range(10):
+        fill(journal, interval * 60, 60)
+        seq = journal.flush()
+    assert journal.size > 4096
+
+    journal.commit(seq)
+    fill(journal, 600, 1)
+    assert journal.size == 4096
+    assert journal.stats()["uncommitted_intervals"] == 0
+    journal.close()
+
+
+def test_watcher_recovers_a_crashed_interval_once(tmp_path):
+    from watcher import ActivityWatcher
+
+    db_path = str(tmp_path / "activity.db")
+    trace = WORKLOADS["deep_work"](1)
+
+    def start(clock):
+        return ActivityWatcher(
+            db_path=db_path, provider=ReplayProvider(trace, clock), clock=clock, interactive=False,
+            input_source=InputSource(), idle_provider=FakeIdleProvider(clock, []),
+        )
+
+    clock = VirtualClock(datetime.now().replace(hour=9, minute=0, second=0, microsecond=0))
+    crashed = start(clock)
+    while clock.monotonic() < 3 * config.FLUSH_INTERVAL + 30:
+        crashed.monitor_step()
+    buffered = crashed.buffer.total
+    assert buffered > 0
+    # Everything handed to the writer commits, then the process dies mid-interval
+    crashed.writer.close()
+    crashed.journal.map.close()
+    crashed.journal.map = None
+
+    conn = sqlite3.connect(db_path)
+    saved = conn.execute("SELECT SUM(duration_seconds) FROM sessions").fetchone()[0]
+    conn.close()
+
+    restarted = start(VirtualClock(datetime.now()))
+    restarted.shutdown()
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT SUM(duration_seconds) FROM sessions").fetchone()[0]
+    conn.close()
+    assert total == saved + buffered
+    assert os.path.getsize(journal_path(db_path)) == config.JOURNAL_INITIAL_SIZE
@@ -0,0 +1,76 @@
+"""
+Rate-limited warnings and the log flush on quit
+"""
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import config
+from logs import RateLimitFilter
+
+WATCHER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run the watcher briefly, queue log records, then quit like the tray Exit item (os._exit)
+QUIT_CHILD = """
+import logging
+import sys
+from datetime import datetime
+
+from clock import VirtualClock
+from idle import FakeIdleProvider
+from inputs import InputSource
+from replay import WORKLOADS, ReplayProvider, away_periods
+from watcher import ActivityWatcher
+
+logging.getLogger().setLevel(logging.INFO)
+trace = WORKLOADS["high_switching"](0.05)
+clock = VirtualClock(datetime.now().replace(hour=9, minute=0, second=0, microsecond=0))
+watcher = ActivityWatcher(
+    db_path=sys.argv[1], provider=ReplayProvider(trace, clock), clock=clock, interactive=False,
+    input_source=InputSource(), idle_provider=FakeIdleProvider(clock, away_periods(trace)),
+)
+while clock.monotonic() < 0.05 * 3600:
+    watcher.monitor_step()
+for i in range(int(sys.argv[2])):
+    logging.info(f"Queued before quit {i}")
+watcher.quit_app()
+"""
+
+
+def record(level, lineno, created):
+    record = logging.LogRecord("root", level, __file__, lineno, "Skipping session flush", None, None)
+    record.created = created
+    return record
+
+
+def test_repeated_warnings_are_limited_per_call_site():
+    limiter = RateLimitFilter(config.LOG_REPEAT_INTERVAL)
+    start = time.time()
+    logged = [limiter.filter(record(logging.WARNING, 1, start + i)) for i in range(10)]
+    assert logged == [True] + [False] * 9
+    assert limiter.filter(record(logging.WARNING, 2, start))
+
+    later = record(logging.WARNING, 1, start + config.LOG_REPEAT_INTERVAL + 1)
+    assert limiter.filter(later)
+    assert later.getMessage().endswith("(9 similar messages suppressed)")
+
+
+def test_errors_are_never_limited():
+    limiter = RateLimitFilter(config.LOG_REPEAT_INTERVAL)
+    start = time.time()
+    assert all(limiter.filter(record(logging.ERROR, 1, start)) for _ in range(10))
+    assert limiter.suppressed == 0
+
+
+def test_quit_writes_out_queued_records(tmp_path):
+    env = dict(os.environ, WATCHER_BASE_DIR=str(tmp_path), ARCHIVE_DIR="", METRICS_ENABLED="false")
+    subprocess.run(
+        [sys.executable, "-c", QUIT_CHILD, str(tmp_path / "quit.db"), "200"],
+        cwd=WATCHER_DIR, env=env, capture_output=True, check=True, timeout=120,
+    )
+    with open(tmp_path / "logs" / "watcher.log", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert sum(1 for line in lines if "Queued before quit" in line) == 200
+    assert lines[-1].endswith("Shutdown complete")
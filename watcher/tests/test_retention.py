@@ -0,0 +1,170 @@
+"""
+Retention batches, vacuum and the Parquet archive
+"""
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import config
+import migrations
+import storage
+from bench import add_idle_and_events, build_legacy_year
+from clock import SystemClock
+from retention import RetentionPolicy
+
+
+@pytest.fixture
+def year_db(tmp_path, monkeypatch):
+    """120 days of sessions, idle periods and events; retention keeps 30 days of raw rows"""
+    monkeypatch.setattr(config, "RETENTION_SESSION_DAYS", 30)
+    monkeypatch.setattr(config, "RETENTION_HOURLY_DAYS", 60)
+    monkeypatch.setattr(config, "RETENTION_EVENT_DAYS", 10)
+    monkeypatch.setattr(config, "RETENTION_BATCH_ROWS", 200)
+    path = str(tmp_path / "year.db")
+    build_legacy_year(path, 20, days=120)
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.close()
+    add_idle_and_events(path, 120, 5)
+    return path
+
+
+def retention_totals(conn):
+    """Totals that retention must not change"""
+    return {
+        "daily_seconds": conn.execute("SELECT ROUND(SUM(duration_seconds), 3) FROM daily_rollups").fetchone()[0],
+        "daily_sessions": conn.execute("SELECT SUM(session_count) FROM daily_rollups").fetchone()[0],
+        "idle_seconds": conn.execute("""
+            SELECT ROUND(SUM(s), 3) FROM (
+                SELECT SUM(duration_seconds) AS s FROM idle_periods
+                UNION ALL SELECT SUM(duration_seconds) FROM idle_rollups
+            )
+        """).fetchone()[0],
+        "idle_count": conn.execute(
+            "SELECT (SELECT COUNT(*) FROM idle_periods) + (SELECT COALESCE(SUM(period_count), 0) FROM idle_rollups)"
+        ).fetchone()[0],
+    }
+
+
+def expire_all(policy, conn):
+    batches = 0
+    while policy.expire_batch(conn):
+        batches += 1
+    return batches
+
+
+def oldest(conn, table, column="start_time"):
+    return conn.execute(f"SELECT MIN({column}) FROM {table}").fetchone()[0]
+
+
+def test_expired_rows_keep_their_totals_in_the_rollups(year_db):
+    db = storage.WriterConnection(year_db)
+    try:
+        before = retention_totals(db.conn)
+        policy = RetentionPolicy(db, None, SystemClock())
+        assert expire_all(policy, db.conn) > len(policy.TARGETS)
+
+        cutoff = (datetime.now() - timedelta(days=31)).isoformat()
+        assert oldest(db.conn, "session_facts") >= cutoff
+        assert oldest(db.conn, "idle_periods") >= cutoff
+        assert oldest(db.conn, "system_events", "timestamp") >= (datetime.now() - timedelta(days=11)).isoformat()
+        assert retention_totals(db.conn) == before
+    finally:
+        db.close()
+
+
+def test_idle_vacuum_returns_free_pages(year_db, monkeypatch):
+    monkeypatch.setattr(config, "RETENTION_VACUUM_PAGES", 16)
+    db = storage.WriterConnection(year_db)
+    try:
+        policy = RetentionPolicy(db, None, SystemClock())
+        expire_all(policy, db.conn)
+        assert db.conn.execute("PRAGMA freelist_count").fetchone()[0] >= config.RETENTION_VACUUM_PAGES
+        while policy.vacuum_step(db.conn):
+            pass
+        assert policy.incremental and policy.vacuum_steps > 1
+        assert db.conn.execute("PRAGMA freelist_count").fetchone()[0] < config.RETENTION_VACUUM_PAGES
+    finally:
+        db.close()
+
+
+def test_rows_of_unarchived_months_are_kept(year_db):
+    class Archive:
+        """No month exported yet"""
+        def horizon(self, now):
+            return archive.month_start(now - timedelta(days=365)).isoformat()
+
+        def start(self, now):
+            return False
+
+    db = storage.WriterConnection(year_db)
+    try:
+        sessions = db.conn.execute("SELECT COUNT(*) FROM session_facts").fetchone()[0]
+        policy = RetentionPolicy(db, None, SystemClock(), Archive())
+        expire_all(policy, db.conn)
+        assert db.conn.execute("SELECT COUNT(*) FROM session_facts").fetchone()[0] == sessions
+        assert policy.stats()["batches_by_table"].get("system_events")
+    finally:
+        db.close()
+
+
+def test_tick_runs_the_step_on_the_writer_thread(year_db):
+    db = storage.WriterConnection(year_db)
+    writer = storage.WriteBehindWriter(db)
+    policy = RetentionPolicy(db, writer, SystemClock())
+    threads = []
+    expire_batch = policy.expire_batch
+
+    def traced(conn):
+        threads.append(threading.current_thread().name)
+        return expire_batch(conn)
+
+    policy.expire_batch = traced
+    policy.tick(0.0)
+    policy.tick(0.0)  # still pending: not queued twice
+    assert writer.close()
+    db.close()
+    assert threads == [writer.thread.name]
+    assert not policy.pending and policy.next_run == config.RETENTION_BATCH_PAUSE
+
+
+def test_archive_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    pytest.importorskip("pandas")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "dashboard"))
+    from utils.data_loader import DataLoader
+
+    path = str(tmp_path / "year.db")
+    build_legacy_year(path, 20, days=120)
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    conn.close()
+    archive_dir = str(tmp_path / "archive")
+    assert archive.MonthlyArchive(path, archive_dir).run(datetime.now())
+
+    # Every exported month reads back with the totals the rollups hold for it
+    loader = DataLoader(path, archive_dir)
+    months = loader.archive_months()
+    assert len(months) >= 3
+    conn = sqlite3.connect(path)
+    for month in months:
+        archived = loader.load_archive("sessions", ["start_time", "duration_seconds"], month, [month])
+        rolled = conn.execute(
+            "SELECT COALESCE(SUM(duration_seconds), 0) FROM daily_rollups WHERE day >= ? AND day < ?",
+            (month.date().isoformat(), archive.next_month(month).date().isoformat()),
+        ).fetchone()[0]
+        assert archived["duration_seconds"].sum() == pytest.approx(rolled)
+
+    # Nothing was deleted, so a month whose partition is gone is read from SQLite instead
+    os.remove(archive.partition_path(archive_dir, "sessions", months[len(months) // 2]))
+    expected = conn.execute("SELECT SUM(duration_seconds) FROM sessions").fetchone()[0]
+    conn.close()
+    sessions = loader.load_sessions((datetime.now() - months[0]).days + 31)
+    assert sessions["duration_seconds"].sum() == pytest.approx(expected)
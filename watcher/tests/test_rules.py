@@ -0,0 +1,76 @@
+"""
+Domain matcher, title parser, rule engine and rules file reloads
+"""
+import json
+import os
+import random
+
+import pytest
+
+import config
+from bench import (
+    labelled_browser_titles, match_loop, match_rules_loop, synthetic_domains, synthetic_rules, synthetic_titles,
+)
+from categorizer import Categorizer
+from matcher import DomainMatcher
+from rules import RuleSet, RulesFile, default_rules
+from titles import TitleParser
+
+
+@pytest.mark.parametrize("count", [10, len(config.WORK_DOMAINS) + len(config.NON_WORK_DOMAINS), 100, 1000])
+def test_domain_matchers_agree_with_the_substring_scan(count):
+    work, nonwork = synthetic_domains(count)
+    titles = synthetic_titles(work, nonwork, 2000)
+    classes = [("BROWSER_WORK", work), ("BROWSER_NONWORK", nonwork)]
+    expected = [match_loop(work, nonwork, title) for title in titles]
+    for matcher in (DomainMatcher(classes, loop_max=0), DomainMatcher(classes)):
+        assert [matcher.match(title) for title in titles] == expected
+
+
+def test_short_domain_lists_keep_the_substring_loop():
+    assert DomainMatcher([("BROWSER_WORK", ["github.com"])]).pattern is None
+    work, nonwork = synthetic_domains(1000)
+    assert DomainMatcher([("BROWSER_WORK", work), ("BROWSER_NONWORK", nonwork)]).pattern is not None
+
+
+def test_browser_pages_are_classified_by_hostname_not_title_text():
+    titles = labelled_browser_titles(2000)
+    rules = default_rules()
+    parser = TitleParser(rules.browser_apps, rules.site_domains)
+    misclassified = [
+        title for process, title, label in titles
+        if rules.classify_domain(parser.domain(process, title) or "") != label
+    ]
+    assert misclassified == []
+
+
+def test_rule_engine_matches_evaluating_every_rule_in_order():
+    rules, processes, words = synthetic_rules(2000)
+    engine = RuleSet({}, {}, {}, [], [], rules=rules).engine
+    rng = random.Random(2)
+    parser = TitleParser()
+    for i in range(1000):
+        process = rng.choice(processes)
+        page = f"Issue #{rng.randint(1, 9999)} - Some page title with a few words"
+        title = f"{page} - {rng.choice(words)}" if i % 2 == 0 else page
+        minute, domain = rng.randrange(1440), parser.domain(process, title)
+        assert engine.match(process, title, minute, domain) is match_rules_loop(engine.rules, process, title, minute, domain)
+
+
+def test_edited_rules_file_is_swapped_in(tmp_path):
+    path = str(tmp_path / "rules.json")
+    rules = {"apps": {"primary": dict(config.PRIMARY_WORK_APPS)}, "domains": {"work": ["github.com"]}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rules, f)
+    categorizer = Categorizer(rules_file=RulesFile(path, check_interval=config.RULES_CHECK_INTERVAL))
+    old_version = categorizer.rule_version
+    assert categorizer.categorize("tool.exe", "tool.exe", "Tool")[0] != "PRIMARY_WORK"
+
+    rules["apps"]["primary"]["tool.exe"] = "Tool"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rules, f)
+    os.utime(path, ns=(0, 10**18))  # distinct mtime even on coarse filesystems
+    categorizer.check_rules(1e9)
+
+    assert categorizer.rule_version != old_version
+    assert categorizer.categorize("tool.exe", "tool.exe", "Tool")[0] == "PRIMARY_WORK"
@@ -0,0 +1,144 @@
+"""
+Write-behind writer and schema migrations
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import migrations
+import storage
+from bench import build_legacy_year, seed_dimensions, synthetic_session
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = storage.WriterConnection(str(tmp_path / "writer.db"))
+    with db.lock:
+        migrations.migrate(db.conn)
+        with db.conn:
+            seed_dimensions(db.conn)
+    yield db
+    db.close()
+
+
+def session_row(session_id, minutes_ago):
+    return (session_id,) + synthetic_session(datetime.now() - timedelta(minutes=minutes_ago))[1:]
+
+
+def count(db, table):
+    with db.lock:
+        return db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_failed_submission_does_not_take_the_batch_with_it(db):
+    writer = storage.WriteBehindWriter(db)
+    for i in range(1, 6):
+        writer.submit("session", session_row(i, i))
+    writer.submit("session", session_row(3, 0))  # duplicate id
+    assert writer.close()
+
+    assert count(db, "session_facts") == 5
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"]) == (5, 1)
+
+
+def test_update_of_a_missing_session_is_counted(db):
+    writer = storage.WriteBehindWriter(db)
+    writer.submit("session", session_row(1, 1))
+    writer.submit("session_update", (datetime.now().isoformat(), None, 90, 60, 0, 0, 0, 50.0, 1))
+    writer.submit("session_update", (datetime.now().isoformat(), None, 90, 60, 0, 0, 0, 50.0, 2))
+    assert writer.close()
+    assert writer.stats()["orphaned"] == 1
+
+
+def test_submissions_after_close_are_rejected(db):
+    writer = storage.WriteBehindWriter(db)
+    assert writer.close()
+    assert not writer.submit("session", session_row(1, 1))
+    assert not writer.submit_task(lambda conn: None)
+    assert writer.stats()["rejected"] == 1
+    assert count(db, "session_facts") == 0
+
+
+def test_tasks_run_on_the_writer_after_earlier_submissions(db):
+    writer = storage.WriteBehindWriter(db)
+    seen = []
+    writer.submit("session", session_row(1, 1))
+    writer.submit_task(lambda conn: seen.append(conn.execute("SELECT COUNT(*) FROM session_facts").fetchone()[0]))
+    assert writer.close()
+    assert seen == [1]
+
+
+def test_dimension_ids_are_published_after_commit(db):
+    writer = storage.WriteBehindWriter(db)
+    apps = storage.Dimension("apps", ("process_name", "display_name"))
+    ref = apps.id("new.exe", "New")
+    assert isinstance(ref, storage.DimensionRef)
+    row = session_row(1, 1)
+    writer.submit("session", row[:3] + (ref,) + row[4:])
+    assert writer.close()
+
+    app_id = apps.id("new.exe", "New")
+    assert isinstance(app_id, int)
+    with db.lock:
+        assert db.conn.execute("SELECT app_id FROM session_facts WHERE id = 1").fetchone()[0] == app_id
+
+
+def legacy_rows(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT COUNT(*), SUM(duration_seconds) FROM sessions").fetchone()
+    conn.close()
+    return rows
+
+
+def test_chunked_migration_keeps_every_row_with_null_columns(tmp_path):
+    path = str(tmp_path / "nulls.db")
+    build_legacy_year(path, 20, days=3)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE sessions SET process_display_name = NULL, subcategory = NULL WHERE id % 2 = 0")
+    conn.close()
+    before = legacy_rows(path)
+
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, chunk_rows=7)
+    apps = conn.execute("""
+        SELECT COUNT(*) - COUNT(DISTINCT process_name || '|' || COALESCE(display_name, '')) FROM apps
+    """).fetchone()[0]
+    categories = conn.execute("""
+        SELECT COUNT(*) - COUNT(DISTINCT category || '|' || COALESCE(subcategory, '')) FROM categories
+    """).fetchone()[0]
+    conn.close()
+
+    assert legacy_rows(path) == before
+    assert (apps, categories) == (0, 0)
+
+
+def test_interrupted_migration_resumes_without_losing_rows(tmp_path):
+    path = str(tmp_path / "resumed.db")
+    build_legacy_year(path, 20, days=10)
+    before = legacy_rows(path)
+
+    chunks = []
+
+    def die(migration, rows):
+        chunks.append(rows)
+        if len(chunks) == 3:
+            raise KeyboardInterrupt
+
+    conn = sqlite3.connect(path)
+    with pytest.raises(KeyboardInterrupt):
+        migrations.migrate(conn, 25, die)
+    interrupted = migrations.schema_version(conn)
+    conn.close()
+
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn, 25)
+    version = migrations.schema_version(conn)
+    rollup_seconds = conn.execute("SELECT SUM(duration_seconds) FROM daily_rollups").fetchone()[0]
+    conn.close()
+
+    assert interrupted < version == migrations.SCHEMA_VERSION
+    assert legacy_rows(path) == before
+    assert rollup_seconds == pytest.approx(before[1])
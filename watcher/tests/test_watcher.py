@@ -0,0 +1,79 @@
+"""
+Monitoring loop end to end: idle periods, pause toggles and the metrics endpoint
+"""
+import sqlite3
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+from bench import office_day
+from clock import VirtualClock
+from idle import FakeIdleProvider
+from inputs import InputSource
+from metrics import start_server
+from replay import WORKLOADS, ReplayProvider, away_periods, run_replay
+
+
+def test_idle_periods_do_not_overlap_sessions(tmp_path):
+    trace, idle = office_day()
+    clock = VirtualClock(datetime.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=1))
+    db_path = str(tmp_path / "idle.db")
+    run_replay(trace, db_path, 24 * 3600.0, clock=clock, idle_provider=FakeIdleProvider(clock, idle + away_periods(trace)))
+
+    conn = sqlite3.connect(db_path)
+    overlap = conn.execute("""
+        SELECT SUM((julianday(MIN(s.end_time, i.end_time)) - julianday(MAX(s.start_time, i.start_time))) * 86400)
+        FROM sessions s JOIN idle_periods i ON s.start_time < i.end_time AND s.end_time > i.start_time
+    """).fetchone()[0]
+    idle_rows = conn.execute("SELECT COUNT(*) FROM idle_periods").fetchone()[0]
+    conn.close()
+    assert idle_rows >= len(idle)
+    assert round(overlap or 0.0, 3) == 0
+
+
+def test_pause_toggles_from_another_thread(tmp_path):
+    from watcher import ActivityWatcher
+
+    trace = WORKLOADS["high_switching"](1)
+    clock = VirtualClock(datetime.now().replace(hour=9, minute=0, second=0, microsecond=0))
+    watcher = ActivityWatcher(
+        db_path=str(tmp_path / "toggle.db"), provider=ReplayProvider(trace, clock), clock=clock, interactive=False,
+        input_source=InputSource(), idle_provider=FakeIdleProvider(clock, away_periods(trace)),
+    )
+    done = threading.Event()
+    toggles = []
+
+    def hotkey():
+        while not done.is_set():
+            watcher.toggle_monitoring()
+            watcher.toggle_monitoring()
+            toggles.append(2)
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=hotkey)
+    thread.start()
+    try:
+        while clock.monotonic() < 3600:
+            watcher.monitor_step()
+    finally:
+        done.set()
+        thread.join()
+    watcher.shutdown()
+
+    stats = watcher.writer.stats()
+    assert toggles and not watcher.is_paused
+    assert (stats["failed"], stats["orphaned"], stats["rejected"]) == (0, 0, 0)
+
+
+def test_mid_interval_scrape_reports_fractional_buffer_seconds(tmp_path):
+    watcher = run_replay(WORKLOADS["deep_work"](0.1), str(tmp_path / "metrics.db"), 0.1 * 3600)
+    server = start_server(watcher.metrics, "127.0.0.1", 0)
+    try:
+        watcher.buffer.add("code.exe", "bench.py", "Development", None, 1.0, weight=2.5)
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "watcher_buffer_seconds 2.5\n" in body
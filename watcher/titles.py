@@ -0,0 +1,135 @@
+"""
+Browser window title parsing for the Activity Watcher
+Strips the browser suffix and extracts the site's hostname, memoized per title
+"""
+import re
+from collections import OrderedDict
+
+import config
+
+# Suffixes browsers append to the page title, per executable (without .exe)
+BROWSER_TITLE_SUFFIXES = {
+    "chrome": ("Google Chrome", "Chrome"),
+    "chromium": ("Chromium",),
+    "firefox": ("Mozilla Firefox", "Firefox", "Firefox Developer Edition", "Firefox Nightly"),
+    "msedge": ("Microsoft\u200b Edge", "Microsoft Edge", "Edge"),
+    "brave": ("Brave",),
+    "opera": ("Opera",),
+    "vivaldi": ("Vivaldi",),
+}
+
+# Separators between page title, site name and browser name
+_SEPARATORS = re.compile(r"\s+[-–—|·/]\s+")
+_TRAILING_SEPARATOR = re.compile(r"\s*[-–—|·]\s*$")
+
+_HOST = r"(?:(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,}|localhost|\d{1,3}(?:\.\d{1,3}){3})"
+# A title that is a URL: scheme optional, but a bare host needs a port or path after it
+_URL_TITLE = re.compile(rf"(?:[a-z][a-z0-9+.-]*://)({_HOST})|({_HOST})(?::\d+|/)")
+# A title segment that is nothing but a hostname
+_HOST_SEGMENT = re.compile(rf"(?:[a-z][a-z0-9+.-]*://)?({_HOST})(?::\d+)?/?")
+
+
+def site_key(name):
+    """Normalize a site name for lookup: "Stack Overflow" -> "stackoverflow" """
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+class TitleParser:
+    """
+    Extracts the hostname of the page shown in a browser window title.
+
+    Only processes known to be browsers are parsed. After stripping the
+    browser suffix the hostname is taken from, in order:
+    - the start of the title, when the title is a URL (loading pages,
+      "localhost:8501 - App")
+    - the last segment, when it is a hostname ("Page - github.com")
+    - the last segment, when it is the name of a known site ("Video - YouTube")
+    Hostnames elsewhere in the page title are ignored, so a video titled
+    "github.com is down" stays on YouTube. Results are memoized per
+    (process, title) in a bounded LRU cache.
+    """
+
+    def __init__(self, browsers=(), site_domains=(), cache_size=None):
+        self.browsers = {name.lower().removesuffix(".exe") for name in browsers} | set(BROWSER_TITLE_SUFFIXES)
+        # Name before the TLD -> domain: "youtube" -> "youtube.com", "python" -> "docs.python.org"
+        self.site_names = {}
+        for domain in site_domains:
+            labels = domain.lower().split(".")
+            if len(labels) >= 2 and not labels[-1].isdigit():
+                self.site_names.setdefault(site_key(labels[-2]), domain.lower())
+        self.cache_size = cache_size or config.TITLE_CACHE_SIZE
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def domain(self, process_lower, title):
+        """Hostname of the page in a browser title, or None"""
+        if not title or not process_lower:
+            return None
+        browser = process_lower.removesuffix(".exe")
+        if browser not in self.browsers:
+            return None
+        key = (browser, title)
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+
+        self.misses += 1
+        domain = self.parse(browser, title)
+        cache[key] = domain
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return domain
+
+    def strip_suffix(self, browser, title):
+        """Page title without the " - Browser Name" suffix"""
+        for suffix in BROWSER_TITLE_SUFFIXES.get(browser, ()):
+            if title.endswith(suffix):
+                head = title[:-len(suffix)]
+                m = _TRAILING_SEPARATOR.search(head)
+                if m:
+                    return head[:m.start()]
+                if not head.strip():
+                    return ""  # blank tab: the title is just the browser name
+        return title
+
+    def parse(self, browser, title):
+        """Uncached extraction"""
+        page = self.strip_suffix(browser, title).strip().lower()
+        if not page:
+            return None
+
+        m = _URL_TITLE.match(page)
+        if m:
+            return self.normalize(m.group(1) or m.group(2))
+
+        # A single segment is the page's own title ("README.md"), not a site
+        segments = _SEPARATORS.split(page)
+        if len(segments) < 2:
+            return None
+        last = segments[-1].strip()
+        m = _HOST_SEGMENT.fullmatch(last)
+        if m:
+            return self.normalize(m.group(1))
+        return self.site_names.get(site_key(last))
+
+    @staticmethod
+    def normalize(host):
+        return host[4:] if host.startswith("www.") else host
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size": len(self.cache),
+        }
+
+
+def domain_suffixes(domain):
+    """The domain and each parent domain: a.github.com, github.com, com"""
+    parts = domain.split(".")
+    return [".".join(parts[i:]) for i in range(len(parts))]
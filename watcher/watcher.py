@@ -8,119 +8,143 @@ import sys
 import time
 import threading
 import logging
-import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-from urllib.parse import urlparse
-import ctypes
 
 try:
     import winsound
     import keyboard
-    import psutil
-    import pygetwindow as gw
     import pystray
     from pystray import MenuItem as item
     from PIL import Image, ImageDraw
     WINDOWS_FEATURES = True
 except ImportError:
     WINDOWS_FEATURES = False
-    print("Warning: Windows-specific features unavailable (running in Docker?)")
 
 import config
+import migrations
+import storage
+from aggregator import ActivityAggregator
+from archive import open_archive
+from categorizer import Categorizer
+from foreground import create_provider
+from inputs import create_input_source
+from idle import create_idle_provider
+from sampling import AdaptiveSampler
+from clock import SystemClock, WallAnchor
+from journal import open_journal
+from logs import setup_logging
+from metrics import WatcherMetrics, start_server
+from retention import RetentionPolicy
+from rollups import interval_records
+from sessions import OpenSession
 
-# Logging setup
-logging.basicConfig(
-    filename=config.LOG_DIR / "watcher.log",
-    level=getattr(logging, config.LOG_LEVEL),
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    encoding="utf-8"
-)
-
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger().addHandler(console)
+# Logging setup: file and console I/O run on the listener thread, never the sampler's
+LOG_LISTENER = setup_logging()
+if not WINDOWS_FEATURES:
+    logging.warning("Windows-specific features unavailable (running in Docker?)")
 
 
 class ActivityWatcher:
-    def __init__(self):
-        self.db_path = config.DB_PATH
+    def __init__(self, db_path=None, provider=None, clock=None, interactive=True, input_source=None, idle_provider=None):
+        """
+        Defaults run the real watcher. Replays and benchmarks inject a
+        foreground provider, a VirtualClock, input and idle sources and
+        interactive=False (no hotkeys) to drive the same code paths
+        without a desktop.
+        """
+        self.db_path = db_path or config.DB_PATH
+        self.clock = clock or SystemClock()
+        self.interactive = interactive
         self.monitoring = True
         self.is_idle = False
         self.is_paused = False
+        # Buffer, open session, journal and idle/pause state: taken by each
+        # sample and by the hotkey/tray callbacks that flush or change them
+        self.state_lock = threading.RLock()
         
         self.idle_start = None
+        self.idle_started_at = None
+        self.idle_reason = None
+        self.idle_window = None
+        self.skipped_samples = 0
+        # Session row being extended while the dominant activity is unchanged
         self.current_session = None
+        self.last_category = None  # category of the latest session row, for switch counts
         
-        self.buffer = []
-        self.last_flush = time.time()
-        self.last_activity = time.time()
+        # Durations are measured on the monotonic clock; wall-clock times
+        # are derived from it through an anchor that follows clock jumps
+        self.wall = WallAnchor(self.clock)
+        
+        # Per-interval activity totals (streaming, constant memory)
+        self.buffer = ActivityAggregator()
+        self.interval_start = None
+        self.flushes = 0
+        self.last_flush = self.clock.monotonic()
+        self.last_activity = self.clock.monotonic()
         
         self.icon = None
         
+        # Foreground window source (Win32 polling or X11 events)
+        self.provider = provider or create_provider()
+        self.last_sample = None
+        self.last_sample_at = None
+        self.sample_wait = config.SAMPLE_INTERVAL
+        self.sampler = AdaptiveSampler(clock=self.clock)
+        
+        # Keystroke/click counters; real input drives last_activity
+        self.input = input_source or create_input_source()
+        self.input_events = self.input.events()
+        
+        # OS idle counter (GetLastInputInfo / X11 screensaver), queried once per sample
+        self.idle = idle_provider or create_idle_provider()
+        self.activity_visible = False
+        
+        # Compiled rule set (hot-reloaded from the rules file), results memoized per window
+        self.categorizer = Categorizer(now=lambda: self.wall.datetime(self.clock.monotonic()))
+        
+        self.db = storage.WriterConnection(self.db_path)
         self.init_db()
-        self.setup_hotkeys()
+        self.next_session_id = self.db.next_id("session_facts")
+        with self.db.lock:
+            row = self.db.conn.execute("SELECT category FROM sessions ORDER BY id DESC LIMIT 1").fetchone()
+        self.last_category = row[0] if row else None
+        self.writer = storage.WriteBehindWriter(self.db)
+        
+        # Interning maps: sessions store ids of app, title and category strings
+        self.app_ids = storage.Dimension("apps", ("process_name", "display_name"))
+        self.category_ids = storage.Dimension("categories", ("category", "subcategory"))
+        self.title_ids = storage.Dimension("titles", ("title",), config.TITLE_DICTIONARY_SIZE)
+        self.archive = open_archive(self.db_path)
+        self.retention = RetentionPolicy(self.db, self.writer, self.clock, self.archive)
+        
+        # Unflushed samples mirrored to disk; replay what a crash left behind
+        self.journal = open_journal(self.db_path)
+        if self.journal:
+            self.recover_journal()
+        if self.interactive:
+            self.setup_hotkeys()
+        
+        # Loop timings are always recorded; the endpoint only serves them when enabled
+        self.metrics = WatcherMetrics(self)
+        self.metrics_server = None
+        if config.METRICS_ENABLED:
+            self.metrics_server = start_server(self.metrics, config.METRICS_HOST, config.METRICS_PORT)
         self.log_system_event("SYSTEM_STARTUP")
         
         logging.info("=" * 60)
         logging.info("Activity Watcher STARTED")
         logging.info(f"Database: {self.db_path}")
         logging.info(f"Flush Interval: {config.FLUSH_INTERVAL}s")
+        logging.info(f"Rules: {self.categorizer.rule_version} ({self.categorizer.rules.source})")
         logging.info("=" * 60)
 
     def init_db(self):
-        """Initialize SQLite database with optimized schema"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # Sessions table - the heart of tracking
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time TEXT NOT NULL,
-                end_time TEXT,
-                process_name TEXT NOT NULL,
-                process_display_name TEXT,
-                window_title TEXT,
-                category TEXT NOT NULL,
-                subcategory TEXT,
-                duration_seconds REAL NOT NULL,
-                foreground_seconds REAL NOT NULL,
-                keystroke_count INTEGER DEFAULT 0,
-                mouse_click_count INTEGER DEFAULT 0,
-                is_focus_session BOOLEAN DEFAULT 0,
-                productivity_score REAL DEFAULT 0
-            )
-        """)
-        
-        # Idle periods
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS idle_periods (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time TEXT NOT NULL,
-                end_time TEXT,
-                duration_seconds REAL,
-                reason TEXT
-            )
-        """)
-        
-        # System events
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS system_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_type TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                details TEXT
-            )
-        """)
-        
-        # Create indexes for performance
-        c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_time)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_category ON sessions(category)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_idle_start ON idle_periods(start_time)")
-        
-        conn.commit()
-        conn.close()
+        """Bring the database schema up to date (no DDL when it already is)"""
+        with self.db.lock:
+            old, new = migrations.migrate(self.db.conn)
+        if new != old:
+            logging.info(f"Database schema migrated from version {old} to {new}")
         logging.info("Database initialized successfully")
 
     def setup_hotkeys(self):
@@ -146,335 +170,381 @@ class ActivityWatcher:
                 pass
 
     def start_idle_mode(self):
-        """Manual idle mode activation"""
-        if not self.is_idle:
+        """Manual idle mode activation (hotkey/tray thread)"""
+        with self.state_lock:
+            if self.is_idle:
+                return
             self.flush_buffer(force=True)
+            self.close_session()
             self.is_idle = True
-            self.idle_start = datetime.now()
-            self.beep(800, 300)
+            self.idle_reason = "manual"
+            self.idle_start = self.clock.now()
+            self.idle_started_at = self.clock.monotonic()
             self.update_icon()
             self.log_system_event("IDLE_MODE_MANUAL_START")
-            logging.info("🔴 IDLE MODE: Manual activation")
+        logging.info("🔴 IDLE MODE: Manual activation")
+        self.beep(800, 300)
 
     def end_idle_mode(self):
-        """End idle mode"""
-        if self.is_idle:
-            duration = (datetime.now() - self.idle_start).total_seconds()
+        """End idle mode (hotkey/tray thread)"""
+        with self.state_lock:
+            if not self.is_idle:
+                return
+            duration = self.clock.monotonic() - self.idle_started_at
             self.log_idle_period(
                 self.idle_start,
-                datetime.now(),
+                self.clock.now(),
                 duration,
-                "manual"
+                self.idle_reason or "manual"
             )
             self.is_idle = False
+            self.idle_reason = None
             self.idle_start = None
-            self.last_activity = time.time()
-            self.beep(1500, 200)
+            self.idle_started_at = None
+            self.last_activity = self.clock.monotonic()
             self.update_icon()
             self.log_system_event("IDLE_MODE_MANUAL_END")
-            logging.info(f"🟢 ACTIVE MODE: Resumed (idle duration: {duration:.0f}s)")
+        logging.info(f"🟢 ACTIVE MODE: Resumed (idle duration: {duration:.0f}s)")
+        self.beep(1500, 200)
 
     def toggle_monitoring(self):
-        """Pause/Resume monitoring"""
-        self.is_paused = not self.is_paused
-        if self.is_paused:
-            self.flush_buffer(force=True)
-            self.log_system_event("MONITORING_PAUSED")
-            logging.info("⏸️  MONITORING PAUSED")
-        else:
-            self.last_activity = time.time()
-            self.log_system_event("MONITORING_RESUMED")
-            logging.info("▶️  MONITORING RESUMED")
+        """Pause/Resume monitoring (hotkey/tray thread)"""
+        with self.state_lock:
+            self.is_paused = not self.is_paused
+            if self.is_paused:
+                self.flush_buffer(force=True)
+                self.close_session()
+                self.log_system_event("MONITORING_PAUSED")
+                logging.info("⏸️  MONITORING PAUSED")
+            else:
+                self.last_activity = self.clock.monotonic()
+                self.log_system_event("MONITORING_RESUMED")
+                logging.info("▶️  MONITORING RESUMED")
+            self.update_icon()
         self.beep(1200, 150)
-        self.update_icon()
 
     def log_system_event(self, event_type, details=None):
-        """Log system events"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute(
-                "INSERT INTO system_events (event_type, timestamp, details) VALUES (?, ?, ?)",
-                (event_type, datetime.now().isoformat(), details)
-            )
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logging.error(f"Failed to log system event: {e}")
+        """Queue a system event for the writer thread"""
+        self.writer.submit(
+            "system_event",
+            (event_type, self.clock.now().isoformat(), details)
+        )
 
     def log_idle_period(self, start, end, duration, reason):
-        """Log idle period to database"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute(
-                """INSERT INTO idle_periods 
-                   (start_time, end_time, duration_seconds, reason) 
-                   VALUES (?, ?, ?, ?)""",
-                (start.isoformat(), end.isoformat(), duration, reason)
-            )
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logging.error(f"Failed to log idle period: {e}")
+        """Queue an idle period for the writer thread"""
+        self.writer.submit(
+            "idle_period",
+            (start.isoformat(), end.isoformat(), duration, reason)
+        )
 
     def get_foreground_app(self):
-        """
-        Get currently active window and process using reliable PID lookup via Windows API.
-        This fixes the flawed string matching logic.
-        """
-        if not WINDOWS_FEATURES:
-            return None, None, None
-            
-        try:
-            win = gw.getActiveWindow()
-            if not win or not win.title.strip():
-                return None, None, None
-                
-            title = win.title.strip()
-            
-            # 1. Get the Window Handle (hWnd) from pygetwindow object
-            # We access the internal handle attribute
-            hWnd = win._hWnd
-            
-            # 2. Use ctypes to call GetWindowThreadProcessId (Windows API)
-            user32 = ctypes.windll.user32
-            pid = ctypes.c_ulong()
-            # Get the PID of the process that owns the window handle
-            user32.GetWindowThreadProcessId(hWnd, ctypes.pointer(pid))
-            proc_id = pid.value
-            
-            # 3. Use psutil to get the process name from the reliable PID
-            if proc_id != 0:
-                try:
-                    proc = psutil.Process(proc_id)
-                    proc_name = proc.name()
-                    
-                    # Return the reliably found process name
-                    return proc_name, proc_name.lower(), title
-                except psutil.NoSuchProcess:
-                    # Process might have closed between getting PID and looking up
-                    logging.debug(f"Process with PID {proc_id} not found.")
-                    
-            return "Unknown.exe", "unknown.exe", title # Fallback if PID lookup fails
-            
-        except Exception as e:
-            # Catch errors related to pygetwindow or ctypes failure
-            logging.debug(f"Failed to get foreground app (PID lookup failed): {e}")
-            return None, None, None
+        """Get the currently active (process_name, process_lower, window_title)"""
+        return self.provider.sample()
+
+    def foreground_stats(self):
+        """Sampler lookup budget as reported by the foreground provider"""
+        return {"provider": self.provider.name, **self.provider.stats()}
 
     def categorize_activity(self, process_name, process_lower, window_title):
-        """
-        Intelligent categorization system:
-        - PRIMARY_WORK: Main coding/development tools
-        - SECONDARY_WORK: Communication, music, support tools
-        - BROWSER_WORK: Browsers on work-related sites
-        - BROWSER_NONWORK: Browsers on entertainment sites
-        - IDLE: Everything else
-        """
-        if not process_name:
-            return "IDLE", None, 0
-            
-        # Check primary work apps (VSCode, Cursor, etc.)
-        if process_lower in config.PRIMARY_WORK_APPS:
-            display_name = config.PRIMARY_WORK_APPS[process_lower]
-            return "PRIMARY_WORK", display_name, 100
-            
-        # Check secondary work apps (Telegram, Spotify)
-        if process_lower in config.SECONDARY_WORK_APPS:
-            display_name = config.SECONDARY_WORK_APPS[process_lower]
-            return "SECONDARY_WORK", display_name, 60
-            
-        # Browser intelligence
-        if process_lower in config.BROWSER_APPS:
-            display_name = config.BROWSER_APPS[process_lower]
-            title_lower = window_title.lower()
-            
-            # Check for work domains
-            for domain in config.WORK_DOMAINS:
-                if domain in title_lower:
-                    return "BROWSER_WORK", f"{display_name} (Work)", 80
-                    
-            # Check for non-work domains
-            for domain in config.NON_WORK_DOMAINS:
-                if domain in title_lower:
-                    return "BROWSER_NONWORK", f"{display_name} (Leisure)", 20
-                    
-            # Default to work for unknown browser activity
-            return "BROWSER_WORK", display_name, 70
-            
-        # Everything else is idle
-        return "IDLE", process_name, 0
+        """Categorize a sample (see Categorizer for the categories)"""
+        return self.categorizer.categorize(process_name, process_lower, window_title)
 
     def flush_buffer(self, force=False):
         """Flush activity buffer to database, ignoring samples with no detectable process name for categorization."""
         if not self.buffer or self.is_idle or self.is_paused:
-            self.buffer.clear()
+            self.buffer.reset()
+            if self.is_idle or self.is_paused:
+                self.input.harvest()  # input while idle or paused is not attributed
+            self.interval_start = None
+            self.hand_off_journal()
             return
             
-        if not force and time.time() - self.last_flush < config.FLUSH_INTERVAL:
+        if not force and self.clock.monotonic() - self.last_flush < config.FLUSH_INTERVAL:
             return
             
-        # Analyze buffer
-        total_samples = len(self.buffer)
-        activity_counts = {}
-        total_fg = 0
-        
-        # --- FIX: Filter out samples with no process name for categorization ---
-        valid_samples = []
-        for sample in self.buffer:
-            (_, proc, _, _, _, _, _) = sample
-            if proc:
-                valid_samples.append(sample)
-                total_fg += 1
-            else:
-                # Still increment total_fg only for samples with a detected process
-                pass 
+        self.check_clock()
         
-        if not valid_samples:
-            logging.warning("Skipping session flush: Buffer contained only samples with no detectable process name.")
-            self.buffer.clear()
-            self.last_flush = time.time()
-            return
+        # Take the interval's totals; samples without a process name were
+        # counted in total_samples but never assigned to an activity slot.
+        # Sample weights are measured seconds, so the totals are durations.
+        total_samples, total_fg, dominant = self.buffer.drain()
+        keystrokes, clicks = self.input.harvest()
+        if self.interval_start is None:
+            # Samples added directly to the buffer (benchmarks): assume they end now
+            self.interval_start = self.clock.monotonic() - total_samples
+        start = self.wall.datetime(self.interval_start)
+        self.interval_start = None
+        self.flushes += 1
         
-        # Build activity counts ONLY from valid samples
-        for _, proc, proc_lower, title, cat, subcat, score in valid_samples:
-            key = (proc, cat, subcat)
-            if key not in activity_counts:
-                activity_counts[key] = {'count': 0, 'title': title, 'score': score}
-            activity_counts[key]['count'] += 1
-        # --- END FIX ---
+        self.save_session(total_samples, total_fg, dominant, start, total_samples, keystrokes, clicks)
+        # The interval is now owned by the writer queue
+        self.hand_off_journal()
         
-        # Find dominant activity (We now know winner_proc is NOT None)
-        dominant = max(activity_counts.items(), key=lambda x: x[1]['count'])
-        (winner_proc, winner_cat, winner_subcat), data = dominant
+        # Swap in edited rules between intervals, so every sample of a
+        # session is categorized with the rule version recorded on its row
+        self.categorizer.check_rules(self.clock.monotonic())
+            
+        self.last_flush = self.clock.monotonic()
+
+    def check_clock(self):
+        """Re-anchor wall-clock timestamps after an NTP step, manual change or suspend"""
+        jump = self.wall.resync(config.CLOCK_JUMP_THRESHOLD)
+        if jump:
+            logging.warning(f"Wall clock jumped {jump:+.1f}s relative to the monotonic clock")
+            self.log_system_event("CLOCK_JUMP", f"{jump:+.1f}s")
+
+    def save_session(self, total_samples, total_fg, dominant, start, duration, keystrokes=0, clicks=0):
+        """Fold an interval's totals into the open session, or start a new session row"""
+        if dominant is None:
+            logging.warning("Skipping session flush: Buffer contained only samples with no detectable process name.")
+            self.close_session()
+            return
         
-        winner_title = data['title']
-        winner_score = data['score']
+        winner_title = dominant.title
+        winner_score = dominant.score
         
         # Calculate metrics
-        duration = config.FLUSH_INTERVAL
         # foreground_ratio is calculated based on ALL samples (total_samples), correctly penalizing the session
         foreground_ratio = total_fg / max(total_samples, 1)
         foreground_seconds = foreground_ratio * duration
         
-        # Determine if this is a focus session
-        is_focus = (
-            winner_cat == "PRIMARY_WORK" and
-            duration >= 600 and  # At least 10 minutes
-            foreground_ratio >= 0.8  # 80% active
-        )
-        
         # Calculate productivity score
         productivity = winner_score * foreground_ratio
         
-        # Save to database
-        try:
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            
-            start_time = (datetime.now() - timedelta(seconds=duration)).isoformat()
-            
-            c.execute("""
-                INSERT INTO sessions 
-                (start_time, end_time, process_name, process_display_name, 
-                 window_title, category, subcategory, duration_seconds, 
-                 foreground_seconds, is_focus_session, productivity_score)
-                VALUES (?, NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                start_time,
-                winner_proc,
-                winner_subcat or winner_proc,
-                winner_title,
-                winner_cat,
-                winner_subcat,
-                duration,
-                foreground_seconds,
-                1 if is_focus else 0,
-                productivity
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-            emoji = "🎯" if is_focus else "💻" if winner_cat.startswith("PRIMARY") else "📱" if winner_cat.startswith("SECONDARY") else "🌐"
-            logging.info(
-                f"{emoji} Session: {winner_subcat or winner_proc} | "
-                f"{duration}s | FG: {foreground_seconds:.1f}s | "
-                f"Score: {productivity:.0f}"
+        # Same activity as the open session: extend that row in place
+        session = self.current_session
+        rule_version = self.categorizer.rule_version
+        domain = self.categorizer.domain(dominant.key[0].lower(), winner_title)
+        if session is not None and session.continues(dominant.key, start, rule_version, domain):
+            session.add(winner_title, start, duration, foreground_seconds, productivity, keystrokes, clicks, self.title_id(winner_title))
+            records = [("session_update", session.update_params())]
+            sessions = switches = 0
+        else:
+            self.close_session()
+            proc, cat, subcat = dominant.key
+            session = OpenSession(
+                self.next_session_id, dominant.key, winner_title, winner_score, start, rule_version, domain,
+                app_id=self.app_ids.id(proc, subcat or proc),
+                category_id=self.category_ids.id(cat, subcat),
             )
-            
-        except Exception as e:
-            logging.error(f"Failed to save session: {e}")
-            
-        self.buffer.clear()
-        self.last_flush = time.time()
+            self.next_session_id += 1
+            session.add(winner_title, start, duration, foreground_seconds, productivity, keystrokes, clicks, self.title_id(winner_title))
+            records = [("session", session.insert_params())]
+            sessions = 1
+            switches = int(self.last_category is not None and self.last_category != cat)
+            self.last_category = cat
+        # The rollups commit in the same transaction as the session row
+        records += interval_records(
+            start, duration, foreground_seconds, productivity, session.app_id, session.category_id, sessions, switches
+        )
+        # A dropped insert leaves no row for later updates to extend: start afresh next interval
+        if self.writer.submit_all(records) and config.SESSION_COALESCING:
+            self.current_session = session
+        else:
+            self.close_session()
+        
+        winner_proc, winner_cat, winner_subcat = dominant.key
+        emoji = "🎯" if session.is_focus else "💻" if winner_cat.startswith("PRIMARY") else "📱" if winner_cat.startswith("SECONDARY") else "🌐"
+        logging.info(
+            f"{emoji} Session: {winner_subcat or winner_proc} | "
+            f"{duration:.0f}s (total {session.duration:.0f}s) | FG: {foreground_seconds:.1f}s | "
+            f"Score: {productivity:.0f}"
+        )
+        logging.debug(f"Category cache: {self.categorizer.stats()}")
+
+    def title_id(self, title):
+        """Dictionary id of a window title (None for no title)"""
+        return self.title_ids.id(title) if title else None
+
+    def close_session(self):
+        """Stop extending the open session; its row already holds the final totals"""
+        self.current_session = None
+
+    def recover_journal(self):
+        """Turn samples left in the journal by a crash into a session"""
+        samples = self.journal.read()
+        if samples:
+            recovered = ActivityAggregator()
+            for sample, _, weight in samples:
+                recovered.add(*sample, weight=weight)
+            total_samples, total_fg, dominant = recovered.drain()
+            start = datetime.fromtimestamp(samples[0][1])
+            duration = sum(weight for _, _, weight in samples)
+            self.save_session(total_samples, total_fg, dominant, start, duration)
+            self.log_system_event("JOURNAL_RECOVERED", f"{len(samples)} samples")
+            logging.info(f"Recovered {len(samples)} unflushed samples ({duration:.0f}s) from the journal")
+        self.hand_off_journal()
+
+    def hand_off_journal(self):
+        """End the journal's interval; it is dropped once the writer has committed what was queued before"""
+        if not self.journal:
+            return
+        seq = self.journal.flush()
+        if seq is not None:
+            journal = self.journal
+            self.writer.submit_task(lambda conn: journal.commit(seq))
 
     def check_auto_idle(self):
         """Check for automatic idle (no activity)"""
         if self.is_idle or self.is_paused:
             return
             
-        idle_duration = time.time() - self.last_activity
+        idle_duration = self.clock.monotonic() - self.last_activity
         
         if idle_duration > config.IDLE_THRESHOLD:
             self.flush_buffer(force=True)
+            self.close_session()
             self.is_idle = True
-            self.idle_start = datetime.now() - timedelta(seconds=idle_duration)
-            self.log_idle_period(
-                self.idle_start,
-                datetime.now(),
-                idle_duration,
-                "auto"
-            )
+            self.idle_reason = "auto"
+            # Flushed sessions cover the time up to the last credited sample;
+            # start the idle period where they end so the two never overlap
+            idle_from = max(self.last_activity, self.last_sample_at or self.last_activity)
+            self.idle_start = self.wall.datetime(idle_from)
+            self.idle_started_at = idle_from
+            if not self.activity_visible:
+                # Without an idle counter or input hooks, a window change is the only sign of return
+                self.idle_window = self.get_foreground_app()
+            self.log_system_event("IDLE_MODE_AUTO_START")
             logging.info(f"🔴 AUTO-IDLE: No activity for {idle_duration:.0f}s")
             self.update_icon()
 
+    def check_auto_resume(self):
+        """Leave auto-idle as soon as there is input again"""
+        if not self.is_idle or self.idle_reason != "auto":
+            return
+        
+        if self.last_activity <= self.idle_started_at:
+            if self.activity_visible or self.get_foreground_app() == self.idle_window:
+                return
+            self.last_activity = self.clock.monotonic()
+            
+        # The idle period ends at the first input, not at the poll that noticed it
+        duration = self.last_activity - self.idle_started_at
+        self.log_idle_period(self.idle_start, self.wall.datetime(self.last_activity), duration, "auto")
+        self.is_idle = False
+        self.idle_reason = None
+        self.idle_start = None
+        self.idle_started_at = None
+        self.idle_window = None
+        self.update_icon()
+        self.log_system_event("IDLE_MODE_AUTO_END")
+        logging.info(f"🟢 ACTIVE: Input after {duration:.0f}s idle")
+
+    def update_activity(self, now):
+        """Move last_activity forward from the OS idle counter and the input counters"""
+        idle_seconds = self.idle.idle_seconds()
+        if idle_seconds is not None and now - idle_seconds > self.last_activity:
+            self.last_activity = now - idle_seconds
+        if self.input.available:
+            events = self.input.events()
+            if events != self.input_events:
+                self.input_events = events
+                self.last_activity = now
+        self.activity_visible = idle_seconds is not None or self.input.available
+
     def monitor_loop(self):
         """Main monitoring loop"""
-        logging.info("Monitor loop started")
+        logging.info(f"Monitor loop started ({self.provider.name} foreground provider)")
         
         while self.monitoring:
             try:
-                # Check for auto-idle
-                self.check_auto_idle()
-                
-                # Skip if idle or paused
-                if self.is_idle or self.is_paused:
-                    time.sleep(5)
-                    continue
-                    
-                # Get current activity
-                proc_name, proc_lower, window_title = self.get_foreground_app()
-                
-                if proc_name:
-                    self.last_activity = time.time()
-                    
-                # Categorize
-                category, subcategory, score = self.categorize_activity(
-                    proc_name, proc_lower, window_title
-                )
-                
-                # Add to buffer
-                self.buffer.append((
-                    time.time(),
-                    proc_name,
-                    proc_lower,
-                    window_title,
-                    category,
-                    subcategory,
-                    score
-                ))
-                
-                # Flush if needed
-                if time.time() - self.last_flush >= config.FLUSH_INTERVAL:
-                    self.flush_buffer()
-                    
-                time.sleep(config.SAMPLE_INTERVAL)
-                
+                self.monitor_step()
             except Exception as e:
                 logging.error(f"Monitor loop error: {e}")
-                time.sleep(5)
+                self.clock.sleep(5)
+
+    def monitor_step(self):
+        """One iteration of the monitoring loop: sample, aggregate, flush, wait"""
+        # Hotkey and tray callbacks change the same state: they wait for a
+        # sample to finish, but never for the wait between samples
+        with self.state_lock:
+            sampled = self.sample_step()
+        if sampled:
+            # Polling providers sleep; event-driven ones wake on a window change
+            self.provider.wait(self.sample_wait)
+        else:
+            self.clock.sleep(5)
+
+    def sample_step(self):
+        """Sample, aggregate and flush; False if skipped while idle or paused"""
+        now = self.clock.monotonic()
+        # Latencies are real CPU time, also under a virtual clock
+        started = time.perf_counter()
+        self.update_activity(now)
+        
+        # Check for auto-idle, and for input that ends it
+        self.check_auto_idle()
+        self.check_auto_resume()
+        
+        # Age out old rows between samples; vacuum only while the user is away
+        self.retention.tick(now, self.is_idle)
+        
+        # Skip if idle or paused: no foreground lookup, no categorization
+        if self.is_idle or self.is_paused:
+            self.last_sample = None
+            self.sampler.reset()
+            self.skipped_samples += 1
+            self.metrics.loop.observe(time.perf_counter() - started)
+            return False
+            
+        self.credit_last_sample(now)
+            
+        # Get current activity
+        t0 = time.perf_counter()
+        proc_name, proc_lower, window_title = self.get_foreground_app()
+        t1 = time.perf_counter()
+        
+        # Without an idle counter or input source, fall back to
+        # "a foreground process was detected" as activity
+        if proc_name and not self.activity_visible:
+            self.last_activity = now
+            
+        # Categorize
+        category, subcategory, score = self.categorize_activity(
+            proc_name, proc_lower, window_title
+        )
+        t2 = time.perf_counter()
+        self.metrics.stages["foreground"].observe(t1 - t0)
+        self.metrics.stages["categorize"].observe(t2 - t1)
+        
+        self.last_sample = (proc_name, window_title, category, subcategory, score)
+        self.last_sample_at = now
+        self.sampler.observe((proc_name, window_title))
+        
+        # Flush if needed
+        if now - self.last_flush >= config.FLUSH_INTERVAL:
+            t0 = time.perf_counter()
+            self.flush_buffer()
+            self.metrics.stages["flush"].observe(time.perf_counter() - t0)
+            
+        self.sample_wait = self.sample_timeout()
+        self.metrics.loop.observe(time.perf_counter() - started)
+        return True
+
+    def credit_last_sample(self, now):
+        """
+        Credit the measured time since the previous sample to the activity
+        observed then; samples can be uneven with event-driven providers,
+        late after a slow flush, or far apart after a suspend (capped)
+        """
+        if self.last_sample is None:
+            return
+        elapsed = min(now - self.last_sample_at, self.sample_wait + config.SAMPLE_MAX_LATENESS)
+        self.buffer.add(*self.last_sample, weight=elapsed)
+        if self.interval_start is None:
+            self.interval_start = self.last_sample_at
+        if self.journal:
+            self.journal.append(self.last_sample, self.wall.offset + self.last_sample_at, elapsed)
+        self.last_sample_at = now
+
+    def sample_timeout(self):
+        """How long the monitor loop may wait for the next sample"""
+        until_flush = max(config.SAMPLE_INTERVAL, config.FLUSH_INTERVAL - (self.clock.monotonic() - self.last_flush))
+        if self.provider.event_driven:
+            # Nothing to sample until the window changes; only wake for the next flush
+            return until_flush
+        # Polling: back off while the window is stable, but never past a flush
+        return min(self.sampler.interval, until_flush)
 
     def create_icon(self, color):
         """Create system tray icon"""
@@ -503,29 +573,67 @@ class ActivityWatcher:
 
     def quit_app(self, icon=None, item=None):
         """Clean shutdown"""
-        logging.info("Shutdown initiated")
-        self.monitoring = False
-        
-        if self.buffer:
-            self.flush_buffer(force=True)
-            
-        if self.is_idle and self.idle_start:
-            duration = (datetime.now() - self.idle_start).total_seconds()
-            self.log_idle_period(
-                self.idle_start,
-                datetime.now(),
-                duration,
-                "shutdown"
-            )
-            
-        self.log_system_event("SYSTEM_SHUTDOWN")
+        self.shutdown()
         
         if self.icon:
             self.icon.stop()
             
         logging.info("Shutdown complete")
+        # os._exit skips atexit handlers: write out the queued log records first
+        LOG_LISTENER.stop()
         os._exit(0)
 
+    def shutdown(self):
+        """Stop monitoring, flush and drain all pending writes, close the database"""
+        logging.info("Shutdown initiated")
+        self.monitoring = False
+        
+        with self.state_lock:
+            # The window observed by the last sample is still in use until now
+            self.credit_last_sample(self.clock.monotonic())
+            self.last_sample = None
+            if self.buffer:
+                self.flush_buffer(force=True)
+            self.close_session()
+
+            if self.is_idle and self.idle_start:
+                duration = self.clock.monotonic() - self.idle_started_at
+                self.log_idle_period(
+                    self.idle_start,
+                    self.clock.now(),
+                    duration,
+                    "shutdown"
+                )
+
+            self.log_system_event("SYSTEM_SHUTDOWN")
+        
+        # Drain queued writes before the process exits
+        if not self.writer.close():
+            logging.warning("Write queue did not drain before timeout")
+        logging.info(f"Writer stats: {self.writer.stats()}")
+        logging.info(f"Dictionaries: apps {self.app_ids.stats()}, categories {self.category_ids.stats()}, titles {self.title_ids.stats()}")
+        logging.info(f"Retention: {self.retention.stats()}")
+        if self.archive:
+            logging.info(f"Archive: {self.archive.stats()}")
+        logging.info(f"Category cache: {self.categorizer.stats()}")
+        logging.info(f"Foreground lookups: {self.foreground_stats()}")
+        logging.info(f"Sampler: {self.sampler.stats()}")
+        logging.info(f"Input: {self.input.stats()}")
+        logging.info(f"Idle: {self.idle.name} provider, {self.skipped_samples} samples skipped while idle or paused")
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+        self.provider.close()
+        self.input.close()
+        self.idle.close()
+        if self.journal:
+            self.journal.close()
+        
+        try:
+            self.db.close()
+        except Exception as e:
+            logging.error(f"Failed to close database: {e}")
+
     def run(self):
         """Start the watcher"""
         # Start monitoring thread
@@ -555,7 +663,7 @@ class ActivityWatcher:
             logging.info("Running in console mode (Docker)")
             try:
                 while self.monitoring:
-                    time.sleep(10)
+                    self.clock.sleep(10)
             except KeyboardInterrupt:
                 self.quit_app()
 